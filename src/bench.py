@@ -0,0 +1,327 @@
+#! /usr/bin/env python3
+# bench.py - host benchmarks for the file transfer agent
+#NOTE: for use on HOST python only
+
+import os
+import sys
+import time
+import random
+import subprocess
+
+import dttk
+import tasking
+
+PYTHON = sys.executable
+
+#----- CORPORA -----------------------------------------------------------------
+
+CORPUS_SIZE   = 64 * 1024
+CORPUS_TEXT   = "_bench_telemetry.csv"  # compresses well
+CORPUS_RANDOM = "_bench_random.bin"     # doesn't compress at all
+
+def make_corpora(size:int=CORPUS_SIZE) -> list:  # of filename:str
+    """Create a compressible and an incompressible test file"""
+    rng = random.Random(1)  # repeatable
+    with open(CORPUS_TEXT, "w") as f:
+        t = 0
+        while f.tell() < size:
+            f.write("%d,%.2f,%.2f,%d,OK\n" % (t, 20 + rng.random(), 1013 + rng.random()*2, rng.randint(0, 3)))
+            t += 1
+    with open(CORPUS_RANDOM, "wb") as f:
+        f.write(bytes(rng.getrandbits(8) for _ in range(size)))
+    return [CORPUS_TEXT, CORPUS_RANDOM]
+
+def remove_files(*names) -> None:
+    for name in names:
+        if name is None: continue  # never got as far as a temp file
+        try:
+            os.unlink(name)
+        except OSError: pass
+
+def received_name_for(filename:str) -> str:
+    """FileReceiver names its output after the sent file extension"""
+    _, ext = os.path.splitext(filename)
+    return dttk.FileReceiver.FILENAME_BASE + ext
+
+def same_file(a:str, b:str) -> bool:
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        return fa.read() == fb.read()
+
+#----- LINKS -------------------------------------------------------------------
+
+class CountingRadio(dttk.InMemoryRadio):
+    """An InMemoryRadio that counts what goes over the air"""
+    def __init__(self):
+        dttk.InMemoryRadio.__init__(self)
+        self.packets = 0
+        self.nbytes  = 0
+
+    def send(self, data:dttk.Buffer or None) -> bool:
+        self.packets += 1
+        self.nbytes  += len(data)
+        return dttk.InMemoryRadio.send(self, data)
+
+class LossyRadio(CountingRadio):
+    """A CountingRadio that loses a random fraction of packets"""
+    def __init__(self, loss:float, seed:int=1):
+        CountingRadio.__init__(self)
+        self._loss = loss
+        self._rng = random.Random(seed)  # repeatable
+
+    def send(self, data:dttk.Buffer or None) -> bool:
+        if self._rng.random() < self._loss:
+            self.packets += 1
+            self.nbytes  += len(data)
+            return True  # it went on air, but nobody heard it
+        return CountingRadio.send(self, data)
+
+class BurstyRadio(CountingRadio):
+    """Two-state (Gilbert-Elliott) channel, fades lose runs of packets"""
+    def __init__(self, p_fade:float=0.02, p_recover:float=0.15, loss_good:float=0.01,
+                 loss_fade:float=0.9, seed:int=1):
+        CountingRadio.__init__(self)
+        self._p_fade    = p_fade
+        self._p_recover = p_recover
+        self._loss_good = loss_good
+        self._loss_fade = loss_fade
+        self._fading    = False
+        self._rng = random.Random(seed)  # repeatable
+
+    def send(self, data:dttk.Buffer or None) -> bool:
+        if self._fading: self._fading = self._rng.random() >= self._p_recover
+        else:            self._fading = self._rng.random() < self._p_fade
+        loss = self._loss_fade if self._fading else self._loss_good
+        if self._rng.random() < loss:
+            self.packets += 1
+            self.nbytes  += len(data)
+            return True  # it went on air, but nobody heard it
+        return CountingRadio.send(self, data)
+
+class LossyQueue(dttk.InMemoryQueue):
+    """One direction of a duplex link, loses a random fraction of packets, and counts them"""
+    def __init__(self, loss:float, seed:int=1):
+        dttk.InMemoryQueue.__init__(self)
+        self._loss = loss
+        self._rng = random.Random(seed)  # repeatable
+        self.packets = 0
+
+    def _write(self, values:bytes) -> None:
+        self.packets += 1
+        if self._rng.random() >= self._loss: dttk.InMemoryQueue._write(self, values)
+
+last_radio = None  # for reporting on-air counts after xfer_in_memory
+
+def xfer_in_memory(filename:str, blocksz:int=50, **sender_args) -> float:  # seconds
+    """Loopback transfer over an InMemoryRadio"""
+    global last_radio
+    last_radio = CountingRadio()
+    link_manager = dttk.LinkManager(last_radio)
+    start = time.time()
+    sender = dttk.FileSender(filename, link_manager, blocksz=blocksz, **sender_args)
+    receiver = dttk.FileReceiver(link_manager, received_name_for(filename))
+    tasking.run_all([sender, receiver])
+    return time.time() - start
+
+def xfer_std_stream(filename:str, compress:bool=False) -> float:  # seconds
+    """Pipeline transfer over StdStreamRadio, between two dtcli processes"""
+    send = [PYTHON, "dtcli.py", "--send"] + (["-z"] if compress else []) + [filename]
+    receive = [PYTHON, "dtcli.py", "--receive", received_name_for(filename)]
+    start = time.time()
+    tx = subprocess.Popen(send, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    rx = subprocess.Popen(receive, stdin=tx.stdout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    tx.stdout.close()  # so rx sees EOF when tx exits
+    tx.wait()
+    rx.wait()
+    return time.time() - start
+
+def xfer_one_pass(filename:str, radio:CountingRadio, **sender_args) -> bool:
+    """A single send of the file, True if the receiver got all of it"""
+    link_manager = dttk.LinkManager(radio)
+    sender = dttk.FileSender(filename, link_manager, **sender_args)
+    receiver = dttk.FileReceiver(link_manager, received_name_for(filename))
+    while sender.tick():
+        if not receiver.tick(wait=0): break  # got it all early
+    for _ in range(8): receiver.tick(wait=0)  # drain the END message
+    remove_files(received_name_for(filename), receiver.get_temp_name())
+    return receiver.get_percent() == 100
+
+#----- BENCHMARKS --------------------------------------------------------------
+
+def bench_compress() -> None:
+    """Effective bytes/sec, with and without per-block compression"""
+    corpora = make_corpora()
+    print("%-10s %-24s %-7s %10s %10s" % ("link", "corpus", "deflate", "bytes/sec", "air bytes"))
+    try:
+        for link_name, xfer in (("inmemory", xfer_in_memory), ("stdstream", xfer_std_stream)):
+            for filename in corpora:
+                for compress in (False, True):
+                    secs = xfer(filename, compress=compress)
+                    rx_name = received_name_for(filename)
+                    ok = same_file(filename, rx_name)
+                    remove_files(rx_name)
+                    bps = os.path.getsize(filename) / secs
+                    if xfer == xfer_in_memory: air = str(last_radio.nbytes)
+                    else:                      air = "-"
+                    print("%-10s %-24s %-7s %10d %10s%s" % (link_name, filename, "yes" if compress else "no",
+                                                           bps, air, "" if ok else " FAILED"))
+    finally:
+        remove_files(*corpora)
+
+FEC_SIZE   = 16 * 1024
+FEC_TRIALS = 10
+
+def bench_fec() -> None:
+    """Airtime and single-pass delivery, for blind repeats vs FEC parity groups"""
+    corpora = make_corpora(FEC_SIZE)
+    schemes = (("repeats=%d" % dttk.FileSender.NUM_REPEATS, {}),
+               ("fec=%d+%d" % dttk.FileSender.FEC_DEFAULT, {"fec": True}))
+    print("%-12s %5s %12s %10s" % ("scheme", "loss", "air packets", "delivered"))
+    try:
+        for loss in (0.05, 0.10, 0.20, 0.30):
+            for name, args in schemes:
+                packets = 0
+                delivered = 0
+                for trial in range(FEC_TRIALS):
+                    radio = LossyRadio(loss, seed=trial)
+                    if xfer_one_pass(CORPUS_RANDOM, radio, blocksz=50, **args): delivered += 1
+                    packets += radio.packets
+                print("%-12s %4d%% %12d %9d%%" % (name, loss*100, packets/FEC_TRIALS,
+                                                   delivered*100/FEC_TRIALS))
+    finally:
+        remove_files(*corpora)
+
+SCHEDULE_SIZE   = 8 * 1024
+SCHEDULE_TRIALS = 10
+
+def bench_schedule() -> None:
+    """Completion probability vs airtime (until complete, or one pass), per scheduler, on a fading channel"""
+    corpora = make_corpora(SCHEDULE_SIZE)
+    print("%-12s %7s %12s %10s" % ("schedule", "repeats", "air packets", "complete"))
+    try:
+        for schedule in dttk.SCHEDULERS:
+            for repeats in range(4):
+                packets = 0
+                complete = 0
+                for trial in range(SCHEDULE_TRIALS):
+                    radio = BurstyRadio(seed=trial)
+                    if xfer_one_pass(CORPUS_RANDOM, radio, blocksz=50, repeats=repeats, schedule=schedule):
+                        complete += 1
+                    packets += radio.packets
+                print("%-12s %7d %12d %9d%%" % (schedule, repeats, packets/SCHEDULE_TRIALS,
+                                                 complete*100/SCHEDULE_TRIALS))
+    finally:
+        remove_files(*corpora)
+
+def bench_fountain() -> None:
+    """Symbols heard and sent before a late joining receiver decodes"""
+    corpora = make_corpora(FEC_SIZE)
+    print("%5s %10s %10s %10s" % ("loss", "blocks", "heard/blk", "sent/blk"))
+    try:
+        for loss in (0.0, 0.10, 0.30, 0.50):
+            radio = LossyRadio(loss)
+            link_manager = dttk.LinkManager(radio)
+            sender = dttk.FountainFileSender(CORPUS_RANDOM, link_manager, blocksz=50, seed=12345)
+            receiver = dttk.FountainFileReceiver(link_manager, received_name_for(CORPUS_RANDOM))
+            start = radio.packets
+            while receiver.tick(wait=0):
+                sender.tick()
+            sent = radio.packets - start
+            nblocks = (FEC_SIZE + 49) // 50
+            ok = same_file(CORPUS_RANDOM, received_name_for(CORPUS_RANDOM))
+            print("%4d%% %10d %10.2f %10.2f%s" % (loss*100, nblocks, sent*(1-loss)/nblocks, sent/nblocks,
+                                                  "" if ok else " FAILED"))
+            remove_files(received_name_for(CORPUS_RANDOM))
+    finally:
+        remove_files(*corpora)
+
+NACK_SIZE = 16 * 1024
+
+def bench_nack() -> None:
+    """Air packets, both ways, for blind repeats (one pass) vs selective repeat NACKs (until complete)"""
+    corpora = make_corpora(NACK_SIZE)
+    nblocks = (NACK_SIZE + 49) // 50
+    print("%-12s %5s %10s %10s %10s" % ("scheme", "loss", "data pkts", "nack pkts", "delivered"))
+    try:
+        for loss in (0.0, 0.05, 0.10, 0.20, 0.30):
+            radio = LossyRadio(loss)
+            ok = xfer_one_pass(CORPUS_RANDOM, radio, blocksz=50)
+            print("%-12s %4d%% %10d %10s %10s" % ("repeats=%d" % dttk.FileSender.NUM_REPEATS, loss*100,
+                                                radio.packets, "-", "yes" if ok else "no"))
+
+            data_link = LossyQueue(loss, seed=1)
+            nack_link = LossyQueue(loss, seed=2)
+            tx_end = dttk.LinkManager(dttk.InMemoryDuplex(data_link, nack_link))
+            rx_end = dttk.LinkManager(dttk.InMemoryDuplex(nack_link, data_link))
+            sender = dttk.FileSender(CORPUS_RANDOM, tx_end, blocksz=50, nack=True)
+            sender.NACK_TIMEOUT_MS = 10  # in memory, replies are instant
+            receiver = dttk.FileReceiver(rx_end, received_name_for(CORPUS_RANDOM), nack=True)
+            tasking.run_all([sender, receiver])
+            ok = receiver.is_finished_ok()
+            print("%-12s %4d%% %10d %10d %10s  (%.2fN)" % ("nack", loss*100, data_link.packets, nack_link.packets,
+                                                        "yes" if ok else "no", data_link.packets / nblocks))
+            remove_files(received_name_for(CORPUS_RANDOM), receiver.get_temp_name())
+    finally:
+        remove_files(*corpora)
+
+class FadingBus(dttk.InMemoryBus):
+    """Packets lost for everyone (sender fades), and for each port on its own"""
+    def __init__(self, shared_loss:float, own_loss:float, seed:int=1):
+        dttk.InMemoryBus.__init__(self)
+        self._shared_loss = shared_loss
+        self._own_loss = own_loss
+        self._rng = random.Random(seed)  # repeatable
+
+    def broadcast(self, from_port, values:bytes) -> None:
+        if self._rng.random() < self._shared_loss: return
+        for port in self._ports:
+            if port is not from_port and self._rng.random() >= self._own_loss: port.hear(values)
+
+MULTICAST_SIZE = 8 * 1024
+
+def bench_multicast() -> None:
+    """NACKs on the return channel, with and without backoff and suppression, as receivers are added"""
+    corpora = make_corpora(MULTICAST_SIZE)
+    print("%9s %8s %8s %8s %8s" % ("receivers", "backoff", "rounds", "nacks", "resent"))
+    try:
+        for nreceivers in (1, 5, 10, 20, 40):
+            for backoff in (0, dttk.FileReceiver.NACK_BACKOFF_MS):
+                bus = FadingBus(0.05, 0.01)
+                sender = dttk.FileSender(CORPUS_RANDOM, dttk.LinkManager(dttk.InMemoryBusPort(bus)),
+                                         blocksz=50, multicast=True)
+                receivers = []
+                for _ in range(nreceivers):
+                    # cached, so the receivers don't share a temp file
+                    receiver = dttk.FileReceiver(dttk.LinkManager(dttk.InMemoryBusPort(bus)),
+                                                 received_name_for(CORPUS_RANDOM), cached=True, multicast=True)
+                    receiver.NACK_BACKOFF_MS = backoff
+                    receivers.append(receiver)
+                tasking.run_all([sender] + receivers)
+                ok = len([r for r in receivers if r.is_finished_ok()])
+                nacks, rounds = sender.get_nack_stats()
+                print("%9d %6dms %8d %8d %8d%s" % (nreceivers, backoff, rounds, nacks, sender.get_resent(),
+                                                  "" if ok == nreceivers else " FAILED:%d" % (nreceivers-ok)))
+                remove_files(received_name_for(CORPUS_RANDOM))
+    finally:
+        remove_files(*corpora)
+
+BENCHMARKS = {
+    "compress": bench_compress,
+    "fec":      bench_fec,
+    "fountain": bench_fountain,
+    "multicast": bench_multicast,
+    "nack":     bench_nack,
+    "schedule": bench_schedule,
+}
+
+def main(argv) -> None:
+    names = argv if len(argv) != 0 else list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            exit("unknown benchmark:%s, choose from: %s" % (name, " ".join(BENCHMARKS)))
+        print("----- %s -----" % name)
+        BENCHMARKS[name]()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
+
+#END: bench.py
@@ -3,6 +3,8 @@
 # NOTE: for use on HOST python only
 
 import sys
+import os
+import glob
 import ftag_host as ftag
 import dttk
 
@@ -17,21 +19,55 @@ def do_send(argv) -> None:
 
 def parse_send_args(argv) -> dict:
     """Parse --send args to a dict"""
-    filename = None
+    filenames = []
     progress = False
-    for arg in argv:
+    compress = False
+    fec      = False
+    pps      = None
+    basis    = None
+    hashes   = False
+    deferred = False
+    merkle   = False
+    args = iter(argv)
+    for arg in args:
         if arg == '-p':         progress = True
-        elif filename is None:  filename = arg
-
-    if filename is None:
-        exit("usage: dtcli.py --send [-p] <filename>")
-
-    return {"filename": filename, "progress": progress}
-
-def run_send(filename:str, progress:bool=False) -> None:
-    """Send a file using packetiser and std streams"""
+        elif arg == '-k':       hashes = True
+        elif arg == '-l':       deferred = True
+        elif arg == '-m':       merkle = True
+        elif arg == '-z':       compress = True
+        elif arg == '-f':       fec = True
+        elif arg == '-r':       pps = float(next(args, "0"))
+        elif arg == '-d':       basis = next(args, None)
+        else:                   filenames.extend(expand_send_arg(arg))
+
+    if len(filenames) == 0 or (pps is not None and pps <= 0) or \
+            (basis is not None and len(filenames) != 1) or (deferred and merkle):
+        # -m hashes the whole file before the first packet, which -l is there to avoid
+        exit("usage: dtcli.py --send [-p] [-z] [-f] [-k] [-l | -m] [-r <pps>] [-d <basis>] <filename>|<dir>|<glob> ...")
+
+    return {"filenames": filenames, "progress": progress, "compress": compress, "fec": fec, "pps": pps,
+            "basis": basis, "hashes": hashes, "deferred": deferred, "merkle": merkle}
+
+def expand_send_arg(arg:str) -> list:  # of filenames
+    """A directory is all the files in it, a glob is all the files it matches"""
+    if os.path.isdir(arg):
+        names = [os.path.join(arg, name) for name in sorted(os.listdir(arg))]
+        return [name for name in names if os.path.isfile(name)]
+    if any(ch in arg for ch in "*?["):
+        return [name for name in sorted(glob.glob(arg)) if os.path.isfile(name)]
+    return [arg]
+
+def run_send(filenames:list, progress:bool=False, compress:bool=False, fec:bool=False,
+             pps:float or None=None, basis:str or None=None, hashes:bool=False, deferred:bool=False,
+             merkle:bool=False) -> None:
+    """Send a file, or a batch of files, using packetiser and std streams"""
     #NOTE: progress flag not supported currently
-    sender = ftag.send_file_task(filename, link=link_manager)
+    if len(filenames) == 1:
+        sender = ftag.send_file_task(filenames[0], link=link_manager, compress=compress, fec=fec, basis=basis,
+                                     block_hashes=hashes, deferred_digest=deferred, merkle=merkle)
+    else:
+        sender = ftag.send_batch_task(filenames, link=link_manager, compress=compress, fec=fec)
+    if pps is not None: sender.set_pacer(dttk.Pacer(pps))
     sender.run()
     ftag.print_stats("tx", sender)
 
@@ -46,19 +82,37 @@ def parse_receive_args(argv) -> dict:
     """Parse --receive args to a dict"""
     filename = None
     progress = False
-    for arg in argv:
+    batch    = False
+    basis    = None
+    store    = None
+    sync     = dttk.ImmediateFileWriter.SYNC_NONE
+    mapped   = False
+    out_dir  = None
+    args = iter(argv)
+    for arg in args:
         if arg == '-p':         progress = True
+        elif arg == '-b':       batch = True
+        elif arg == '-y':       sync = int(float(next(args, "0")) * 1024 * 1024)  # MB, 0 is on commit only
+        elif arg == '-M':       mapped = True
+        elif arg == '-d':       basis = next(args, None)
+        elif arg == '-s':       store = next(args, None)
+        elif arg == '-o':       out_dir = next(args, None)
         elif filename is None:  filename = arg
 
-    if filename is None:
-        exit("usage: dtcli.py --receive [-p] <filename>")
+    if filename is None and not batch:
+        exit("usage: dtcli.py --receive [-p] [-d <basis>] [-s <storedir>] [-y <MB>] [-M] [-o <dir>] <filename> | -b")
 
-    return {"filename": filename, "progress": progress}
+    return {"filename": filename, "progress": progress, "batch": batch, "basis": basis, "store": store,
+            "sync": sync, "mapped": mapped, "out_dir": out_dir}
 
-def run_receive(filename:str, progress:bool=False):
-    """Receive a file using packetiser and std streams"""
+def run_receive(filename:str or None, progress:bool=False, batch:bool=False, basis:str or None=None,
+                store:str or None=None, sync:int=dttk.ImmediateFileWriter.SYNC_NONE, mapped:bool=False,
+                out_dir:str or None=None):
+    """Receive a file, or a batch of files with their sent names, using packetiser and std streams"""
     #NOTE: progress flag not supported currently
-    receiver = ftag.receive_file_task(filename, link=link_manager)
+    if batch: receiver = ftag.receive_batch_task(link=link_manager, store=store, out_dir=out_dir)
+    else:     receiver = ftag.receive_file_task(filename, link=link_manager, basis=basis, store=store, sync=sync,
+                                                mapped=mapped, out_dir=out_dir)
     receiver.run()
     ftag.print_stats("rx", receiver)
 
@@ -214,8 +268,9 @@ def run_noise(spec:dict) -> None:
 def usage(msg:str or None=None) -> None:
     """Display a helpful usage message"""
     if msg is not None: print(msg)
-    print("usage: ftcli --send <filename> [-p]")
-    print("       ftcli --receive <filename> [-p]")
+    print("usage: ftcli --send <filename>|<dir>|<glob> ... [-p] [-z] [-f] [-k] [-l | -m] [-r <pps>] [-d <basis>]")
+    print("       ftcli --receive <filename> [-p] [-d <basis>] [-s <storedir>] [-y <MB>] [-M] [-o <dir>]")
+    print("       ftcli --receive -b [-p] [-s <storedir>]")
     print("       ftcli --hex2bin")
     print("       ftcli --bin2hex")
     print("       ftcli --noise <noise-args>")
@@ -8,6 +8,8 @@ try:
 except ImportError: pass
 
 import random  # available on host and pico
+import math  # available on host and pico
+from array import array  # available on host and pico
 
 ##DISABLEDimport perf
 #IDEA, if don't import it, define perf as a scaffold here
@@ -303,6 +305,11 @@ class BitSet:
             self._flags[word] = w2
             ##platdeps.message(self._flags)
 
+    def load(self, packed) -> None:
+        """Set flags from packed bits, flag n is bit n%8 of byte n//8"""
+        for i in range(self._nflags):
+            if packed[i>>3] & (1<<(i&7)): self[i] = True
+
     def __str__(self) -> str:
         """Create a line of chars showing percentage of flags set across the range"""
         result = []
@@ -334,6 +341,9 @@ class BitSet:
         """If all nflags flags are set, returns True"""
         return self._nsetflags == self._nflags
 
+    def get_nset(self) -> int:
+        return self._nsetflags
+
     def get_percent(self) -> int:
         """Get percentage full 0..100% where 100% is always 'full'"""
         # useful for progress displays
@@ -410,7 +420,7 @@ def sha256_of_file(filename: str) -> bytes:
     hasher = platdeps.hashlib_sha256()
     with open(filename, "rb") as f:
         while True:  #NOTE: pico iter() works differently
-            block = f.read(512)  # typical cluster size on a SDcard
+            block = f.read(platdeps.HASH_CHUNK)
             if not block: break  #EOF
             hasher.update(block)
     digest = hasher.digest()
@@ -419,10 +429,128 @@ def sha256_of_file(filename: str) -> bytes:
 
 def get_file_info(filename:str) -> tuple: # (filesize:int, sha256:bytes)
     """File size and SHA256 of a file"""
+    if digest_cache is not None: return digest_cache.get_file_info(filename)
     sz     = platdeps.filesize(filename)
     sha256 = sha256_of_file(filename)
     return sz, sha256
 
+class DigestCache:
+    """SHA256 of files already hashed, kept on disk, so sending one again doesn't re-read it"""
+    # One line per file: sha256 hex, size, mtime, inode, real path. A file is hashed
+    # again if its size, mtime or inode has changed. Newer lines are appended, and
+    # win on load, so the file is rewritten when it is mostly stale lines.
+    def __init__(self, name:str):
+        self._name    = name
+        self._digests = {}  # path -> ((size, mtime, inode), sha256)
+        self._nhits   = 0
+        self._nmisses = 0
+        nlines = 0
+        try:
+            with open(name) as f:
+                for line in f:
+                    self._parse(line)
+                    nlines += 1
+        except OSError: pass  # no cache yet
+        if nlines > 2 * len(self._digests) + 16: self.rewrite()
+
+    def _parse(self, line:str) -> None:
+        parts = line.rstrip("\n").split(" ", 4)
+        if len(parts) != 5 or len(parts[0]) != 64: return  # damaged line, ignore it
+        try:
+            key = (int(parts[1]), int(parts[2]), int(parts[3]))
+        except ValueError: return
+        self._digests[parts[4]] = (key, bytes(hex_to_bin(parts[0])))
+
+    @staticmethod
+    def _line(path:str, key:tuple, sha256:bytes) -> str:
+        return "%s %d %d %d %s\n" % (hexstr(sha256), key[0], key[1], key[2], path)
+
+    def get_file_info(self, filename:str) -> tuple:  # (filesize:int, sha256:bytes)
+        """File size and SHA256 of a file, only hashed if it has changed"""
+        path = platdeps.os_path_realpath(filename)  # the cache is shared by every directory
+        key = platdeps.file_key(filename)
+        known = self._digests.get(path)
+        if known is not None and known[0] == key:
+            self._nhits += 1
+            return key[0], known[1]
+        self._nmisses += 1
+        sha256 = sha256_of_file(filename)
+        if platdeps.file_key(filename) == key:  # not if it changed while being hashed
+            self._digests[path] = (key, sha256)
+            try:
+                with open(self._name, "a") as f: f.write(self._line(path, key, sha256))
+            except OSError: pass  # can't write it, so only cached in memory
+        return key[0], sha256
+
+    def rewrite(self) -> None:
+        """Write just the current digests, dropping stale lines"""
+        try:
+            with open(self._name, "w") as f:
+                for path in self._digests:
+                    key, sha256 = self._digests[path]
+                    f.write(self._line(path, key, sha256))
+        except OSError: pass  # keep the stale lines, they are harmless
+
+    def get_stats(self) -> tuple:  # of (hits, misses)
+        return self._nhits, self._nmisses
+
+digest_cache = None  # DigestCache, set one to skip hashing unchanged files again
+
+class Future:
+    """The result of some work, that might still be running on a worker thread"""
+    def __init__(self):
+        self._done   = False
+        self._result = None
+        self._error  = None
+
+    def run(self, fn:callable, args:tuple) -> None:
+        """Do the work, on whichever thread calls this"""
+        try:
+            self._result = fn(*args)
+        except Exception as e:  # re-raised in the caller, by get()
+            self._error = e
+        self._done = True
+
+    def is_ready(self) -> bool:
+        return self._done
+
+    def get(self):  # result of fn, or exception
+        """Wait for the result, if it is not ready yet"""
+        while not self._done: platdeps.time_sleep_ms(1)
+        if self._error is not None: raise self._error
+        return self._result
+
+class WorkerPool:
+    """A few threads for slow file work, hashing, verifying and committing"""
+    # The transfer loop must keep servicing the link, or packets are lost, so
+    # anything that reads or writes a whole file is submitted here, and the
+    # state machines poll the Future. hashlib and file I/O release the GIL.
+    # With no threads (Pico), or no workers, the work runs inline in submit().
+    NUM_WORKERS = 2
+
+    def __init__(self, nworkers:int=NUM_WORKERS):
+        self._nworkers = nworkers
+        self._queue    = None  # threads start on the first submit()
+
+    def submit(self, fn:callable, *args) -> Future:
+        """Run fn(*args) on a worker, poll or get() the Future for its result"""
+        future = Future()
+        if self._nworkers == 0 or platdeps.start_thread is None:
+            future.run(fn, args)
+            return future
+        if self._queue is None:
+            self._queue = platdeps.new_queue()
+            for _ in range(self._nworkers): platdeps.start_thread(self._worker)
+        self._queue.put((future, fn, args))
+        return future
+
+    def _worker(self) -> None:
+        while True:
+            future, fn, args = self._queue.get()
+            future.run(fn, args)
+
+worker_pool = WorkerPool()  # set WorkerPool(0) to do all file work inline
+
 high = lambda b: (b & 0xFF00) >> 8
 low  = lambda b: b & 0xFF
 
@@ -560,6 +688,307 @@ class Buffer:
         self.extend(values)
 
 
+#===== FORWARD ERROR CORRECTION ================================================
+
+# Blocks are sent in groups of K data blocks followed by M parity blocks.
+# The receiver can rebuild the whole group from any K of the K+M blocks,
+# which is much cheaper in airtime than sending every block several times.
+# Parity is a systematic Reed-Solomon erasure code over GF(256), using a
+# Cauchy matrix scaled so that the first parity block is a plain XOR.
+
+_GF_POLY = 0x11D
+_GF_EXP  = bytearray(512)  # doubled, so mul doesn't need a mod 255
+_GF_LOG  = bytearray(256)
+
+def _gf_init() -> None:
+    x = 1
+    for i in range(255):
+        _GF_EXP[i] = x
+        _GF_LOG[x] = i
+        x <<= 1
+        if x & 0x100: x ^= _GF_POLY
+    for i in range(255, 512):
+        _GF_EXP[i] = _GF_EXP[i-255]
+_gf_init()
+
+def gf_mul(a:int, b:int) -> int:
+    if a == 0 or b == 0: return 0
+    return _GF_EXP[_GF_LOG[a] + _GF_LOG[b]]
+
+def gf_inv(a:int) -> int:
+    ##assert a != 0
+    return _GF_EXP[255 - _GF_LOG[a]]
+
+def gf_mul_acc(dst:bytearray, src, coef:int) -> None:
+    """dst ^= src * coef, for whole blocks of the same length"""
+    if coef == 0: return
+    if coef == 1:
+        for i in range(len(src)): dst[i] ^= src[i]
+        return
+    exp = _GF_EXP
+    log = _GF_LOG
+    lc  = log[coef]
+    for i in range(len(src)):
+        s = src[i]
+        if s != 0: dst[i] ^= exp[lc + log[s]]
+
+if platdeps.numpy is not None:
+    # host with numpy, vectorise with a full 256x256 multiply table
+    _np = platdeps.numpy
+    _gf_mul_table = None
+
+    def gf_mul_acc(dst:bytearray, src, coef:int) -> None:
+        """dst ^= src * coef, for whole blocks of the same length"""
+        global _gf_mul_table
+        if coef == 0: return
+        if _gf_mul_table is None:
+            log = _np.frombuffer(bytes(_GF_LOG), dtype=_np.uint8).astype(_np.int32)
+            exp = _np.frombuffer(bytes(_GF_EXP), dtype=_np.uint8)
+            _gf_mul_table = exp[log[:, None] + log[None, :]]
+            _gf_mul_table[0, :] = 0
+            _gf_mul_table[:, 0] = 0
+        d = _np.frombuffer(dst, dtype=_np.uint8)
+        d ^= _gf_mul_table[coef][_np.frombuffer(src, dtype=_np.uint8)]
+
+class ReedSolomon:
+    """Systematic erasure code, K data rows and M parity rows, K+M <= 256"""
+    def __init__(self, k:int, m:int):
+        if k < 1 or m < 0 or k+m > 256:
+            raise ValueError("bad FEC group, k:%d m:%d" % (k, m))
+        self._k = k
+        self._m = m
+        # cauchy 1/(x^y), x=k+j for parity j, y=i for data i, every square
+        # submatrix is invertible, so any k rows of the code can be solved.
+        # Scale columns so parity row 0 is all 1's (XOR), that keeps that property.
+        self._coefs = []  # of bytearray(k), one per parity row
+        for j in range(m):
+            row = bytearray(k)
+            for i in range(k):
+                row[i] = gf_mul(gf_inv((k+j) ^ i), k ^ i)
+            self._coefs.append(row)
+
+    def encode(self, blocks:list) -> list:  # of bytearray
+        """Make M parity blocks from K data blocks, all the same length"""
+        ##assert len(blocks) == self._k
+        nbytes = len(blocks[0])
+        parity = []
+        for row in self._coefs:
+            p = bytearray(nbytes)
+            for i in range(self._k):
+                gf_mul_acc(p, blocks[i], row[i])
+            parity.append(p)
+        return parity
+
+    def _row(self, index:int) -> bytearray:
+        """Generator row for a data index (0..k-1) or parity index (k..k+m-1)"""
+        if index < self._k:
+            row = bytearray(self._k)
+            row[index] = 1
+            return row
+        return bytearray(self._coefs[index - self._k])
+
+    def decode(self, rows:list, want:list) -> list:  # of bytearray
+        """rows are k (index, data) pairs, rebuild the data rows in want"""
+        k = self._k
+        ##assert len(rows) == k
+        # invert the generator rows we have, with gauss-jordan elimination
+        a   = [self._row(index) for index, _ in rows]
+        inv = [self._row(i) for i in range(k)]
+        for col in range(k):
+            pivot = col
+            while a[pivot][col] == 0:
+                pivot += 1  # never runs off, as the matrix is invertible
+            a[col], a[pivot]     = a[pivot], a[col]
+            inv[col], inv[pivot] = inv[pivot], inv[col]
+            scale = gf_inv(a[col][col])
+            for c in range(k):
+                a[col][c]   = gf_mul(a[col][c], scale)
+                inv[col][c] = gf_mul(inv[col][c], scale)
+            for r in range(k):
+                f = a[r][col]
+                if r != col and f != 0:
+                    for c in range(k):
+                        a[r][c]   ^= gf_mul(f, a[col][c])
+                        inv[r][c] ^= gf_mul(f, inv[col][c])
+
+        nbytes = len(rows[0][1])
+        result = []
+        for i in want:
+            d = bytearray(nbytes)
+            for j in range(k):
+                gf_mul_acc(d, rows[j][1], inv[i][j])
+            result.append(d)
+        return result
+
+class BlockFEC:
+    """Number the data and parity blocks of a file, and encode/recover groups"""
+    # Data blocks keep their normal blocknos 0..ndata-1, parity blocks follow on
+    # from ndata, M per group. The last group may have fewer than K data blocks.
+    def __init__(self, k:int, m:int, blocksz:int, nblocks:int, lastblock:int):
+        self._k = k
+        self._m = m
+        self._blocksz   = blocksz
+        self._lastblock = lastblock
+        self._ndata     = nblocks + (1 if lastblock != 0 else 0)
+        self._ngroups   = (self._ndata + k - 1) // k
+        self._codecs    = {}  # group size -> ReedSolomon
+        self._parity    = {}  # group -> {j: bytes}, receiver side, until the group is done
+        ReedSolomon(k, m)  # early ValueError if k,m are bad
+
+    def get_k_m(self) -> tuple:  # of (k:int, m:int)
+        return self._k, self._m
+
+    def get_ndata(self) -> int:
+        """Number of data blocks, parity blocknos start here"""
+        return self._ndata
+
+    def get_nblocks(self) -> int:
+        """Total number of data and parity blocks"""
+        return self._ndata + self._ngroups * self._m
+
+    def parity_index(self, blockno:int) -> int:
+        """Which parity block (0..M-1) of its group this is"""
+        return (blockno - self._ndata) % self._m
+
+    def is_parity(self, blockno:int) -> bool:
+        return self._ndata <= blockno < self.get_nblocks()
+
+    def group_of(self, blockno:int) -> int:
+        if blockno < self._ndata: return blockno // self._k
+        return (blockno - self._ndata) // self._m
+
+    def _data_of(self, group:int) -> tuple:  # of (first:int, count:int)
+        first = group * self._k
+        return first, min(self._k, self._ndata - first)
+
+    def _codec(self, count:int) -> ReedSolomon:
+        if count not in self._codecs:
+            self._codecs[count] = ReedSolomon(count, self._m)
+        return self._codecs[count]
+
+    def _len_of(self, blockno:int) -> int:
+        if blockno == self._ndata-1 and self._lastblock != 0: return self._lastblock
+        return self._blocksz
+
+    def _read_group(self, first:int, count:int, read_fn:callable, present=None) -> list:  # of (i, bytes)
+        """Read data blocks of a group, zero padded to blocksz"""
+        rows = []
+        for i in range(count):
+            blockno = first + i
+            if present is not None and not present[blockno]: continue
+            data = read_fn(self._len_of(blockno), blockno * self._blocksz)
+            if len(data) < self._blocksz:
+                data = bytes(data) + bytes(self._blocksz - len(data))
+            rows.append((i, data))
+        return rows
+
+    def send_order(self, seqno:int) -> int or None:
+        """blockno to send at this position in the sequence, None when done"""
+        full = (self._ngroups-1) * (self._k + self._m)
+        if seqno < full:
+            group, r = divmod(seqno, self._k + self._m)
+        else:
+            group, r = self._ngroups-1, seqno-full
+        first, count = self._data_of(group)
+        if r < count:       return first + r
+        if r < count + self._m: return self._ndata + group * self._m + r - count
+        return None  # all sent
+
+    def encode_group(self, group:int, read_fn:callable) -> list:  # of parity:bytearray
+        """Read the data blocks of a group, and make its parity blocks"""
+        first, count = self._data_of(group)
+        rows = self._read_group(first, count, read_fn)
+        return self._codec(count).encode([data for _, data in rows])
+
+    def add_parity(self, blockno:int, data) -> None:
+        """Keep a parity block, until its group can be recovered"""
+        group = self.group_of(blockno)
+        if group not in self._parity: self._parity[group] = {}
+        self._parity[group][self.parity_index(blockno)] = bytes(data[:])
+
+    def recover(self, group:int, present, read_fn:callable) -> list:  # of (blockno, data)
+        """Rebuild missing data blocks of a group, if enough blocks have arrived"""
+        #NOTE: parity is held in RAM only for groups that are still incomplete
+        first, count = self._data_of(group)
+        missing = [i for i in range(count) if not present[first+i]]
+        parity  = self._parity.get(group, {})
+        if len(missing) == 0 or count - len(missing) + len(parity) < count:
+            if len(missing) == 0 and group in self._parity: del self._parity[group]
+            return []  # nothing to do, or can't do it yet
+
+        rows = self._read_group(first, count, read_fn, present)
+        for j in parity:
+            if len(rows) == count: break
+            rows.append((count+j, parity[j]))
+        data = self._codec(count).decode(rows, missing)
+        del self._parity[group]
+        return [(first+i, d[:self._len_of(first+i)]) for i, d in zip(missing, data)]
+
+
+# Fountain (LT) codes are rateless, a sender can make an endless stream of
+# symbols, and a receiver can rebuild N blocks from any ~N+a few percent of them.
+# Each symbol is the XOR of 'degree' blocks, chosen from its seed, by the same
+# small PRNG on host and pico, so seeds don't depend on the platform.
+
+def _xorshift32(x:int) -> int:
+    x ^= (x << 13) & 0xFFFFFFFF
+    x ^= x >> 17
+    x ^= (x << 5) & 0xFFFFFFFF
+    return x
+
+class LTCode:
+    """Luby Transform degrees and neighbours, for N source blocks"""
+    C     = 0.1  # robust soliton tuning
+    DELTA = 0.5
+
+    def __init__(self, nblocks:int):
+        self._n   = nblocks
+        self._cdf = None  # sender only, built on first degree_of()
+
+    def _build_cdf(self) -> list:  # of float
+        """Cumulative robust soliton distribution, for degrees 1..N"""
+        n = self._n
+        r = self.C * math.log(n / self.DELTA) * math.sqrt(n)
+        spike = int(n / r) if r > 0 else n
+        pdf = [0.0] * (n+1)
+        for d in range(1, n+1):
+            rho = 1.0/n if d == 1 else 1.0/(d*(d-1))
+            tau = 0.0
+            if   d < spike:  tau = r / (d*n)
+            elif d == spike: tau = r * math.log(r / self.DELTA) / n
+            pdf[d] = rho + max(tau, 0.0)
+        total = sum(pdf)
+        cdf = []
+        acc = 0.0
+        for d in range(1, n+1):
+            acc += pdf[d] / total
+            cdf.append(acc)
+        return cdf
+
+    def degree_of(self, seed:int) -> int:
+        """How many blocks the symbol for this seed XORs together"""
+        if self._cdf is None: self._cdf = self._build_cdf()
+        x = _xorshift32(((seed ^ 0x5A5A5A5A) * 0x9E3779B1 + 1) & 0xFFFFFFFF) or 1
+        p = x / 4294967296.0
+        lo, hi = 0, len(self._cdf)-1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._cdf[mid] < p: lo = mid+1
+            else:                  hi = mid
+        return lo+1
+
+    def neighbours(self, seed:int, degree:int) -> list:  # of blockno
+        """The distinct blocks that make up the symbol for this seed"""
+        ##assert 1 <= degree <= self._n
+        x = ((seed * 0x9E3779B1) + 1) & 0xFFFFFFFF or 1
+        picks = []
+        while len(picks) < degree:
+            x = _xorshift32(x)
+            b = x % self._n
+            if b not in picks: picks.append(b)
+        return picks
+
+
 #===== READERS AND WRITERS =====================================================
 
 class FileReader:
@@ -580,6 +1009,9 @@ class FileReader:
 
     def __del__(self) -> None:
         """Close the file, if still open"""
+        self.close()
+
+    def close(self) -> None:
         if self._f is not None:
             self._f.close()
             self._f = None
@@ -601,99 +1033,376 @@ class FileReader:
         if len(data) == 0:  return None  #EOF
         return data
 
+class WStats:
+    """Blocks a writer was given, and the OS calls it took to write them"""
+    def __init__(self):
+        self._nblocks   = 0  # write() calls with data
+        self._nwrites   = 0  # write/pwritev calls to the OS
+        self._nsyscalls = 0  # all OS calls, seeks included
+        self._nflushes  = 0  # times held blocks were written out
+        self._nsyncs    = 0  # fsync calls
+        self._held      = 0  # most bytes of blocks held in RAM at once
+        self._spilled   = 0  # bytes of blocks moved out of RAM before commit
+        self._start     = None  # time_time of the first block
+        self._end       = None  # time_time of the last OS write
+
+    def block(self) -> None:
+        if self._start is None: self._start = platdeps.time_time()
+        self._nblocks += 1
+
+    def wrote(self, nsyscalls:int=1) -> None:
+        self._nwrites   += 1
+        self._nsyscalls += nsyscalls
+        self._end = platdeps.time_time()
+
+    def synced(self) -> None:
+        self._nsyncs    += 1
+        self._nsyscalls += 1
+
+    def flushed(self) -> None:
+        self._nflushes += 1
+
+    def held(self, nbytes:int) -> None:
+        if nbytes > self._held: self._held = nbytes
+
+    def spilled(self, nbytes:int) -> None:
+        self._spilled += nbytes
+
+    def get_writes_per_sec(self) -> float:
+        if self._start is None or self._end is None or self._end <= self._start: return float(self._nwrites)
+        return self._nwrites / (self._end - self._start)
+
+    def has_data(self) -> bool:
+        return self._nblocks != 0
+
+    def __str__(self) -> str:
+        return "blocks:%d writes:%d syscalls:%d flushes:%d syncs:%d held:%d spilled:%d writes/s:%d" % (
+            self._nblocks,
+            self._nwrites,
+            self._nsyscalls,
+            self._nflushes,
+            self._nsyncs,
+            self._held,
+            self._spilled,
+            int(self.get_writes_per_sec()))
+
+class HashFrontier:
+    """A running sha256 of the contiguous prefix of blocks written so far"""
+    # Blocks can arrive in any order. The hasher is fed every block up to the
+    # first gap, and when a gap fills, the blocks beyond it that have already
+    # been written are read back and fed in until the next gap. So by the time
+    # the last block arrives, there is nothing (or very little) left to hash.
+    # A long run of early blocks is read back CATCH_UP at a time, by written()
+    # and the writer's poll(), so the link is never left for long, and digest()
+    # (on a worker) finishes whatever is left.
+    # A block rewritten behind the frontier can't be un-hashed, so that gives
+    # up, and the writer falls back to hashing the whole file.
+
+    CATCH_UP = 8  # blocks read back per call
+
+    def __init__(self, blocksz:int, nblocks:int, lastblock:int, read_fn) -> None:
+        self._blocksz   = blocksz
+        self._lastblock = lastblock
+        self._total     = nblocks + (1 if lastblock != 0 else 0)
+        self._read_fn   = read_fn  # (nbytes, offset) -> bytes
+        self._written   = BitSet(self._total)
+        self._hasher    = platdeps.hashlib_sha256()
+        self._next      = 0  # blockno of the first block not yet hashed
+
+    def _len_of(self, blockno:int) -> int:
+        if blockno == self._total-1 and self._lastblock != 0: return self._lastblock
+        return self._blocksz
+
+    def written(self, blockno:int, data:Buffer or bytes) -> None:
+        """This block has just been written, advance the frontier if it can"""
+        if self._hasher is None: return  # already given up
+        if blockno < self._next or blockno >= self._total:
+            self._hasher = None  # rewrite of a block already hashed
+            return
+
+        self._written[blockno] = True
+        if blockno != self._next: return  # leaves a gap, read back later
+
+        if isinstance(data, Buffer): data.read_with(self._hasher.update)
+        else:                        self._hasher.update(data)
+        self._next += 1
+        self.catch_up(self.CATCH_UP)  # gap just filled, poll() does the rest
+
+    def catch_up(self, limit:int or None=None) -> None:
+        """Hash blocks that arrived early, up to the next gap, or at most limit of them"""
+        if self._hasher is None: return  # given up
+        n = 0
+        while self._next < self._total and self._written[self._next]:
+            if limit is not None and n >= limit: return  # more next time
+            self._hasher.update(self._read_fn(self._len_of(self._next), self._next * self._blocksz))
+            self._next += 1
+            n += 1
+
+    def digest(self) -> bytes or None:
+        """The sha256 of the whole file, or None if it is not yet known"""
+        self.catch_up()  # whatever poll() didn't get to
+        if self._hasher is None or self._next != self._total: return None
+        return self._hasher.digest()
+
+def write_fully(f, data) -> int:
+    """Write all of data, an unbuffered file can take less than it is given, number of writes"""
+    view = memoryview(data)
+    done, nwrites = 0, 0
+    while done < len(view):
+        n = f.write(view[done:])
+        nwrites += 1
+        if not n: raise OSError("write made no progress, at:%d of %d" % (done, len(view)))
+        done += n
+    return nwrites
+
+def write_extent(f, offset:int, chunks:list, stats:WStats, max_iov:int=1024) -> None:
+    """Write chunks that sit next to each other in the file, starting at offset"""
+    if platdeps.pwritev is not None:
+        for i in range(0, len(chunks), max_iov):
+            group = chunks[i:i+max_iov]
+            while len(group) != 0:
+                n = platdeps.pwritev(f.fileno(), group, offset)
+                stats.wrote()
+                if n <= 0: raise OSError("pwritev made no progress, at:%d" % offset)
+                offset += n
+                # a short write, carry on from where it stopped
+                while len(group) != 0 and n >= len(group[0]):
+                    n -= len(group[0])
+                    group.pop(0)
+                if n != 0: group[0] = memoryview(group[0])[n:]
+    else:
+        f.seek(offset)
+        stats.wrote(1 + write_fully(f, b"".join(chunks)))
+
 class CachedFileWriter:
     """Cache data into RAM until it is verified, commit to disk after verification"""
-    """Write a random access disk file, streamed, or at any position"""
-    PREALLOC  = 0 # cached, but pre-alloc all required bytearray()s at start()
-    ON_DEMAND = 1 # cached, but create new bytes() on each call to write()
-
-    def __init__(self, mode):
+    # Blocks are copied into memoryview slices of an arena, rather than being a
+    # heap object each. The arena is one bytearray on host. The Pico heap won't
+    # give much more than about 1K at a time, so there it is a chain of CHUNK
+    # sized bytearrays, each holding whole blocks.
+    # A file bigger than the budget gets an arena of budget bytes of block slots,
+    # and when every slot is in use, the coldest half, the lowest blocks, which the
+    # hash frontier has usually passed, is spilled to the temp file in extents.
+    # Commit is then one write per chunk of the arena to the file, or if anything
+    # was spilled, the blocks still held go into the temp file, and it is renamed.
+    # Spilling writes to the file system mid transfer, which is what caching
+    # avoids on the Pico, so there a file bigger than the budget is refused.
+    PREALLOC  = 0 # cached, the arena is allocated at start()
+    ON_DEMAND = 1 # cached, the arena is allocated at the first write(), might get MemoryError later
+    TEMP_NAME = "_INPROGRESS.tmp"  # only made if blocks are spilled
+    CHUNK     = platdeps.ARENA_CHUNK  # bytes per bytearray, None is one for the whole arena
+    SPILL     = platdeps.CACHE_SPILL  # False refuses files bigger than the budget
+
+    def __init__(self, mode, budget:int or None=None, temp_name:str=TEMP_NAME):
         self._name = None
-        self._file = None
-        self._bufs  = None
+        self._temp_name = temp_name
+        self._file = None  # the temp file, once blocks are spilled
+        self._chunks = None  # of bytearray, the arena
+        self._views  = None  # a memoryview of each chunk
+        self._per_chunk = None  # slots in each chunk
+        self._slot_of = None  # blockno -> slot in the arena, -1 if not held, None when slot is blockno
+        self._free    = None  # slots not in use
+        self._spilled = None  # BitSet of blocks in the temp file
         #NOTE: this 3-tuple might make a nice class abstraction
         self._blocksz = None
         self._nblocks = None
         self._lastblock = None
         self._mode = mode
+        self._budget = budget  # bytes of RAM for blocks, None is the whole file
+        self._frontier = None
+        self._stats = WStats()
 
     def start(self, name:str, blocksz:int, nblocks:int, lastblock:int) -> None:  # exception if file too big
         """Start a buffer for a file of this size"""
-        # The Pico doesn't allow large block sizes bigger than about 1K at a time,
-        # so we allocate a chain of blocks that align with the receive block size
-        # as that is always quite naturally small.
         assert self._name is None, "start() when already running"
+        size  = nblocks*blocksz + lastblock
+        total = nblocks + (1 if lastblock != 0 else 0)
+        fits  = self._budget is None or self._budget >= size
+        if not fits and not self.SPILL:
+            raise MemoryError("file too big to cache, size:%d budget:%d" % (size, self._budget))
         self._name = name
-
-        if self._mode == self.PREALLOC:
-            # pre-allocated buffer scheme (but copy process is slow)
-            gc.collect()
-            self._bufs = [bytearray(blocksz) for _ in range(nblocks)]
-            if lastblock != 0: self._bufs.append(bytearray(lastblock))
-
-        elif self._mode == self.ON_DEMAND:
-            # allocate on demand buffer scheme (copy fast, but might get MemoryError later)
-            # allocate empty slots so we can fast index later
-            self._bufs = [None for _ in range(nblocks)]
-            if lastblock != 0: self._bufs.append(None)
-
         self._blocksz = blocksz
         self._nblocks = nblocks
         self._lastblock = lastblock
 
+        if fits:
+            self._slot_of = None  # it all fits, so each block is at its own offset
+            nslots = total
+        else:
+            self._slot_of = array("i", [-1 for _ in range(total)])
+            nslots = max(2, self._budget // blocksz)
+            self._free = list(range(nslots - 1, -1, -1))
+        if self.CHUNK is None: self._per_chunk = max(1, nslots)
+        else:                  self._per_chunk = max(1, self.CHUNK // blocksz)
+        self._frontier = HashFrontier(blocksz, nblocks, lastblock, self.read)
+
+        if self._mode == self.PREALLOC: self._alloc()
+        # ON_DEMAND waits for the first block
+
+    def _alloc(self) -> None:
+        gc.collect()
+        if self._slot_of is None:
+            nslots = self._nblocks + (1 if self._lastblock != 0 else 0)
+            nbytes = self._nblocks*self._blocksz + self._lastblock
+        else:
+            nslots = len(self._free)
+            nbytes = nslots * self._blocksz
+        self._chunks = []
+        self._views  = []
+        chunksz = self._per_chunk * self._blocksz
+        for start in range(0, nslots, self._per_chunk):
+            chunk = bytearray(min(chunksz, nbytes - start*self._blocksz))  # exception if not enough RAM
+            self._chunks.append(chunk)
+            self._views.append(memoryview(chunk))
+        self._stats.held(nbytes)
+
+    def _locate(self, slot:int) -> tuple:  # of (view:memoryview, start:int)
+        chunkno, i = divmod(slot, self._per_chunk)
+        return self._views[chunkno], i * self._blocksz
+
+    def set_temp_name(self, temp_name:str) -> None:
+        """Name of the temp file, before start()"""
+        assert self._file is None, "set_temp_name() - file is open"
+        self._temp_name = temp_name
+
+    def _len_of(self, blockno:int) -> int:
+        if blockno == self._nblocks: return self._lastblock
+        return self._blocksz
+
     #NOTE: this should be a blockno interface really, as we have blocks in start()
     def write(self, data:Buffer or None, offset:int or None=None) -> None:
         """A new data block has arrived, cache or write it to the file"""
         if data is None:      return  # EOF
         if len(data) is None: return  #NODATA
 
-        if self._bufs is None:
+        if self._name is None:
             # this might actually happen in real life, so don't assert
             platdeps.message("warning: ignoring data before META_START message, size not yet known")
             return
 
-        blockno  = int(offset / self._blocksz)  # index into buffer chain
+        blockno  = int(offset / self._blocksz)  # slot in the arena
         residual = offset % self._blocksz
         if residual != 0:
             raise ValueError("offset alignment error %d does not align to %d" % (offset, self._blocksz))
 
-        if self._mode == self.ON_DEMAND:
-            # fast-copy bytes from Buffer into on-demand bytes, using buffer-protocol
-            self._bufs[blockno] = bytes(data[:])
-
-        elif self._mode == self.PREALLOC:
-            # fast-copy bytes from Buffer into prealloc bytearray, using buffer-protocol
-            self._bufs[blockno][:] = data[:]
+        self._stats.block()
+        if self._chunks is None: self._alloc()  # ON_DEMAND
+        if self._slot_of is None:
+            slot = blockno
+        else:
+            slot = self._slot_of[blockno]
+            if slot < 0:
+                if len(self._free) == 0: self.spill()
+                slot = self._free.pop()
+                self._slot_of[blockno] = slot
+
+        # fast-copy bytes from Buffer into the arena, using buffer-protocol
+        view, start = self._locate(slot)
+        view[start:start+len(data)] = data[:]
+        self._frontier.written(blockno, data)
+
+    def spill(self) -> None:
+        """The arena is full, write the coldest half of it to the temp file"""
+        if self._file is None:
+            self._file = platdeps.open_unbuffered(self._temp_name, "w+b")  # exception if can't create file
+            self._spilled = BitSet(len(self._slot_of))
+        held = [blockno for blockno in range(len(self._slot_of)) if self._slot_of[blockno] >= 0]
+        cold = held[:max(1, len(held) // 2)]
+        self._write_blocks(cold)
+        for blockno in cold:
+            self._stats.spilled(self._len_of(blockno))
+            self._free.append(self._slot_of[blockno])
+            self._slot_of[blockno] = -1
+            self._spilled[blockno] = True
+        self._stats.flushed()
+
+    def _write_blocks(self, blocknos:list) -> None:
+        """Write these held blocks, in blockno order, to the temp file as extents"""
+        start  = None
+        chunks = []
+        for blockno in blocknos:
+            if start is not None and blockno != start + len(chunks):
+                write_extent(self._file, start * self._blocksz, chunks, self._stats)
+                start = None
+            if start is None:
+                start  = blockno
+                chunks = []
+            view, i = self._locate(self._slot_of[blockno])
+            chunks.append(view[i:i+self._len_of(blockno)])
+        if start is not None: write_extent(self._file, start * self._blocksz, chunks, self._stats)
+
+    def read(self, nbytes:int, offset:int):
+        """Read back a block that has already been written"""
+        blockno = int(offset / self._blocksz)
+        if self._slot_of is None:                      slot = blockno
+        else:                                          slot = self._slot_of[blockno]
+        if slot >= 0 and self._chunks is not None:
+            view, start = self._locate(slot)
+            return bytes(view[start:start+nbytes])
+        if self._spilled is not None and self._spilled[blockno]:
+            self._file.seek(offset)
+            return self._file.read(nbytes)
+        return bytes(nbytes)  # not received yet
+
+    def poll(self) -> None:
+        """Nothing to write out, until commit, but the hash can catch up"""
+        if self._frontier is not None: self._frontier.catch_up(HashFrontier.CATCH_UP)
+
+    def get_stats(self) -> WStats:
+        return self._stats
 
     def get_sha256(self) -> bytes:
-        """Sha256 sum the buf, for integrity checking"""
-        assert self._bufs is not None, "get_sha256() with empty bufs"
-        def sha256_of_buf(buf) -> bytes:
-            hasher = platdeps.hashlib_sha256()
-            for b in buf:
-                hasher.update(b)  # auto adjusts to each bytearray size
-            digest = hasher.digest()
-            assert len(digest) == 32
-            return digest
-        return sha256_of_buf(self._bufs)
+        """Sha256 sum the arena, and anything spilled, for integrity checking"""
+        assert self._name is not None, "get_sha256() with empty arena"
+        digest = self._frontier.digest()
+        if digest is not None: return digest  # hashed as it arrived
+
+        hasher = platdeps.hashlib_sha256()
+        if self._slot_of is None:
+            if self._chunks is not None:
+                for view in self._views: hasher.update(view)  # in order already
+        else:
+            for blockno in range(len(self._slot_of)):
+                hasher.update(self.read(self._len_of(blockno), blockno * self._blocksz))
+        digest = hasher.digest()
+        assert len(digest) == 32
+        return digest
 
     def _invalidate(self):
         """Invalidate and delete any stored state"""
-        self._bufs = None  # the whole buf chain will gc.collect
+        self._views  = None
+        self._chunks = None  # the whole arena will gc.collect
+        self._slot_of = None
+        self._free    = None
+        self._spilled = None
+        self._frontier = None
         if self._file is not None:
             self._file.close()
             self._file = None
+            try:
+                platdeps.os_unlink(self._temp_name)
+            except OSError: pass  # already gone
         self._name = None
         gc.collect()
 
     def commit(self) -> None:
         """Commit any cached data, and cleanup"""
-        assert self._bufs is not None, "commit() with empty buffs"
         assert self._name is not None, "commit() with no named file"
-        assert self._file is None, "commit() with already-open file"
-        self._file = open(self._name, "wb")  # exception if fails
-        for buf in self._bufs:
-            self._file.write(buf)
+        if self._slot_of is None:
+            # the whole file is in the arena, in order, so a write per chunk
+            f = open(self._name, "wb")  # exception if fails
+            if self._chunks is not None:
+                for view in self._views:
+                    f.write(view)
+                    self._stats.wrote()
+            f.close()
+        else:
+            if self._file is None: self._file = platdeps.open_unbuffered(self._temp_name, "w+b")
+            self._write_blocks([blockno for blockno in range(len(self._slot_of)) if self._slot_of[blockno] >= 0])
+            self._file.close()
+            self._file = None
+            platdeps.os_rename(self._temp_name, self._name)  # exception if can't rename
+        self._stats.flushed()
 
         self._invalidate()
 
@@ -703,27 +1412,70 @@ class CachedFileWriter:
 
 class ImmediateFileWriter:
     """Write data to disk file as it arrives, verify by re-reading and rename"""
-    TEMP_NAME = "_INPROGRESS.tmp"  #NOTE: generate this name to be unique
-
-    def __init__(self):
+    # Blocks are held in RAM until BUDGET bytes of them are waiting, or nothing
+    # has arrived for IDLE_MS, or the file is checked. Then blocks that sit next
+    # to each other are merged into extents, and each extent is one pwritev()
+    # (or seek and write) instead of a seek and write per block.
+    # The file is made its final size at start(), so it isn't grown block by
+    # block. How often it is fsync'd trades crash safety against throughput.
+    TEMP_NAME   = "_INPROGRESS.tmp"  # FileReceiver gives each transfer its own
+    BUDGET      = platdeps.WRITE_BUDGET  # 0 writes each block straight through
+    IDLE_MS     = 200
+    MAX_IOV     = 1024  # IOV_MAX on Linux, buffers per pwritev()
+    SYNC_NONE   = -1  # leave it to the OS
+    SYNC_COMMIT = 0   # fsync once, before the rename, >0 is also every that many bytes
+
+    def __init__(self, temp_name:str=TEMP_NAME, budget:int=BUDGET, sync:int=SYNC_NONE):
+        self._temp_name = temp_name
         self._name = None
         self._file = None
         #NOTE: this 3-tuple might make a nice class abstraction
         self._blocksz = None
         self._nblocks = None
         self._lastblock = None
-
-    def start(self, name:str, blocksz:int, nblocks:int, lastblock:int) -> None:  # exception if file too big
-        """Start a buffer for a file of this size"""
+        self._frontier = None
+        self._budget   = budget
+        self._pending  = {}  # offset -> bytes, not yet in the file
+        self._npending = 0   # bytes in _pending
+        self._last_ms  = None  # time_ms of the last block held
+        self._written_fn = None  # called with each offset, once it is in the file
+        self._sync     = sync
+        self._unsynced = 0  # bytes written since the last fsync
+        self._stats = WStats()
+
+    def start(self, name:str, blocksz:int, nblocks:int, lastblock:int, resume:bool=False) -> bool:  # exception if file too big
+        """Start a buffer for a file of this size, True if an old temp file was reopened"""
         # The Pico doesn't allow large block sizes bigger than about 1K at a time,
         # so we allocate a chain of blocks that align with the receive block size
         # as that is always quite naturally small.
         assert self._name is None, "start() - already started"
-        self._file      = open(self.TEMP_NAME, "wb")  # exception if can't create file
+        resumed = False
+        if resume:
+            try:
+                self._file = platdeps.open_unbuffered(self._temp_name, "r+b")  # keep what is already there
+                resumed = True
+            except OSError: pass  # gone, so start again
+        if not resumed:
+            self._file  = platdeps.open_unbuffered(self._temp_name, "w+b")  # exception if can't create file
+        if platdeps.preallocate is not None:
+            platdeps.preallocate(self._file, nblocks*blocksz + lastblock)
         self._name      = name
         self._blocksz   = blocksz
         self._nblocks   = nblocks
         self._lastblock = lastblock
+        # blocks already in a resumed file were never seen, so it must be hashed in full
+        if resumed: self._frontier = None
+        else:       self._frontier = HashFrontier(blocksz, nblocks, lastblock, self.read)
+        return resumed
+
+    def set_written_fn(self, written_fn:callable or None) -> None:
+        """written_fn(offset) is called once each block is in the file, not just held"""
+        self._written_fn = written_fn
+
+    def set_temp_name(self, temp_name:str) -> None:
+        """Name of the temp file, before start()"""
+        assert self._file is None, "set_temp_name() - file is open"
+        self._temp_name = temp_name
 
     #NOTE: this should be a blockno interface really, as we have blocks in start()
     def write(self, data:Buffer or None, offset:int or None=None) -> None:
@@ -732,33 +1484,435 @@ class ImmediateFileWriter:
         if data is None:  return # EOF
         elif len(data) == 0:  return # NODATA
 
+        self._stats.block()
+        if self._budget == 0:
+            self._file.seek(offset)
+            self._stats.wrote(1 + write_fully(self._file, data[:]))
+            self.wrote(len(data))
+            if self._written_fn is not None: self._written_fn(offset)
+        else:
+            old = self._pending.get(offset)
+            if old is not None: self._npending -= len(old)  # a rewrite, the newest wins
+            self._pending[offset] = bytes(data[:])
+            self._npending += len(data)
+            self._stats.held(self._npending)
+            self._last_ms = platdeps.time_ms()
+        if self._frontier is not None:
+            self._frontier.written(offset // self._blocksz, data)
+        if self._budget != 0 and self._npending >= self._budget: self.write_pending()
+
+    def poll(self) -> None:
+        """Called often, writes out held blocks once nothing has arrived for a while"""
+        if self._frontier is not None: self._frontier.catch_up(HashFrontier.CATCH_UP)
+        if self._last_ms is not None and platdeps.ticks_diff(platdeps.time_ms(), self._last_ms) >= self.IDLE_MS:
+            self.write_pending()
+
+    def write_pending(self) -> None:
+        """Merge held blocks into extents, and write each extent in one go"""
+        self._last_ms = None
+        if len(self._pending) == 0: return
+        offsets = sorted(self._pending)
+        start  = offsets[0]
+        end    = start
+        chunks = []
+        for offset in offsets:
+            if offset != end:
+                self._write_extent(start, chunks)
+                start  = offset
+                chunks = []
+            chunk = self._pending[offset]
+            chunks.append(chunk)
+            end = offset + len(chunk)
+        self._write_extent(start, chunks)
+        self._stats.flushed()
+
+        self._pending  = {}
+        self._npending = 0
+        if self._written_fn is not None:
+            for offset in offsets: self._written_fn(offset)
+
+    def _write_extent(self, offset:int, chunks:list) -> None:
+        write_extent(self._file, offset, chunks, self._stats, self.MAX_IOV)
+        for chunk in chunks: self.wrote(len(chunk))
+
+    def wrote(self, nbytes:int) -> None:
+        """Some bytes went to the OS, fsync if the policy says they are due"""
+        self._unsynced += nbytes
+        if self._sync > 0 and self._unsynced >= self._sync: self.fsync()
+
+    def fsync(self) -> None:
+        """Make sure everything written so far is on the disk"""
+        platdeps.fsync(self._file)
+        self._stats.synced()
+        self._unsynced = 0
+
+    def flush(self) -> None:
+        """Push written data out of our buffers, before it is checkpointed"""
+        self.write_pending()
+        if self._file is not None: self._file.flush()
+
+    def read(self, nbytes:int, offset:int):
+        """Read back a block that has already been written"""
+        assert self._file is not None, "read() - file is not open"
+        block = self._pending.get(offset)
+        if block is not None: return block[:nbytes]  # still held
         self._file.seek(offset)
-        data.read_with(self._file.write)
+        return self._file.read(nbytes)
 
-    def get_sha256(self) -> bytes:
-        """Get the sha256 of the temporary file, for integrity check"""
+    def get_stats(self) -> WStats:
+        return self._stats
+
+    def _close(self) -> None:
         if self._file is not None:
+            self.write_pending()
+            if self._sync != self.SYNC_NONE and self._unsynced != 0: self.fsync()
             self._file.close()
             self._file = None
-        return sha256_of_file(self.TEMP_NAME)
+
+    def get_sha256(self) -> bytes:
+        """Get the sha256 of the temporary file, for integrity check"""
+        digest = None
+        if self._frontier is not None:
+            digest = self._frontier.digest()  # might read back a few blocks, so before the close
+            self._frontier = None  # file is closed next, no more read-backs
+        self._close()
+        if digest is not None: return digest  # hashed as it arrived
+        return sha256_of_file(self._temp_name)
 
     def commit(self) -> None:
         """Commit the temporary file by renaming it to the final file"""
+        self._close()
         ##try:
         ##    platdeps.os_unlink(self._name)  # exception if can't delete
         ##except FileNotFoundError: pass
-        platdeps.os_rename(self.TEMP_NAME, self._name)  # exception if can't rename
+        platdeps.os_rename(self._temp_name, self._name)  # exception if can't rename
+
+    def abort(self) -> None:
+        """Abort the current transfer and cleanup"""
+        self._frontier = None
+        self._pending  = {}
+        self._npending = 0
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        platdeps.os_unlink(self._temp_name)  # exception if can't delete
+
+class MmapFileWriter:
+    """Map the temp file into memory, so each block is a copy, with no syscall"""
+    # Host only (platdeps.mmap). The file is made its final size from META and
+    # mapped whole. Blocks are in the page cache as soon as they are copied, so
+    # they survive the process dying, and commit is just a rename.
+    TEMP_NAME = ImmediateFileWriter.TEMP_NAME
+
+    def __init__(self, temp_name:str=TEMP_NAME, sync:int=ImmediateFileWriter.SYNC_NONE):
+        if platdeps.mmap is None: raise ValueError("MmapFileWriter needs mmap, not on this platform")
+        self._temp_name = temp_name
+        self._name = None
+        self._file = None
+        self._map  = None  # None for an empty file, which can't be mapped
+        self._view = None  # of the whole map, released before it is closed
+        self._blocksz = None
+        self._frontier = None
+        self._written_fn = None
+        self._sync     = sync  # as ImmediateFileWriter
+        self._unsynced = 0
+        self._stats = WStats()
+
+    def start(self, name:str, blocksz:int, nblocks:int, lastblock:int, resume:bool=False) -> bool:  # exception if file too big
+        """Create and map a file of this size, True if an old temp file was reopened"""
+        assert self._name is None, "start() - already started"
+        resumed = False
+        if resume:
+            try:
+                self._file = open(self._temp_name, "r+b")  # keep what is already there
+                resumed = True
+            except OSError: pass  # gone, so start again
+        if not resumed:
+            self._file = open(self._temp_name, "w+b")  # exception if can't create file
+        size = nblocks*blocksz + lastblock
+        platdeps.preallocate(self._file, size)
+        if size != 0:
+            self._map  = platdeps.mmap.mmap(self._file.fileno(), size)
+            self._view = memoryview(self._map)
+        self._name     = name
+        self._blocksz  = blocksz
+        if resumed: self._frontier = None  # must be hashed in full
+        else:       self._frontier = HashFrontier(blocksz, nblocks, lastblock, self.read)
+        return resumed
+
+    def set_written_fn(self, written_fn:callable or None) -> None:
+        """written_fn(offset) is called once each block is in the file"""
+        self._written_fn = written_fn
+
+    def set_temp_name(self, temp_name:str) -> None:
+        """Name of the temp file, before start()"""
+        assert self._file is None, "set_temp_name() - file is open"
+        self._temp_name = temp_name
+
+    def write(self, data:Buffer or None, offset:int or None=None) -> None:
+        """A new data block has arrived, copy it into the mapping"""
+        assert self._file is not None, "write() - file is not open"
+        if data is None:  return # EOF
+        elif len(data) == 0:  return # NODATA
+
+        self._stats.block()
+        self._view[offset:offset+len(data)] = data[:]
+        self._unsynced += len(data)
+        if self._sync > 0 and self._unsynced >= self._sync: self.flush()
+        if self._written_fn is not None: self._written_fn(offset)
+        if self._frontier is not None:
+            self._frontier.written(offset // self._blocksz, data)
+
+    def poll(self) -> None:
+        """Nothing is held, it is all in the mapping, but the hash can catch up"""
+        if self._frontier is not None: self._frontier.catch_up(HashFrontier.CATCH_UP)
+
+    def flush(self) -> None:
+        """Write dirty pages to the disk"""
+        if self._map is not None:
+            self._map.flush()
+            self._stats.synced()
+        self._unsynced = 0
+
+    def read(self, nbytes:int, offset:int):
+        """Read back a block that has already been written"""
+        return bytes(self._view[offset:offset+nbytes])
+
+    def get_stats(self) -> WStats:
+        return self._stats
+
+    def _close(self) -> None:
+        if self._file is None: return
+        if self._sync != ImmediateFileWriter.SYNC_NONE and self._unsynced != 0: self.flush()
+        if self._map is not None:
+            self._view.release()
+            self._map.close()
+            self._view = None
+            self._map  = None
+        self._file.close()
+        self._file = None
+
+    def get_sha256(self) -> bytes:
+        """Get the sha256 of the temp file, straight from the mapping if it wasn't hashed as it arrived"""
+        digest = None
+        if self._frontier is not None:
+            digest = self._frontier.digest()
+            self._frontier = None
+        if digest is None and self._view is None:
+            digest = sha256_of_file(self._temp_name)  # empty, or already closed
+        elif digest is None:
+            hasher = platdeps.hashlib_sha256()
+            hasher.update(self._view)
+            digest = hasher.digest()
+        self._close()
+        return digest
+
+    def commit(self) -> None:
+        """Commit the temporary file by renaming it to the final file"""
+        self._close()
+        platdeps.os_rename(self._temp_name, self._name)  # exception if can't rename
 
     def abort(self) -> None:
         """Abort the current transfer and cleanup"""
-        platdeps.os_unlink(self.TEMP_NAME)  # exception if can't delete
+        self._frontier = None
+        self._close()
+        platdeps.os_unlink(self._temp_name)  # exception if can't delete
+
+
+class BlockmapSidecar:
+    """Checkpoint of the blocks safely written to a partial file, kept beside it"""
+    # U8 magic[4], U8 sha256[32], U32BE nblocks, then the blockmap, 8 blocks per byte.
+    # On host the blockmap is mmap'd, so it survives the process dying.
+    MAGIC      = b"DTBM"
+    HDR_LEN    = 4 + 32 + 4
+    SYNC_EVERY = 32  # blocks marked between syncs to disk
+
+    def __init__(self, name:str):
+        self._name    = name
+        self._file    = None
+        self._map     = None  # mmap, on platforms that have it
+        self._view    = None  # of the whole mmap, released before it is closed
+        self._flags   = None  # writable, the blockmap part
+        self._nmarked = 0
+
+    def open(self, sha256:bytes, nblocks:int) -> bool:
+        """Open or create the sidecar, True if it has progress for this same file"""
+        hdr = bytearray(self.MAGIC)
+        hdr.extend(sha256)
+        hdr.extend(nblocks.to_bytes(4, "big"))
+        size = self.HDR_LEN + (nblocks+7)//8
+        same = False
+        try:
+            self._file = open(self._name, "r+b")
+            same = self._file.read(self.HDR_LEN) == hdr and platdeps.filesize(self._name) == size
+        except OSError: pass  # no sidecar yet
+
+        if not same:
+            # none, or for a different file, so start a new one
+            if self._file is not None: self._file.close()
+            self._file = open(self._name, "w+b")
+            self._file.write(hdr)
+            self._file.write(bytes(size - self.HDR_LEN))
+            self._file.flush()
+
+        if platdeps.mmap is not None:
+            self._map   = platdeps.mmap.mmap(self._file.fileno(), size)
+            self._view  = memoryview(self._map)
+            self._flags = self._view[self.HDR_LEN:]
+        else:
+            self._file.seek(self.HDR_LEN)
+            self._flags = bytearray(self._file.read(size - self.HDR_LEN))
+        return same
+
+    def get_flags(self):  # packed bits, as BitSet.load() expects
+        return self._flags
+
+    def mark(self, blockno:int) -> None:
+        """This block is written to the partial file"""
+        self._flags[blockno>>3] |= 1<<(blockno&7)
+        self._nmarked += 1
+        if self._nmarked % self.SYNC_EVERY == 0: self.sync()
+
+    def unmark(self, blockno:int) -> None:
+        """This block has to be written again"""
+        self._flags[blockno>>3] &= ~(1<<(blockno&7)) & 0xFF
+
+    def clear(self) -> None:
+        """No blocks are written"""
+        for i in range(len(self._flags)): self._flags[i] = 0
+        self.sync()
+
+    def sync(self) -> None:
+        if self._map is not None:
+            self._map.flush()
+        else:
+            self._file.seek(self.HDR_LEN)
+            self._file.write(self._flags)
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is None: return
+        self.sync()
+        if self._map is not None:
+            self._flags.release()
+            self._view.release()
+            self._view = None
+            self._map.close()
+            self._map = None
+        self._flags = None
+        self._file.close()
+        self._file = None
+
+    def remove(self) -> None:
+        """Transfer is over, the checkpoint is no longer needed"""
+        self.close()
+        try:
+            platdeps.os_unlink(self._name)
+        except OSError: pass  # never created
+
+
+class BlockStore:
+    """Content-addressed store of received files, so repeats and shared blocks aren't waited for"""
+    # <root>/<sha256 hex> is a whole received file, <root>/<sha256 hex>.blk is its
+    # U16BE blocksz, then HASH_LEN bytes of sha256 of each block. The block index is
+    # kept in memory, so a big store suits a host more than a Pico.
+    HASH_LEN  = 8
+    INDEX_EXT = ".blk"
+    COPY_SIZE = 4096
+
+    def __init__(self, root:str):
+        self._root  = root
+        self._index = {}  # block hash -> (sha256 hex, offset)
+        try:
+            platdeps.os_mkdir(root)
+        except OSError: pass  # already there
+        for name in platdeps.os_listdir(root):
+            if name.endswith(self.INDEX_EXT): self._load_index(name[:-len(self.INDEX_EXT)])
+
+    @staticmethod
+    def hash_block(data) -> bytes:
+        return platdeps.hashlib_sha256(data).digest()[:BlockStore.HASH_LEN]
+
+    def _path(self, name:str) -> str:
+        return self._root + "/" + name
+
+    def _load_index(self, key:str) -> None:
+        try:
+            with open(self._path(key + self.INDEX_EXT), "rb") as f: data = f.read()
+        except OSError: return  # gone, nothing to index
+        if len(data) < 2: return
+        blocksz = (data[0]<<8) | data[1]
+        for blockno in range((len(data)-2) // self.HASH_LEN):
+            pos = 2 + blockno*self.HASH_LEN
+            block_hash = bytes(data[pos:pos+self.HASH_LEN])
+            if block_hash not in self._index: self._index[block_hash] = (key, blockno*blocksz)
+
+    def has(self, sha256:bytes) -> bool:
+        """True if this whole file is already in the store"""
+        try:
+            platdeps.filesize(self._path(hexstr(sha256)))
+            return True
+        except OSError: return False
+
+    def extract(self, sha256:bytes, filename:str) -> None:  # exception if not held
+        """Copy a stored file out to filename"""
+        self._copy(self._path(hexstr(sha256)), filename)
+
+    def add(self, filename:str, sha256:bytes, blocksz:int) -> None:
+        """Keep a copy of a verified file, and index its blocks"""
+        if self.has(sha256): return
+        key = hexstr(sha256)
+        temp_name = self._path(key + ".tmp")
+        self._copy(filename, temp_name)
+        hashes = bytearray()
+        hashes.append(high(blocksz))
+        hashes.append(low(blocksz))
+        with open(temp_name, "rb") as f:
+            offset = 0
+            while True:
+                block = f.read(blocksz)
+                if not block: break  # EOF
+                block_hash = self.hash_block(block)
+                hashes.extend(block_hash)
+                if block_hash not in self._index: self._index[block_hash] = (key, offset)
+                offset += len(block)
+        with open(self._path(key + self.INDEX_EXT), "wb") as f: f.write(hashes)
+        # the file appears last, so has() never sees a partial copy
+        platdeps.os_rename(temp_name, self._path(key))
+
+    def find_block(self, block_hash:bytes, nbytes:int) -> bytes or None:
+        """A block with this hash, from any stored file, None if not held"""
+        where = self._index.get(bytes(block_hash))
+        if where is None: return None
+        try:
+            with open(self._path(where[0]), "rb") as f:
+                f.seek(where[1])
+                data = f.read(nbytes)
+        except OSError: return None  # store changed under us
+        # same hash as a different length block, or a damaged store
+        if len(data) != nbytes or self.hash_block(data) != block_hash: return None
+        return data
+
+    def _copy(self, src:str, dst:str) -> None:
+        with open(src, "rb") as fs, open(dst, "wb") as fd:
+            while True:
+                data = fs.read(self.COPY_SIZE)
+                if not data: break  # EOF
+                fd.write(data)
+
 
 
 class Link:
     # This is mostly an interface, with standard callback registration for events
+    MTU = None  # largest packet this link can carry in one go, None means no limit
+
     def __init__(self):
         self._reg_table = {}  # selector->[handler_fn:callable]
 
+    def get_mtu(self) -> int or None:
+        """Largest packet a user of this link can send in one go, None means no limit"""
+        return self.MTU
+
     def send(self, data:Buffer or None, info:dict or None=None) -> None:
         # bool: #IDEA: done or not done, tx flow control
         assert False, "Link.send needs overriding by subclass"
@@ -829,6 +1983,11 @@ class Link:
             ##platdeps.message("dispatch %s %s to fn %s" % (str(data), str(info), str(h_fn)))
             h_fn(data, info)
 
+def get_mtu_of(link) -> int or None:
+    """MTU of any link-like thing, it might be a Link, or just have an MTU"""
+    if hasattr(link, "get_mtu"): return link.get_mtu()
+    return getattr(link, "MTU", None)
+
 #TODO: provide a fast update() for better encapsulation?
 #beware of performance hits with indirection
 class PStats:
@@ -894,6 +2053,15 @@ class Packetiser(Link):
         # direct dispatch, faster
         self.send = self._send_once
 
+    @staticmethod
+    def unframed_mtu(framed_mtu:int or None) -> int or None:
+        """Biggest packet sure to fit in framed_mtu, after SYNCs and escapes are added"""
+        if framed_mtu is None: return None
+        return (framed_mtu - 2) // 2  # SYNC at each end, and every byte might be escaped
+
+    def get_mtu(self) -> int or None:
+        return self.unframed_mtu(get_mtu_of(self._link))
+
     #----- SENDER --------------------------------------------------------------
 
     # def _send_many(self, data:Buffer or None, info:dict or None=None) -> None:
@@ -919,6 +2087,10 @@ class Packetiser(Link):
         if user_buf is None:  return  # no way to send EOF here
 
         b = self._tx_buf
+        worst = 2 + len(user_buf)*2  # SYNCs, and every byte escaped
+        if worst > b.get_max():
+            # long packets (extended link headers) need a bigger tx buffer
+            b = self._tx_buf = Buffer(size=worst, start=0)
         b.reset()
 
         b.append(self._ISYNC)  # start of packet
@@ -1059,6 +2231,8 @@ class Packetiser(Link):
                     packetiser_stats.all_packets += 1
                     nbytes = user_buf[0]
                     nb = len(user_buf)
+                    if nbytes == 0 and nb >= 3:  # LinkMessage.EXT, U16 length follows
+                        nbytes = ((user_buf[1] << 8) | user_buf[2]) + 2
                     if nbytes+1 != nb:
                         packetiser_stats.bad_plens += 1
                         #Don't use too much, it slows code down
@@ -1158,12 +2332,32 @@ class LinkMessage:
     # U8 data[]   (may be zero length)
     # U16BE crc   CCITT CRC16
 
+    PROTOCOL_OVERHEAD_EXT = 1 + 2 + 1 + 1 + 4 + 2  # ext, len16, seqno, chn, blockno32, crc16
+    # extended link header, used when the packet is too long for a U8 length,
+    # or the blockno is too big for a U16. A normal nbytes is never zero,
+    # so a zero in that position introduces the extended form:
+    # U8 0x00      (extended header follows)
+    # U16BE nbytes (not including the 3 length bytes)
+    # U8 seqno
+    # U8 chn
+    # U32BE blockno
+    # U8 data[]
+    # U16BE crc    CCITT CRC16
+    EXT = 0x00
+    MAX_LEN     = 0xFF    # longest nbytes in a normal header
+    MAX_LEN_EXT = 0xFFFF  # longest nbytes in an extended header
+    MAX_BLOCKNO = 0xFFFF  # biggest blockno in a normal header
+
     DCH    = 0x00  # OR into a channelid to get a data channel
     CCH    = 0x80  # OR into a channelid to get a control channel
+    ZFLAG  = 0x40  # OR into a data channel, payload is raw deflate compressed
     LINKCH = 0x00  # The single, always available, link channel
-    # channels 0x01..0x7F are for user data
+    # channels 0x01..0x3F are for user data
     # 0x80 = LINKCCH control channel for global link channel
-    # 0x81..0xFF control channels for user channels
+    # 0x81..0xBF control channels for user channels
+
+    # info keys
+    DEFLATED = "deflated"  # present if the payload is deflate compressed
 
     # link control channel sub types
     CCH_END = 0xFF  # <nodata>
@@ -1171,6 +2365,13 @@ class LinkMessage:
     # info keys
     CHANNEL = "chn"
 
+    @staticmethod
+    def overhead_for(nbytes:int, blockno:int=0) -> int:
+        """Number of header and CRC bytes added to a payload of nbytes"""
+        if nbytes + (LinkMessage.PROTOCOL_OVERHEAD-1) > LinkMessage.MAX_LEN or blockno > LinkMessage.MAX_BLOCKNO:
+            return LinkMessage.PROTOCOL_OVERHEAD_EXT
+        return LinkMessage.PROTOCOL_OVERHEAD
+
     @staticmethod
     def is_eof(channel:int, data) -> bool:
         """Detect a special LINK CCH EOF message"""
@@ -1199,6 +2400,15 @@ class LinkSender(Link):
         """Get the next transmit seqno modulus value"""
         return self._next_seqno
 
+    def get_mtu(self, max_blockno:int=0) -> int or None:
+        """Largest payload that fits in one packet of the underlying link (None if no limit)"""
+        mtu = get_mtu_of(self._link)
+        if mtu is None: return None
+        ext = mtu - LinkMessage.PROTOCOL_OVERHEAD_EXT
+        if max_blockno > LinkMessage.MAX_BLOCKNO: return ext  # always extended headers
+        normal = min(mtu - LinkMessage.PROTOCOL_OVERHEAD, LinkMessage.MAX_LEN - (LinkMessage.PROTOCOL_OVERHEAD-1))
+        return max(normal, ext)
+
     def send(self, data:Buffer, info:dict or None=None) -> None:
         """Send _data_ via data channel, or EOF condition via control channel"""
         ##assert data is None or isinstance(data, Buffer), "got:%s" % str(type(data))
@@ -1213,6 +2423,7 @@ class LinkSender(Link):
         else:
             # it's a data message, but handle EOF via a control message
             if data is not None:
+                if LinkMessage.DEFLATED in info: channel |= LinkMessage.ZFLAG
                 self.add_header_and_send(data, LinkMessage.DCH | channel, blockno)
             else:
                 buf = Buffer(self.END_MSG)
@@ -1227,12 +2438,20 @@ class LinkSender(Link):
         # length byte not included in length byte
         lenbyte = len(data) + (self.PROTOCOL_OVERHEAD-1)
         if crc16 is None: lenbyte -= 2  # no CRC
-        if lenbyte > 255:
-            platdeps.message("error: data too long, got len:%d" % lenbyte)
-            return
-
-        # HEADER len, seqno, channel, blockno(u16)
-        data.prepend((lenbyte, self._next_seqno, channel, (blockno & 0xFF00)>>8, (blockno & 0xFF) ))
+        if lenbyte > LinkMessage.MAX_LEN or blockno > LinkMessage.MAX_BLOCKNO:
+            # too big for a normal header, so use the extended header
+            lenword = len(data) + (LinkMessage.PROTOCOL_OVERHEAD_EXT-3)
+            if crc16 is None: lenword -= 2  # no CRC
+            if lenword > LinkMessage.MAX_LEN_EXT:
+                platdeps.message("error: data too long, got len:%d" % lenword)
+                return
+
+            # HEADER ext, len(u16), seqno, channel, blockno(u32)
+            data.prepend((LinkMessage.EXT, high(lenword), low(lenword), self._next_seqno, channel,
+                          (blockno>>24) & 0xFF, (blockno>>16) & 0xFF, (blockno>>8) & 0xFF, blockno & 0xFF))
+        else:
+            # HEADER len, seqno, channel, blockno(u16)
+            data.prepend((lenbyte, self._next_seqno, channel, (blockno & 0xFF00)>>8, (blockno & 0xFF) ))
 
         # CRC (optional)
         if crc16 is not None:
@@ -1283,6 +2502,130 @@ class LStats:
 
 link_stats = LStats()
 
+class LinkQuality:
+    """Rolling window estimate of link quality, over the last N packets"""
+    # LStats only keeps totals since power-on, which says nothing about how the
+    # channel is behaving *now*. This keeps two small rings:
+    #   slots:  one entry per seqno slot, received(1) or lost(0) via seqno gaps
+    #   frames: one entry per frame that arrived, good(0) or bad(1) crc/len
+    # Recording is O(1) per packet (plus any seqno gap), so it is cheap enough
+    # to leave on all the time. Queries walk the window, so call them sparingly.
+    WINDOW  = 256  # number of packets remembered
+    MAX_GAP = 127  # bigger seqno jumps are a restart or reorder, not a loss
+
+    def __init__(self, window:int=WINDOW):
+        self._window  = window
+        self._slots   = bytearray(window)    # 1=received, 0=lost
+        self._stimes  = array("l", [0]*window)  # ms, relative to _t0
+        self._frames  = bytearray(window)    # 1=bad frame, 0=good frame
+        self._ftimes  = array("l", [0]*window)  # ms, relative to _t0
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget all history"""
+        self._t0     = platdeps.time_ms()
+        self._nslots = 0  # total slots ever recorded, index is modulo window
+        self._nframes = 0  # total frames ever recorded, index is modulo window
+
+    def _add_slot(self, received:int, t:int) -> None:
+        idx = self._nslots % self._window
+        self._slots[idx]  = received
+        self._stimes[idx] = t
+        self._nslots += 1
+
+    def _add_frame(self, bad:int, t:int) -> None:
+        idx = self._nframes % self._window
+        self._frames[idx] = bad
+        self._ftimes[idx] = t
+        self._nframes += 1
+
+    def record_good(self, gap:int=0, now_ms:int or None=None) -> None:
+        """A valid packet arrived, after _gap_ missing seqnos"""
+        if now_ms is None: now_ms = platdeps.time_ms()
+        t = now_ms - self._t0
+        # the first packet can't be judged, the sender seqno could be anything
+        if self._nslots != 0 and gap <= self.MAX_GAP:
+            for _ in range(min(gap, self._window)):
+                self._add_slot(0, t)  # lost, seen at the time the gap was noticed
+        self._add_slot(1, t)
+        self._add_frame(0, t)
+
+    def record_bad(self, now_ms:int or None=None) -> None:
+        """A frame arrived, but it failed a length or CRC check"""
+        if now_ms is None: now_ms = platdeps.time_ms()
+        self._add_frame(1, now_ms - self._t0)
+
+    def _window_of(self, times, count:int, max_age_ms:int or None) -> list:  # of idx
+        """Indexes into a ring, oldest first, optionally limited by age"""
+        n = min(count, self._window)
+        first = count - n
+        idxs = [i % self._window for i in range(first, count)]
+        if max_age_ms is not None:
+            oldest = platdeps.time_ms() - self._t0 - max_age_ms
+            idxs = [i for i in idxs if times[i] >= oldest]
+        return idxs
+
+    def get_loss_rate(self, max_age_ms:int or None=None) -> float:
+        """Fraction 0.0..1.0 of seqno slots that never arrived"""
+        idxs = self._window_of(self._stimes, self._nslots, max_age_ms)
+        if len(idxs) == 0: return 0.0
+        lost = 0
+        for i in idxs:
+            if self._slots[i] == 0: lost += 1
+        return lost / len(idxs)
+
+    def get_crc_rate(self, max_age_ms:int or None=None) -> float:
+        """Fraction 0.0..1.0 of arriving frames that failed a CRC/length check"""
+        idxs = self._window_of(self._ftimes, self._nframes, max_age_ms)
+        if len(idxs) == 0: return 0.0
+        bad = 0
+        for i in idxs:
+            bad += self._frames[i]
+        return bad / len(idxs)
+
+    def get_burst_histogram(self, max_age_ms:int or None=None) -> dict:  # burstlen->count
+        """Count of runs of consecutive lost packets, by run length"""
+        idxs = self._window_of(self._stimes, self._nslots, max_age_ms)
+        hist = {}
+        run = 0
+        for i in idxs:
+            if self._slots[i] == 0:
+                run += 1
+            elif run != 0:
+                hist[run] = hist.get(run, 0) + 1
+                run = 0
+        if run != 0: hist[run] = hist.get(run, 0) + 1
+        return hist
+
+    def get_jitter_ms(self, max_age_ms:int or None=None) -> float:
+        """Mean deviation of the inter-arrival time of received packets"""
+        idxs = self._window_of(self._stimes, self._nslots, max_age_ms)
+        gaps = []
+        prev = None
+        for i in idxs:
+            if self._slots[i] == 0: continue
+            t = self._stimes[i]
+            if prev is not None: gaps.append(t - prev)
+            prev = t
+        if len(gaps) == 0: return 0.0
+        mean = sum(gaps) / len(gaps)
+        dev = 0
+        for g in gaps: dev += abs(g - mean)
+        return dev / len(gaps)
+
+    def has_data(self) -> bool:
+        return self._nframes != 0
+
+    def __str__(self) -> str:
+        hist = self.get_burst_histogram()
+        if len(hist) == 0: max_burst = 0
+        else:              max_burst = max(hist)
+        return "loss:%d%% crc:%d%% maxburst:%d jitter:%dms" % (
+            int(self.get_loss_rate()*100),
+            int(self.get_crc_rate()*100),
+            max_burst,
+            int(self.get_jitter_ms()))
+
 class LinkReceiver(Link):
     """Adds message sequence number handling, crc checking, to received data"""
     # Eventually this will handle all channels
@@ -1292,11 +2635,17 @@ class LinkReceiver(Link):
         Link.__init__(self)
         self._next_seqno = 0
         self._link = link
+        self._quality = LinkQuality()
+        self._hbytes = 5  # header size of the last packet received
 
     def get_seqno(self) -> int:
         """Get the next expected receive sequence number"""
         return self._next_seqno
 
+    def get_quality(self) -> LinkQuality:
+        """Get the rolling link quality estimator for this receiver"""
+        return self._quality
+
     def recvinto_for(self, buf:Buffer, info:dict or None=None, channel:int or None=None, wait:int=0) -> int or None:
         """Receive a message for a specific channel (or pump via mux to channel handler)"""
         # if there is a message and it is not for us, pump it via mux to handler,
@@ -1309,7 +2658,7 @@ class LinkReceiver(Link):
 
         # dispatch to any callback handlers first (includes EOF(None) data signalling)
         # also includes dispatching to clients other than the calling client
-        self.mux_received(buf, info)
+        handled = self.mux_received(buf, info)
         if LinkMessage.CHANNEL in info: actual_chn = info[LinkMessage.CHANNEL]
         else:                           actual_chn = None  # channels not in use
 
@@ -1317,7 +2666,9 @@ class LinkReceiver(Link):
         if nb is None:                                        return None  # EOF
         if LinkMessage.is_eof(actual_chn, buf):               return None  # EOF
         if channel is None:                                   return nb    # all messages wanted
-        if actual_chn is not None and channel == actual_chn:  return nb    # it is our channel
+        if actual_chn is not None and channel == actual_chn:
+            if handled: return 0  # our channel, but our callback already had it
+            return nb  # it is our channel
         return 0  #NODATA (for this caller)
 
     def recvinto(self, buf:Buffer, info:dict or None=None, wait:int=0) -> int or None:
@@ -1327,7 +2678,7 @@ class LinkReceiver(Link):
         if nb == 0:     return 0     #NODATA
 
         # remove headers and footers
-        HBYTES = 5 # nbytes, seqno, chn, blockno(u16)
+        HBYTES = self._hbytes # nbytes, seqno, chn, blockno(u16) or extended header
         FBYTES = 2 # crc(16)
         buf.ltrunc(HBYTES)
         buf.rtrunc(FBYTES)
@@ -1344,29 +2695,56 @@ class LinkReceiver(Link):
         # validate length enough for a header
         if len(buf) < self.PROTOCOL_OVERHEAD:
             link_stats._shorthdr += 1
+            self._quality.record_bad()
             buf.reset()  # junk any data that was captured
             return 0  #NODATA
 
         # validate length byte against actual packet size
         nbytes = buf[0]
+        if nbytes != LinkMessage.EXT:
+            lenbytes = 1
+        else:
+            # extended header, U16 length follows
+            if len(buf) < LinkMessage.PROTOCOL_OVERHEAD_EXT:
+                link_stats._shorthdr += 1
+                self._quality.record_bad()
+                buf.reset()  # junk any data that was captured
+                return 0  #NODATA
+            lenbytes = 3
+            nbytes = (buf[1] << 8) | buf[2]
+            # from here on, treat as if it had a single length byte
+            nbytes += 2
+
         if nbytes+1 < len(buf):
             link_stats._badlen += 1
+            self._quality.record_bad()
             buf.reset()  # junk any data that was captured
             return 0  #NODATA
 
         if nbytes+1 > len(buf):
             link_stats._long += 1
+            self._quality.record_bad()
             ##platdeps.message("length mismatch, lbyte:%d buflen:%d" % (nbytes, len(buf)))
             buf.reset()  # junk any data that was captured
             return 0  #NODATA
 
         # read in the header, but validate it later when CRC is known
-        nbytes = buf[0]
-        seqno  = buf[1]
-        chn    = buf[2]
-        blockno = (buf[3] << 8) | buf[4]
+        if lenbytes == 1:
+            seqno   = buf[1]
+            chn     = buf[2]
+            blockno = (buf[3] << 8) | buf[4]
+            self._hbytes = 5  # nbytes, seqno, chn, blockno(u16)
+        else:
+            seqno   = buf[3]
+            chn     = buf[4]
+            blockno = (buf[5] << 24) | (buf[6] << 16) | (buf[7] << 8) | buf[8]
+            self._hbytes = 9  # ext, nbytes(u16), seqno, chn, blockno(u32)
 
         if info is not None:
+            if chn & (LinkMessage.CCH | LinkMessage.ZFLAG) == LinkMessage.ZFLAG:
+                # compressed data, the flag is not part of the channel number
+                chn &= ~LinkMessage.ZFLAG
+                info[LinkMessage.DEFLATED] = True
             info[LinkMessage.CHANNEL] = chn
             info["blockno"] = blockno
 
@@ -1380,6 +2758,7 @@ class LinkReceiver(Link):
             # validate CRC first, so we know packet isn't damaged
             if rx_crc != crc:
                 link_stats._crc += 1
+                self._quality.record_bad()
                 buf.reset()  # junk any data that was captured
                 return 0  #NODATA
 
@@ -1387,6 +2766,7 @@ class LinkReceiver(Link):
         if seqno != self._next_seqno:
             link_stats._seqno += 1
             # but keep going, it is just a warning, we will resync
+        self._quality.record_good((seqno - self._next_seqno) & 0xFF)
 
         # advance seqno for valid packet, modulo 256
         self._next_seqno = (seqno+1) & 0xFF  # resync if neccessary
@@ -1439,6 +2819,10 @@ class LinkManager(Link):
         self.send = self._linksender.send
         self.recvinto = self._linkreceiver.recvinto
 
+    def get_mtu(self, max_blockno:int=0) -> int or None:
+        """Largest payload that can be sent in one packet (None if no limit)"""
+        return self._linksender.get_mtu(max_blockno)
+
     #temporary
     def get_sender(self) -> LinkSender:
         return self._linksender
@@ -1457,20 +2841,227 @@ class TransferStats:
         self.time_used  = 0
         self.nblocks    = 0
         self.nbytes     = 0
+        self.nhdr       = 0  # link header/crc bytes, that carry no payload
         self.bps        = 0
         self.pps        = 0
 
-    def update(self, nbytes:int) -> None:
+    def update(self, nbytes:int, nhdr:int=0) -> None:
         self.nblocks += 1
         self.nbytes += nbytes
+        self.nhdr += nhdr
         self.time_used = platdeps.time_time() - self._start_time
         if self.time_used > 0:
             self.bps = self.nbytes / self.time_used
             self.pps = self.nblocks / self.time_used
 
+    def get_overhead(self) -> int:
+        """Percentage of the bytes sent that were link headers, not payload"""
+        total = self.nbytes + self.nhdr
+        if total == 0: return 0
+        return int(self.nhdr * 100 / total)
+
     def __str__(self) -> str:
-        return "T:%d blk:%d by:%d PPS:%d BPS:%d" % (
+        s = "T:%d blk:%d by:%d PPS:%d BPS:%d" % (
             self.time_used, self.nblocks, self.nbytes, self.pps, self.bps)
+        if self.nhdr != 0: s += " OH:%d%%" % self.get_overhead()
+        return s
+
+
+class Pacer:
+    """Token bucket, paces sends in packets/sec or bytes/sec on the monotonic clock"""
+    # A send is allowed when the bucket is not in debt, and then charges it, so the
+    # size of a packet doesn't need to be known until after it has been sent.
+    PACKETS = 0
+    BYTES   = 1
+    BURST_SECS = 0.05  # default credit that can build up, absorbs late wakeups
+
+    def __init__(self, rate:float, unit:int=PACKETS, burst:float or None=None):
+        if rate <= 0: raise ValueError("pacing rate must be >0, got:%s" % str(rate))
+        self._rate   = rate  # tokens/sec
+        self._unit   = unit
+        if burst is None:
+            if unit == self.PACKETS: burst = 1
+            else:                    burst = rate * self.BURST_SECS
+        self._burst  = burst
+        self._tokens = 0
+        self._last   = platdeps.time_mono_us()
+        # stats
+        self._npackets = 0
+        self._nbytes   = 0
+        self._first_us = None
+        self._last_us  = None
+        self._nwaits   = 0
+
+    def _refill(self, now:int) -> None:
+        dt = platdeps.ticks_diff(now, self._last)
+        self._last = now
+        self._tokens = min(self._burst, self._tokens + dt * self._rate / 1000000)
+
+    def delay_us(self) -> int:
+        """How long until the next send is allowed, 0 means now"""
+        self._refill(platdeps.time_mono_us())
+        if self._tokens >= 0: return 0
+        return int(-self._tokens * 1000000 / self._rate) + 1
+
+    def sleep_until_ready(self) -> None:
+        """Block until the next send is allowed"""
+        us = self.delay_us()
+        if us != 0:
+            self._nwaits += 1
+            platdeps.time_sleep_us(us)
+
+    def sent(self, nbytes:int) -> None:
+        """Charge the bucket for a packet that has just been sent"""
+        now = platdeps.time_mono_us()
+        self._refill(now)
+        if self._unit == self.PACKETS: self._tokens -= 1
+        else:                          self._tokens -= nbytes
+        if self._first_us is None: self._first_us = now
+        else:                      self._nbytes += nbytes  # bytes after the first packet
+        self._last_us = now
+        self._npackets += 1
+
+    def get_target(self) -> float:
+        return self._rate
+
+    def get_achieved(self) -> float:
+        """Achieved rate, in the same units as the target"""
+        if self._npackets < 2: return 0
+        secs = platdeps.ticks_diff(self._last_us, self._first_us) / 1000000
+        if secs <= 0: return 0
+        if self._unit == self.PACKETS: return (self._npackets-1) / secs
+        return self._nbytes / secs
+
+    def has_data(self) -> bool:
+        return self._npackets != 0
+
+    def __str__(self) -> str:
+        units = "PPS" if self._unit == self.PACKETS else "BPS"
+        return "target:%d%s achieved:%d%s pkts:%d" % (self._rate, units, self.get_achieved(), units, self._npackets)
+
+
+#----- BLOCK SCHEDULERS --------------------------------------------------------
+
+# A scheduler chooses which block the Sender sends next, and how many times
+# it has been sent before. Repeats sent back to back are easily wiped out by a
+# single fade, so spreading them across the file survives bursts much better.
+
+class BlockCounters:
+    """How many times each block has been sent, preallocated in one array"""
+    MAX_COUNT = 0xFF
+
+    def __init__(self, nblocks:int):
+        self._counts = array("B", bytes(nblocks))
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __getitem__(self, blockno:int) -> int:
+        return self._counts[blockno]
+
+    def bump(self, blockno:int) -> int:
+        """Count a send of this block, returns the count before this send"""
+        n = self._counts[blockno]
+        if n < self.MAX_COUNT: self._counts[blockno] = n+1
+        return n
+
+class BlockScheduler:
+    """Base scheduler, sends every block repeats+1 times in some order"""
+    # next_block() returns (nblocks, 0) when done, reading that block gives EOF
+    def __init__(self, nblocks:int or None, repeats:int=0):
+        self._nblocks  = nblocks
+        self._repeats  = repeats
+        self._counters = None if nblocks is None else BlockCounters(nblocks)
+        self._seqno    = 0  # how many blocks have been scheduled so far
+
+    def get_counters(self) -> BlockCounters or None:
+        return self._counters
+
+    def next_block(self) -> tuple: # of (blockno:int, repno:int)
+        if self._nblocks == 0: return 0, 0  # empty file, done straight away
+        blockno = self.choose(self._seqno)
+        self._seqno += 1
+        if self._counters is None or blockno >= self._nblocks: return blockno, 0
+        return blockno, self._counters.bump(blockno)
+
+    def choose(self, seqno:int) -> int:
+        """Override, blockno to send at this position in the schedule"""
+        assert False, "BlockScheduler.choose needs overriding by subclass"
+
+class SequentialScheduler(BlockScheduler):
+    """Each block repeats+1 times back to back, nblocks may be unknown (streams)"""
+    def next_block(self) -> tuple: # of (blockno:int, repno:int)
+        blockno, repno = divmod(self._seqno, self._repeats+1)
+        self._seqno += 1
+        if self._counters is not None and blockno < self._nblocks: self._counters.bump(blockno)
+        return blockno, repno
+
+class InterleavedScheduler(BlockScheduler):
+    """Round-robin passes over the whole file, repeats+1 passes"""
+    def choose(self, seqno:int) -> int:
+        npass, blockno = divmod(seqno, self._nblocks)
+        if npass > self._repeats: return self._nblocks  # done
+        return blockno
+
+class RandomScheduler(BlockScheduler):
+    """A fresh random permutation of the file on each pass"""
+    def __init__(self, nblocks:int, repeats:int=0, seed:int=1):
+        BlockScheduler.__init__(self, nblocks, repeats)
+        self._rand = seed & 0xFFFFFFFF or 1
+        self._perm = array("L", range(nblocks))
+
+    def _shuffle(self) -> None:
+        perm = self._perm
+        for i in range(len(perm)-1, 0, -1):
+            self._rand = _xorshift32(self._rand)
+            j = self._rand % (i+1)
+            perm[i], perm[j] = perm[j], perm[i]
+
+    def choose(self, seqno:int) -> int:
+        npass, idx = divmod(seqno, self._nblocks)
+        if npass > self._repeats: return self._nblocks  # done
+        if idx == 0: self._shuffle()
+        return self._perm[idx]
+
+class WeightedScheduler(BlockScheduler):
+    """Interleaved passes, with extra repeats of the first few blocks (file headers)"""
+    # A damaged header block (e.g. the start of a JPEG) loses the whole file,
+    # so it is worth more airtime than a block in the middle. The extra sends
+    # are spread evenly through the passes, not bunched up where a fade can get them.
+    HEAD_BLOCKS  = 4
+    HEAD_REPEATS = 3  # extra, on top of repeats
+
+    def __init__(self, nblocks:int, repeats:int=0, head:int=HEAD_BLOCKS, head_repeats:int=HEAD_REPEATS):
+        BlockScheduler.__init__(self, nblocks, repeats)
+        self._head   = min(head, nblocks)
+        self._nextra = self._head * head_repeats  # extra sends still to do
+        self._nnormal = nblocks * (repeats+1)     # normal sends, in interleaved passes
+        self._gap    = self._nnormal // (self._nextra+1)
+        self._nsent  = 0  # normal sends so far
+        self._nhead  = 0  # extra sends so far
+        self._since  = 0  # normal sends since the last extra one
+
+    def choose(self, seqno:int) -> int:
+        _ = seqno  # argused, positions are tracked as normal and extra sends
+        if self._nextra != 0 and (self._since >= self._gap or self._nsent >= self._nnormal):
+            self._nextra -= 1
+            self._since = 0
+            blockno = self._nhead % self._head
+            self._nhead += 1
+            return blockno
+
+        if self._nsent >= self._nnormal: return self._nblocks  # done
+        blockno = self._nsent % self._nblocks
+        self._nsent += 1
+        self._since += 1
+        return blockno
+
+SCHEDULERS = {
+    "sequential":  SequentialScheduler,
+    "interleaved": InterleavedScheduler,
+    "random":      RandomScheduler,
+    "weighted":    WeightedScheduler,
+}
 
 
 class Sender:
@@ -1481,24 +3072,44 @@ class Sender:
     PROGRESS_RATE = 0.1  # max update rate in seconds
 
     def __init__(self, reader_fn:callable, link:Link, progress_fn:callable or None=None,
-                 blocksz:int=16, repeats:int=0):
+                 blocksz:int=16, repeats:int=0, compress:bool=False, scheduler:BlockScheduler or None=None):
         self._reader_fn = reader_fn
         self._link = link
-        self._buf = Buffer()
+        # big blocks (extended link headers) need a bigger buffer than default
+        self._buf = Buffer(size=max(Buffer.DEFAULT_SIZE,
+                                    Buffer.DEFAULT_START + blocksz + LinkMessage.PROTOCOL_OVERHEAD_EXT))
 
         self._progress_fn = progress_fn
         self._blocksz = blocksz
-        self._blockno = 0
         self._repeats = repeats  # number of times to re-send same message
-        self._block_counters = []
+        if scheduler is None: scheduler = SequentialScheduler(None, repeats)  # length unknown, so streamed
+        self._scheduler = scheduler
+        if compress and platdeps.deflate_compress is None:
+            platdeps.message("warning: compression not available, sending raw")
+            compress = False
+        self._compress = compress
+        self._zblock = None  # (blockno, deflated) of the last block, keyed so any schedule is safe
         self._stats = TransferStats()
+        self._pacer = None  # send as fast as the link will take it
         if progress_fn: progress_fn()  # starting #IDEA: move to send() based on state
         self._is_running = True
         self._last_stats = platdeps.time_time()
 
+    def set_pacer(self, pacer:Pacer or None) -> None:
+        """Pace sends with a token bucket, None sends flat out"""
+        self._pacer = pacer
+
+    def get_pacer(self) -> Pacer or None:
+        return self._pacer
+
+    def is_paced(self) -> bool:
+        """True if the pacer says it is too early to send again"""
+        return self._pacer is not None and self._pacer.delay_us() != 0
+
     def tick(self) -> bool:
         """Pump regular send processing"""
         if self._is_running:
+            if self.is_paced(): return True  # not due yet, let other tasks run
             self.do_send_next_block()
             if not self._is_running:
                 self.done()  # show final transfer status and stats
@@ -1506,32 +3117,23 @@ class Sender:
 
     def run(self) -> None:
         """Run to completion"""
-        while self.tick(): pass
+        while True:
+            if self._pacer is not None: self._pacer.sleep_until_ready()
+            if not self.tick(): break
 
     def get_stats(self) -> str:
         """Get the transfer stats"""
         return str(self._stats)
 
-    #IDEA: could this be delegated to the block manager as an algo?
+    def get_transfer_stats(self) -> TransferStats:
+        """The transfer stats, as numbers"""
+        return self._stats
+
     def choose_next_block(self) -> tuple: # of (blockno:int, repno:int)
-        """A place to slot in a block chooser/repeater algorithm"""
+        """The scheduler chooses the block, and counts the repeats"""
         #NOTE: This is the core feature that enables error correction at receiver
         #NOTE: returning None will cause a sequential single send of the file
-        blockno = self._blockno
-
-        # dynamically extend our block counter array
-        while blockno >= len(self._block_counters):
-            self._block_counters.append(0)
-
-        # repeat current block, until the repeat limit has been reached
-        repno = self._block_counters[blockno]
-        self._block_counters[blockno] += 1
-
-        # then advance to the next block
-        if repno >= self._repeats:
-            self._blockno += 1
-
-        return blockno, repno
+        return self._scheduler.next_block()
 
     def do_send_next_block(self) -> None:
         """Send the next block of data, if any is available"""
@@ -1540,11 +3142,7 @@ class Sender:
         # READ
         #NOTE: FileReader could usefully readinto() the Buffer
         blockno, repno = self.choose_next_block()
-        if blockno is not None:
-            offset = self._blocksz * blockno
-            data = self._reader_fn(self._blocksz, offset)
-        else:
-            data = self._reader_fn(self._blocksz)
+        data = self.read_block(blockno)
 
         # SEND (EOF)
         if data is None:  # EOF
@@ -1553,9 +3151,7 @@ class Sender:
             #do this in tick like we do with META?
             #or move END entirely to sending a control message,
             #not a data message, as other end processes those for us
-            self._is_running = False
-            # force an EOF packet to be sent for this file
-            self._link.send(None)  # EOF
+            self.send_eof()
             return
 
         # SEND (NODATA)
@@ -1563,15 +3159,21 @@ class Sender:
         if len_data == 0: return  # no data available
         #NOTE: END introduce Buffer to FileReader
 
+        info = {"blockno": blockno}
+        if self._compress:
+            data = self.deflate_block(data, blockno, info)
+
         self._buf.extend(data)
         del data  # prevent accidental use
+        npayload = len(self._buf)  # send() adds the header and CRC in place
 
-        info = {"blockno": blockno}
         self._link.send(self._buf, info)
 
+        nhdr = LinkMessage.overhead_for(npayload, blockno or 0)
+        if self._pacer is not None: self._pacer.sent(len(self._buf))  # as on the wire, header and CRC too
         self._buf.reset()
 
-        self._stats.update(len_data)
+        self._stats.update(len_data, nhdr)
         if self._progress_fn:
             # Throttle the max update rate
             now = platdeps.time_time()
@@ -1579,6 +3181,31 @@ class Sender:
                 self.print_stats()
                 self._last_stats = now
 
+    def send_eof(self) -> None:
+        """All blocks sent, so finish with an EOF packet"""
+        self._is_running = False
+        # force an EOF packet to be sent for this file
+        self._link.send(None)  # EOF
+
+    def read_block(self, blockno:int or None):
+        """Read the data for a block, None at EOF"""
+        if blockno is None:
+            return self._reader_fn(self._blocksz)
+        return self._reader_fn(self._blocksz, self._blocksz * blockno)
+
+    def deflate_block(self, data, blockno:int or None, info:dict):
+        """Compress a block, if that makes it smaller, and flag it in info"""
+        if self._zblock is not None and self._zblock[0] == blockno and blockno is not None:
+            zdata = self._zblock[1]  # a back to back repeat (sequential), already compressed
+        else:
+            zdata = platdeps.deflate_compress(data)
+            self._zblock = (blockno, zdata)
+
+        if zdata is None or len(zdata) >= len(data):
+            return data  # doesn't help, so send raw
+        info[LinkMessage.DEFLATED] = True
+        return zdata
+
     @staticmethod
     def get_percent() -> int or None:
         return None
@@ -1619,10 +3246,16 @@ class Receiver:
         self._stats = TransferStats()
         self._crc_errs = None # don't display if there are none
         self._blockmap = None  # block map size not yet known
+        self._zbuf = None  # for inflating compressed blocks, when blocksz known
+        self._fec = None  # BlockFEC, if the sender adds parity blocks
+        self._fec_read_fn = None
+        self._fec_buf = None
+        self._fec_recovered = 0
         if progress_fn: progress_fn()  # starting #IDEA: move to transfer function based on state
         self._last_stats = platdeps.time_time()
         self._state = self._STATE_STARTING
         self._is_running = True
+        self._verifying = None  # Future, while verify runs on a worker
 
     def set_block_info(self, blocksz:int, nblocks:int, lastblock:int) -> None:
         nb = nblocks
@@ -1630,11 +3263,34 @@ class Receiver:
         self._blockmap = BitSet(nb)
         ##assert self._state == self.STATE_STARTING, "unexpected state:%s" % str(self._state)
         self._blocksz = blocksz
+        # make sure a whole block, and its link header, fits the receive buffer
+        self.set_min_buffer(Buffer.DEFAULT_START + blocksz + LinkMessage.PROTOCOL_OVERHEAD_EXT)
         self._state = self._STATE_TRANSFERRING
 
+    def set_min_buffer(self, size:int) -> None:
+        """Grow the receive buffer to at least size, for blocks bigger than the default"""
+        if size > self._buf.get_max(): self._buf = Buffer(size=size)
+
+    def set_fec(self, fec:BlockFEC, read_fn:callable) -> None:
+        """Parity blocks will arrive, read_fn(nbytes, offset) reads back written data"""
+        ##assert self._blocksz is not None, "set_fec() before set_block_info()"
+        self._fec = fec
+        self._fec_read_fn = read_fn
+        self._fec_buf = Buffer(size=Buffer.DEFAULT_START + self._blocksz)
+
+    def get_fec_recovered(self) -> int:
+        """Number of data blocks that were rebuilt from parity"""
+        return self._fec_recovered
+
+    def is_finished_ok(self) -> bool:
+        """True once the transfer has finished, and the file checked good"""
+        return self._state == self._STATE_FINISHED_OK
+
     def tick(self, wait:int=10) -> bool:
         """Pump regular receive processing"""
         if self._is_running:
+            idle = wait
+            if self._verifying is not None: wait = 0  # keep the link serviced, don't block on it
             self.do_next_recv(wait=wait)
             if self._state == self._STATE_CHK_COMPLETE:
                 platdeps.message("<<< END RECEIVED!") ##TESTING
@@ -1642,14 +3298,16 @@ class Receiver:
                     # End message and complete, so verify it
                     self._state = self._STATE_VERIFYING
 
-                else: # not full yet
-                    platdeps.message(str(self._blockmap))
-                    platdeps.message("use send() again, to receive final blocks")
-                    self._state = self._STATE_STARTING  # need metadata again
+                else: # not full yet
+                    self.incomplete()
 
-            elif self._state == self._STATE_VERIFYING:
-                self.end_transfer()  # will change to ERR or OK
-                self._is_running = False
+            elif self._state == self._STATE_VERIFYING and self.ready_to_verify():
+                if self._verifying is None: self._verifying = self.start_verify()
+                if self._verifying.is_ready():
+                    self.end_transfer()  # will change to ERR or OK
+                    self._verifying = None
+                    self._is_running = False
+                elif idle != 0: platdeps.time_sleep_ms(1)  # worker is busy, don't spin
 
             elif self._state in (self._STATE_FINISHED_ERR, self._STATE_FINISHED_OK):
                 # a stopped task doesn't restart if called again, it stays stopped
@@ -1657,6 +3315,26 @@ class Receiver:
 
         return self._is_running
 
+    @staticmethod
+    def ready_to_verify() -> bool:
+        """All blocks are in, False to keep receiving until whatever verify needs has arrived"""
+        return True
+
+    def start_verify(self) -> Future:
+        """Start any slow checks of the received data, end_transfer() runs when they finish"""
+        return worker_pool.submit(self.verify)
+
+    @staticmethod
+    def verify():
+        """Slow checks of the received data, run on a worker, result is for end_transfer()"""
+        return None  # nothing to check
+
+    def incomplete(self) -> None:
+        """END arrived, but there are still blocks missing"""
+        platdeps.message(str(self._blockmap))
+        platdeps.message("use send() again, to receive final blocks")
+        self._state = self._STATE_STARTING  # need metadata again
+
     def run(self) -> None:
         """Run task to completion"""
         #TODO: change to None, as 0xFFFFFFFF might overflow on some platforms
@@ -1679,25 +3357,44 @@ class Receiver:
             # we have received the metadata
             if "blockno" in info:
                 blockno = info["blockno"]
-                if not self._blockmap[blockno]:
+                if blockno >= len(self._blockmap):
+                    # not a data block, so must be FEC parity
+                    if self._fec is not None and self._fec.is_parity(blockno):
+                        group = self._fec.group_of(blockno)
+                        if LinkMessage.DEFLATED in info:
+                            data = self.inflate_block(data)
+                            if data is None: return  # unusable, wait for a repeat
+                        self._fec.add_parity(blockno, data)
+                        self.fec_recover(group)
+
+                elif not self._blockmap[blockno]:
                     # this is a block we haven't seen before
-                    # only write a block if we just ticked it off as received
-                    # this prevents multi-writes to the file for block repeats
-                    self._blockmap[blockno] = True  # this block received
-                    if self._writer_fn is None:  # parent might have closed it
-                        # might actually be EOF message
-                        if data is not None:
-                            self.data_after_close(data)
-                    else:
-                        self.commit_data(data, info)
-
-                    if self._blockmap.is_complete():
-                        # complete, before we saw END message
-                        self._state = self._STATE_VERIFYING
+                    if LinkMessage.DEFLATED in info:
+                        data = self.inflate_block(data)
+                        if data is None: return  # unusable, wait for a repeat
+                    self.new_block(blockno, data, info)
 
         if data is None:  # EOF ON LINK
             self._state = self._STATE_CHK_COMPLETE
 
+    def new_block(self, blockno:int, data:Buffer, info:dict) -> None:
+        """A block that wasn't in the blockmap has arrived, or been decoded"""
+        # only write a block if we just ticked it off as received
+        # this prevents multi-writes to the file for block repeats
+        self._blockmap[blockno] = True  # this block received
+        if self._writer_fn is None:  # parent might have closed it
+            # might actually be EOF message
+            if data is not None:
+                self.data_after_close(data)
+        else:
+            self.commit_data(data, info)
+        if self._fec is not None:
+            self.fec_recover(self._fec.group_of(blockno))
+
+        if self._blockmap.is_complete():
+            # complete, before we saw END message
+            self._state = self._STATE_VERIFYING
+
     def commit_data(self, data:Buffer, info:dict) -> None:
         """Commit data to the writer"""
         ##assert isinstance(data, Buffer), "got:%s" % str(type(data))
@@ -1728,6 +3425,31 @@ class Receiver:
                 self.print_stats()
                 self._last_stats = now
 
+    def fec_recover(self, group:int) -> None:
+        """Rebuild and commit any missing blocks of this FEC group, if possible"""
+        if self._writer_fn is None: return  # parent might have closed it
+        for blockno, data in self._fec.recover(group, self._blockmap, self._fec_read_fn):
+            self._blockmap[blockno] = True
+            self._fec_buf.create_from(data)
+            self.commit_data(self._fec_buf, {"blockno": blockno})
+            self._fec_recovered += 1
+        if self._blockmap.is_complete():
+            self._state = self._STATE_VERIFYING
+
+    def inflate_block(self, data:Buffer) -> Buffer or None:
+        """Decompress a deflated block, None if it can't be used"""
+        if platdeps.deflate_decompress is None:
+            platdeps.message("warning: compressed block, but no decompression available")
+            return None
+        raw = platdeps.deflate_decompress(data[:])
+        if raw is None or len(raw) > self._blocksz:
+            platdeps.message("warning: compressed block is damaged")
+            return None
+        if self._zbuf is None:
+            self._zbuf = Buffer(size=Buffer.DEFAULT_START + self._blocksz)
+        self._zbuf.create_from(raw)
+        return self._zbuf
+
     @staticmethod
     def data_after_close(data:Buffer) -> None:
         """Handle any data that arrives after link is closed"""
@@ -1745,6 +3467,10 @@ class Receiver:
         """Get a string representation of transfer stats for this task"""
         return str(self._stats)
 
+    def get_transfer_stats(self) -> TransferStats:
+        """The transfer stats, as numbers"""
+        return self._stats
+
     def print_stats(self) -> None:
         """If progress enabled, print stats to it"""
         if self._progress_fn:
@@ -1774,76 +3500,669 @@ class Receiver:
 TYPENO_META = 0x01  # CCH typeno for msg_start
 # note, END message is FF, already known by the Message/Link
 
+# META options follow the ZTERM of the filename, each one is:
+# U8 tag, U8 len, U8 value[len]
+META_OPT_SIZES = 0x01  # U32BE nblocks, U16BE blocksz, U16BE lastblock
+META_OPT_FEC   = 0x02  # U8 K data blocks, U8 M parity blocks, per group
+META_OPT_FOUNTAIN = 0x03  # no value, data packets are LT symbols, not blocks
+META_OPT_DELTA = 0x04  # U8 basis sha256[:8], U16BE delta blocksz, data is a delta, not the file
+META_OPT_DIGEST_PENDING = 0x05  # no value, sha256 is zeros, a later META has it
+META_OPT_MERKLE = 0x06  # U16BE blocks per group, U8 root[8] of the group hashes
+
+def decode_meta_opts(data, pos:int) -> dict:  # tag:int -> value:bytes
+    """Decode any META options, starting at pos"""
+    opts = {}
+    while pos+2 <= len(data):
+        tag    = data[pos]
+        optlen = data[pos+1]
+        if pos+2+optlen > len(data): break  # truncated option, ignore it
+        opts[tag] = bytes(data[pos+2:pos+2+optlen])
+        pos += 2 + optlen
+    return opts
+
+# On a duplex link the receiver tells the sender which blocks are missing, so
+# only those are sent again. NACK is a CCH typeno on the file channel, going
+# the other way to META and END. U8 typeno, U8 flags, then each missing range
+# as varint gap (from the end of the previous range), varint count.
+# Varints are 7 bits per byte, low bits first, top bit set if more follow.
+
+TYPENO_NACK   = 0x03
+NACK_COMPLETE = 0x01  # receiver has every block, sender can stop
+NACK_MORE     = 0x02  # more ranges than would fit, the rest come in a later NACK
+NACK_MTU      = 240   # biggest NACK, on links with no MTU
+
+def put_varint(msg:bytearray, value:int) -> None:
+    while value >= 0x80:
+        msg.append((value & 0x7F) | 0x80)
+        value >>= 7
+    msg.append(value)
+
+def get_varint(data, pos:int) -> tuple or None:  # (value, newpos)
+    value = 0
+    shift = 0
+    while pos < len(data):
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        if b & 0x80 == 0: return value, pos
+        shift += 7
+    return None  # truncated
+
+def missing_ranges(blockmap:BitSet, start:int, end:int) -> list:  # of (first, count)
+    """Runs of clear flags in blockmap[start:end]"""
+    ranges = []
+    first = None
+    for blockno in range(start, end):
+        if not blockmap[blockno]:
+            if first is None: first = blockno
+        elif first is not None:
+            ranges.append((first, blockno-first))
+            first = None
+    if first is not None: ranges.append((first, end-first))
+    return ranges
+
+def subtract_ranges(ranges:list, cover:list) -> list:  # of (first, count)
+    """The parts of ranges that no range in cover overlaps"""
+    result = []
+    for first, count in ranges:
+        pieces = [(first, first+count)]
+        for cfirst, ccount in cover:
+            cend = cfirst + ccount
+            left = []
+            for start, end in pieces:
+                if cend <= start or cfirst >= end:
+                    left.append((start, end))
+                    continue
+                if start < cfirst: left.append((start, cfirst))
+                if cend < end:     left.append((cend, end))
+            pieces = left
+        for start, end in pieces: result.append((start, end-start))
+    return result
+
+def make_nack_msg(ranges:list, max_len:int, complete:bool=False) -> bytearray:
+    """Range-encode missing blocks, as many as fit in max_len"""
+    msg = bytearray()
+    msg.append(TYPENO_NACK)
+    msg.append(NACK_COMPLETE if complete else 0)
+    prev_end = 0
+    for first, count in ranges:
+        rec = bytearray()
+        put_varint(rec, first-prev_end)
+        put_varint(rec, count)
+        if len(msg) + len(rec) > max_len:
+            msg[1] |= NACK_MORE
+            break
+        msg.extend(rec)
+        prev_end = first+count
+    return msg
+
+def decode_nack_msg(data) -> tuple or None:  # (flags, [(first, count)])
+    """Unpack a NACK, None if it is damaged"""
+    if len(data) < 2 or data[0] != TYPENO_NACK: return None
+    flags  = data[1]
+    ranges = []
+    pos = 2
+    prev_end = 0
+    while pos < len(data):
+        gap = get_varint(data, pos)
+        if gap is None: return None
+        count = get_varint(data, gap[1])
+        if count is None: return None
+        first = prev_end + gap[0]
+        ranges.append((first, count[0]))
+        prev_end = first + count[0]
+        pos = count[1]
+    return flags, ranges
+
+# A receiver with a BlockStore can fill in blocks it already holds from other
+# files, if it knows the hash of each block. HASHES is a CCH typeno on the file
+# channel, U8 typeno, varint first blockno, then BlockStore.HASH_LEN bytes of
+# sha256 of each block from there on.
+
+TYPENO_HASHES = 0x04
+# small enough for any receive buffer, even before META has grown it
+HASHES_MTU    = Buffer.DEFAULT_SIZE - Buffer.DEFAULT_START - LinkMessage.PROTOCOL_OVERHEAD_EXT
+
+def make_hashes_msgs(read_fn:callable, blocksz:int, nblocks:int, max_len:int=HASHES_MTU) -> list:  # of bytearray
+    """Hash every block, read_fn(nbytes, offset), packed into as few messages as fit"""
+    hashes = [BlockStore.hash_block(read_fn(blocksz, blockno*blocksz)) for blockno in range(nblocks)]
+    return pack_hashes_msgs(TYPENO_HASHES, hashes, max_len)
+
+def pack_hashes_msgs(typeno:int, hashes:list, max_len:int=HASHES_MTU) -> list:  # of bytearray
+    """Pack equal length hashes into as few messages as fit, each with the index of its first"""
+    if len(hashes) == 0: return []
+    per_msg = (max_len - 1 - 5) // len(hashes[0])  # 5 is the longest varint index
+    msgs = []
+    for first in range(0, len(hashes), per_msg):
+        msg = bytearray()
+        msg.append(typeno)
+        put_varint(msg, first)
+        for h in hashes[first:first+per_msg]: msg.extend(h)
+        msgs.append(msg)
+    return msgs
+
+def decode_hashes_msg(data, typeno:int=TYPENO_HASHES, hash_len:int=BlockStore.HASH_LEN) -> tuple or None:  # (first, [hash])
+    """Unpack a HASHES (or GROUPHASHES) message, None if it is damaged"""
+    if len(data) < 2 or data[0] != typeno: return None
+    first = get_varint(data, 1)
+    if first is None: return None
+    pos = first[1]
+    if (len(data) - pos) % hash_len != 0: return None
+    hashes = []
+    while pos < len(data):
+        hashes.append(bytes(data[pos:pos+hash_len]))
+        pos += hash_len
+    return first[0], hashes
+
+# Merkle integrity: blocks are hashed in groups, and the group hashes (leaves)
+# are hashed in pairs, level by level, up to a root that goes in META. The
+# leaves go in GROUPHASHES messages, laid out like HASHES, but indexed by group.
+# Once the leaves hash up to the root they are trusted, and each group is
+# checked as soon as it is complete, so a bad block that got past the CRC
+# costs its group, not the whole file.
+
+TYPENO_GROUPHASHES = 0x05
+MERKLE_HASH_LEN    = 8
+MERKLE_GROUP       = 16  # blocks per group, by default
+
+def merkle_hash(data) -> bytes:
+    return platdeps.hashlib_sha256(data).digest()[:MERKLE_HASH_LEN]
+
+def merkle_root(leaves:list) -> bytes:
+    """Hash pairs of nodes, level by level, an odd one out goes up as it is"""
+    level = leaves
+    while len(level) > 1:
+        parents = []
+        for i in range(0, len(level)-1, 2): parents.append(merkle_hash(level[i] + level[i+1]))
+        if len(level) % 2 == 1: parents.append(level[-1])
+        level = parents
+    if len(level) == 0: return bytes(MERKLE_HASH_LEN)
+    return level[0]
+
+def group_leaves(read_fn:callable, blocksz:int, nblocks:int, group_blocks:int) -> list:  # of bytes
+    """Hash of each group of blocks, read_fn(nbytes, offset)"""
+    leaves = []
+    for first in range(0, nblocks, group_blocks):
+        nbytes = min(group_blocks, nblocks-first) * blocksz
+        leaves.append(merkle_hash(read_fn(nbytes, first*blocksz)))
+    return leaves
+
+class MerkleGroups:
+    """The group hashes of a file being received, trusted once they hash up to its root"""
+    def __init__(self, nblocks:int, group_blocks:int, root:bytes):  # ValueError if group_blocks is 0
+        if group_blocks == 0: raise ValueError("no blocks in a group")
+        self._group_blocks = group_blocks
+        self._nblocks      = nblocks
+        self._root         = root
+        self._leaves       = [None] * ((nblocks + group_blocks - 1) // group_blocks)
+        self._trusted      = False
+        self._checked      = BitSet(len(self._leaves))
+
+    def __len__(self) -> int:
+        return len(self._leaves)
+
+    def is_trusted(self) -> bool:
+        return self._trusted
+
+    def add_leaves(self, first:int, leaves:list) -> bool:
+        """Some group hashes arrived, True if that made them all trusted"""
+        if self._trusted: return False
+        for i in range(len(leaves)):
+            if first+i < len(self._leaves): self._leaves[first+i] = leaves[i]
+        if None in self._leaves: return False  # wait for the rest
+        if merkle_root(self._leaves) != self._root:
+            # a damaged message got through, so collect them all again from the repeats
+            platdeps.message("warning: group hashes don't match the META root")
+            self._leaves = [None] * len(self._leaves)
+            return False
+        self._trusted = True
+        return True
+
+    def group_of(self, blockno:int) -> int:
+        return blockno // self._group_blocks
+
+    def blocks_of(self, group:int) -> range:
+        first = group * self._group_blocks
+        return range(first, min(first + self._group_blocks, self._nblocks))
+
+    def get_leaf(self, group:int) -> bytes:
+        return self._leaves[group]
+
+    def is_checked(self, group:int) -> bool:
+        return self._checked[group]
+
+    def set_checked(self, group:int) -> None:
+        self._checked[group] = True
+
 class FileSender(Sender):
     """Send something we know to be a disk file"""
     START_META   = 8   # first 8 blocks are metadata message
     META_EVERY_N = 50  # send a new metadata message every N blocks
     NUM_REPEATS  = 3   # number of times to re-send the same block (0 means just send once)
+    MAX_BLOCKSZ  = LinkMessage.MAX_LEN_EXT - (LinkMessage.PROTOCOL_OVERHEAD_EXT-3)
+    # links with no MTU (streams, files) use big blocks, but not so big
+    # that one error in a noisy stream costs a lot of data to repeat
+    STREAM_BLOCKSZ = 1024
+    # K data + M parity blocks per group, for fec=True. Any 8 of 16 rebuilds the
+    # group, for half the airtime of NUM_REPEATS=3, and it survives longer bursts.
+    FEC_DEFAULT  = (8, 8)
+    NACK_TIMEOUT_MS = 1000  # wait this long for a NACK after END, then ask again
+    NACK_RETRIES    = 5     # ENDs with no reply, before giving up on the receiver
+    # multicast collects NACKs from every receiver for a whole window, longer
+    # than the receivers' backoff, and stops after this many silent windows
+    REPAIR_WINDOW_MS = 400
+    QUIET_ROUNDS     = 2
+    # deferred digest, METAs with the digest in, just before END
+    DIGEST_REPEATS   = 3
     # If you want to send sensor data, use a Sender() directly
 
     def __init__(self, filename:str, link_manager:LinkManager, progress_fn:callable or None=None,
-                 blocksz:int=16, repeats:int=NUM_REPEATS):
+                 blocksz:int or None=None, repeats:int=NUM_REPEATS, compress:bool=False,
+                 fec:tuple or bool or None=None, schedule:str="sequential", channel:int=LinkMessage.LINKCH,
+                 file_info:tuple or None=None, nack:bool=False, multicast:bool=False,
+                 name:str or None=None, block_hashes:bool=False,
+                 deferred_digest:bool=False, merkle:int or bool=False):  # fec is (K, M), file_info is (filesize, sha256) if known, name is sent in META
+        #NOTE: nack needs a duplex link, the receiver says what to send again
+        #NOTE: multicast is nack, for many receivers that suppress each other's NACKs
+        #NOTE: block_hashes lets receivers with a BlockStore skip blocks they already hold
+        #NOTE: deferred_digest starts sending before the file is hashed, the sha256
+        #is worked out as blocks are read, and sent in a later META
+        #NOTE: merkle sends group hashes, so receivers can check each group of
+        #that many blocks (MERKLE_GROUP if True) as it completes. The group hashes
+        #need the whole file read up front, so it can't be used with deferred_digest.
+        #NOTE: file_info can be a Future from worker_pool, tick() sends once it is ready
+        if multicast: nack = True
+        if fec is True: fec = self.FEC_DEFAULT
+        if fec or nack: repeats = 0  # parity or NACKs replace blind repeats
+        filesize = platdeps.filesize(filename)
+        if blocksz is None:
+            blocksz = self.auto_blocksz(link_manager, filesize, fec)
+        if blocksz > self.MAX_BLOCKSZ:
+            raise ValueError("blocksz too big, max:%d, got:%d" % (self.MAX_BLOCKSZ, blocksz))
+        if schedule not in SCHEDULERS:
+            raise ValueError("unknown schedule:%s" % schedule)
+        if merkle and deferred_digest:
+            raise ValueError("merkle reads the whole file before sending, so can't be deferred_digest")
+
+        self._fec = None
+        if fec:
+            self._fec = BlockFEC(fec[0], fec[1], blocksz, filesize // blocksz, filesize % blocksz)
+            self._fec_group  = None  # group that _fec_parity belongs to
+            self._fec_parity = None
+            nblocks = self._fec.get_nblocks()  # schedule positions in the FEC send order
+        else:
+            nblocks = (filesize + blocksz - 1) // blocksz
+        scheduler = SCHEDULERS[schedule](nblocks, repeats)
+
         self._filename    = filename
+        self._send_name   = platdeps.os_path_basename(filename if name is None else name)
         self._file_reader = FileReader(filename)
         self._linksender  = link_manager.get_sender()
-        self._cch         = LinkMessage.CCH | LinkMessage.LINKCH
-        self._dch         = LinkMessage.DCH | LinkMessage.LINKCH
+        self._cch         = LinkMessage.CCH | channel
+        self._dch         = LinkMessage.DCH | channel
         #NOTE: pass the file_reader and make it call read(), allows expansion later
         Sender.__init__(self, self._file_reader.read, LinkSenderFor(self._linksender, self._dch), progress_fn,
-                        blocksz, repeats=repeats)
+                        blocksz, repeats=repeats, compress=compress, scheduler=scheduler)
 
         # capture metadata of file, for later
-        sz, sha256 = get_file_info(filename)
+        if merkle is True: merkle = MERKLE_GROUP
+        hashes = block_hashes or merkle
+        if file_info is None:
+            if deferred_digest: file_info = (filesize, None)
+            elif not hashes:    file_info = get_file_info(filename)
+        self._info_future = None
+        self._hashing = hashes  # the worker job gives the hashes messages too
+        if hashes:
+            # the block and group hashes read the whole file, so they go on the
+            # same worker job as the sha256, tick() sends nothing until they are done
+            path = platdeps.os_path_realpath(filename)  # the job might run after a chdir
+            self._info_future = worker_pool.submit(self.hash_file, path, file_info, block_hashes, merkle)
+            self._deferred = file_info is not None and not isinstance(file_info, Future) and file_info[1] is None
+            file_info = (filesize, None)
+        elif isinstance(file_info, Future):
+            # still being hashed on a worker, tick() sends nothing until it is known
+            self._info_future = file_info
+            file_info = (filesize, None)
+        sz, sha256 = file_info
         self._filesize = sz
         self._filesha256  = sha256
+        if not hashes: self._deferred = sha256 is None and self._info_future is None
+        self._digesting = None  # Future, while the tail of a deferred digest is hashed
+        if self._deferred:
+            self._hasher    = platdeps.hashlib_sha256()  # running hash, of blocks read in order
+            self._hash_next = 0  # next blockno it needs
+            self._digest_sent = 0  # METAs sent with the digest in, before END
+        else:
+            self._hasher    = None
+
+        # all the hashes messages go after the first METAs, then one with each META
+        self._hashes_msgs = None  # set by file_info_ready(), from the worker
+        self._merkle = None  # (blocks per group, root)
+        self._next_hashes = 0
+
         self._meta_msg = self.make_meta_msg()
         ##platdeps.message("tx:%s\nsize:%d\nsha256:%s\n" % (filename, sz, hashstr(sha256)))
 
         self._tickno     = 0
+        self._nack       = nack
+        self._multicast  = multicast
+        if nack:
+            ndata = (sz + blocksz - 1) // blocksz
+            self._resend     = []  # blocknos the receiver is missing
+            self._resend_next = 0  # index of the next one to send, the list is emptied once all are sent
+            self._queued     = BitSet(ndata)  # blocknos in _resend
+            self._nresent    = 0
+            self._nack_wait  = None  # time_ms END was sent, until a NACK comes
+            self._nack_tries = 0
+            self._acked      = False
+            self._gave_up    = False  # no reply to NACK_RETRIES ENDs
+            self._nnacks     = 0  # NACKs heard
+            self._nrounds    = 0  # repair rounds sent
+            self._linkreceiver = link_manager.get_receiver()
+            self._nackbuf    = Buffer(size=Buffer.DEFAULT_START + NACK_MTU + LinkMessage.PROTOCOL_OVERHEAD_EXT)
+            self._linkreceiver.register(self._cch, self.received_ctrl)
+
+    def file_info_ready(self, wait:bool=False) -> bool:
+        """True once the sha256 is known, and in the META, wait for the worker if asked"""
+        if self._info_future is None: return True
+        if not wait and not self._info_future.is_ready(): return False
+        if self._hashing: (self._filesize, self._filesha256), self._hashes_msgs, self._merkle = self._info_future.get()
+        else:             self._filesize, self._filesha256 = self._info_future.get()  # or exception
+        self._info_future = None
+        self._meta_msg = self.make_meta_msg()
+        return True
+
+    def hash_file(self, path:str, file_info:tuple or Future or None, block_hashes:bool, merkle:int) -> tuple:
+        """On a worker, (file_info, hashes msgs or None, (blocks per group, root) or None)"""
+        # a file_info Future was queued before this job, so a worker has it already
+        if isinstance(file_info, Future): file_info = file_info.get()
+        elif file_info is None:           file_info = get_file_info(path)
+        reader = FileReader(path)  # its own, the sender's is only for tick()
+        ndata  = (file_info[0] + self._blocksz - 1) // self._blocksz
+        msgs   = []
+        if block_hashes:
+            msgs.extend(make_hashes_msgs(reader.read, self._blocksz, ndata))
+        groups = None
+        if merkle:
+            leaves = group_leaves(reader.read, self._blocksz, ndata, merkle)
+            groups = (merkle, merkle_root(leaves))
+            msgs.extend(pack_hashes_msgs(TYPENO_GROUPHASHES, leaves))
+        reader.close()
+        if len(msgs) == 0: msgs = None
+        return file_info, msgs, groups
+
+    def get_file_info(self) -> tuple:  # of (filesize:int, sha256:bytes)
+        """Size and sha256 of the file, waits for the worker if it is still hashing"""
+        self.file_info_ready(wait=True)
+        return self._filesize, self._filesha256
+
+    def get_meta(self) -> tuple:  # of (channel:int, msg)
+        """The META message, and the control channel it goes on"""
+        self.file_info_ready(wait=True)
+        return self._cch, self._meta_msg
+
+    def get_data_channel(self) -> int:
+        return self._dch
+
+    def get_nblocks(self) -> int:
+        """Blocks this file is sent as, parity included"""
+        if self._fec is not None: return self._fec.get_nblocks()
+        filesize = self.get_file_info()[0]
+        return (filesize + self._blocksz - 1) // self._blocksz
+
+    @staticmethod
+    def auto_blocksz(link_manager:LinkManager, filesize:int, fec:tuple or None=None) -> int:
+        """The biggest block that fits in a single packet on this link"""
+        blocksz = link_manager.get_mtu()
+        if blocksz is None: return FileSender.STREAM_BLOCKSZ
+        max_blockno = filesize // blocksz
+        if fec: max_blockno = max_blockno * (fec[0]+fec[1]) // fec[0]  # parity blocknos follow data
+        if max_blockno > LinkMessage.MAX_BLOCKNO:
+            # big file, so the bigger extended header will be used
+            blocksz = link_manager.get_mtu(max_blockno)
+        return min(blocksz, FileSender.MAX_BLOCKSZ)
 
     def make_meta_msg(self):
         """Calculate and build a metadata message for this file"""
-        ##assert self._blocksz <= 255, "make_meta_msg: block size too big, max:255, got:%d" % self._blocksz
-
-        just_filename = platdeps.os_path_basename(self._filename)
+        just_filename = self._send_name
         msg = bytearray()
         msg.append(TYPENO_META)
 
+        nblocks   = int(self._filesize / self._blocksz)
+        lastblock = int(self._filesize % self._blocksz)
+        # big files or big blocks don't fit the U16/U8 fields, so they
+        # get a META_OPT_SIZES option, and will use extended link headers
+        extended  = nblocks > 0xFFFF or self._blocksz > 0xFF
+
         # U16 nblocks
-        nblocks = int(self._filesize / self._blocksz)
         msg.append(high(nblocks))
         msg.append(low(nblocks))
 
         # U8 blocksize
-        msg.append(self._blocksz)
+        msg.append(self._blocksz & 0xFF)
 
         # U8 lastblock
-        lastblock = int(self._filesize % self._blocksz)
-        msg.append(lastblock)
+        msg.append(lastblock & 0xFF)
 
-        # sha256 digest of file
-        msg.extend(self._filesha256)
+        # sha256 digest of file, zeros until it is known
+        if self._filesha256 is None: msg.extend(bytes(32))
+        else:                        msg.extend(self._filesha256)
 
         # filename, z-terminated
         for ch in just_filename: msg.append(ord(ch))
         msg.append(0x00)  # terminate string, in case more data follows
 
+        # options
+        if extended:
+            msg.append(META_OPT_SIZES)
+            msg.append(4+2+2)
+            msg.extend(nblocks.to_bytes(4, "big"))
+            msg.extend(self._blocksz.to_bytes(2, "big"))
+            msg.extend(lastblock.to_bytes(2, "big"))
+
+        if self._fec is not None:
+            k, m = self._fec.get_k_m()
+            msg.append(META_OPT_FEC)
+            msg.append(2)
+            msg.append(k)
+            msg.append(m)
+
+        if self._filesha256 is None:
+            msg.append(META_OPT_DIGEST_PENDING)
+            msg.append(0)
+
+        if self._merkle is not None:
+            group_blocks, root = self._merkle
+            msg.append(META_OPT_MERKLE)
+            msg.append(2 + MERKLE_HASH_LEN)
+            msg.append(high(group_blocks))
+            msg.append(low(group_blocks))
+            msg.extend(root)
+
         return msg
 
+    def choose_next_block(self) -> tuple: # of (blockno:int, repno:int)
+        """NACKed blocks first, scheduled positions map onto the FEC send order"""
+        if self._nack and self.nresend() != 0:
+            blockno = self._resend[self._resend_next]
+            self._resend_next += 1
+            if self._resend_next == len(self._resend):
+                self._resend      = []
+                self._resend_next = 0
+            self._queued[blockno] = False
+            self._nresent += 1
+            return blockno, 0
+        seqno, repno = Sender.choose_next_block(self)
+        if self._fec is None: return seqno, repno
+        blockno = self._fec.send_order(seqno)
+        if blockno is None: blockno = self._fec.get_nblocks()  # past the end, reads EOF
+        return blockno, repno
+
+    def read_block(self, blockno:int or None):
+        """Read a data block from the file, or make a parity block"""
+        if self._fec is None or blockno is None or blockno < self._fec.get_ndata():
+            data = Sender.read_block(self, blockno)
+            if self._hasher is not None and blockno == self._hash_next and data is not None:
+                self.extend_digest(data)
+            return data
+        if not self._fec.is_parity(blockno): return None  # all sent, EOF
+
+        group = self._fec.group_of(blockno)
+        if group != self._fec_group:
+            # parity is made once per group, when its first parity block is sent
+            self._fec_parity = self._fec.encode_group(group, self._file_reader.read)
+            self._fec_group  = group
+        return self._fec_parity[self._fec.parity_index(blockno)]
+
+    def extend_digest(self, data) -> None:
+        """The next block in file order was read, so add it to the running hash"""
+        self._hasher.update(data)
+        self._hash_next += 1
+        if self._hash_next * self._blocksz >= self._filesize: self.finish_digest()
+
+    def finish_digest(self, wait:bool=False) -> bool:
+        """True once the digest is in META, the rest of the file is hashed on a worker"""
+        if self._digesting is None:
+            if self._hasher is None: return True  # already done
+            hasher, self._hasher = self._hasher, None  # no more running hash, the worker has it
+            self._digesting = worker_pool.submit(self.hash_tail, hasher, self._hash_next * self._blocksz)
+        if not wait and not self._digesting.is_ready(): return False
+        self._filesha256 = self._digesting.get()  # or exception
+        self._digesting  = None
+        self._meta_msg   = self.make_meta_msg()
+        return True
+
+    def hash_tail(self, hasher, offset:int) -> bytes:
+        """Add the file from offset to a running hash, and return the digest"""
+        # out of order schedules leave a tail, it is read here once, with a reader
+        # of its own, as the sender might still read blocks while this runs
+        reader = FileReader(self._filename)
+        while offset < self._filesize:
+            data = reader.read(platdeps.HASH_CHUNK, offset)
+            if data is None: break  # EOF
+            hasher.update(data)
+            offset += len(data)
+        reader.close()
+        return hasher.digest()
+
     def send_meta(self) -> None:
         """Send the cached meta message for this file"""
         ##platdeps.message("sending META")
-
-        buf = Buffer()  #IDEA: keep a buffer handy for this, or use our self._buffer
-        buf.extend(self._meta_msg)
+        self.send_ctrl(self._meta_msg)
+
+    def send_hashes(self) -> None:
+        """Send the next block hashes message, round robin"""
+        self.send_ctrl(self._hashes_msgs[self._next_hashes])
+        self._next_hashes = (self._next_hashes + 1) % len(self._hashes_msgs)
+
+    def send_ctrl(self, msg:bytearray) -> None:
+        """Send a message on the control channel of this file"""
+        #IDEA: keep a buffer handy for this, or use our self._buffer
+        buf = Buffer(size=Buffer.DEFAULT_START + len(msg) + LinkMessage.PROTOCOL_OVERHEAD_EXT)
+        buf.extend(msg)
         self._linksender.send(buf, {LinkMessage.CHANNEL: self._cch})  #IDEA: consider kwargs
+        if self._pacer is not None: self._pacer.sent(len(buf))  # send() added the header and CRC
         del buf
 
+    def send_eof(self) -> None:
+        """With NACKs, END asks the receiver what it is still missing"""
+        if self._deferred and self._digest_sent < self.DIGEST_REPEATS:
+            # receivers can't verify without the digest, so it goes before END,
+            # one per tick, this is called again while the data is at EOF
+            if not self.finish_digest(): return  # the worker is still hashing
+            self.send_meta()
+            self._digest_sent += 1
+            return
+        if not self._nack:
+            Sender.send_eof(self)
+            return
+        self._link.send(None)  # EOF
+        self._nack_wait = platdeps.time_ms()
+        self._nack_tries += 1
+
+    def received_ctrl(self, data:Buffer, info:dict or None=None) -> bool:
+        """Called by mux when a NACK comes back from the receiver"""
+        _ = info  # argused
+        nack = decode_nack_msg(data)
+        if nack is None: return False  # NOT HANDLED
+        flags, ranges = nack
+        if flags & NACK_COMPLETE:
+            self._acked = True
+            return True  # HANDLED
+        # ranges from all receivers are merged, _queued stops duplicates
+        self._nnacks += 1
+        for first, count in ranges:
+            for blockno in range(first, min(first+count, len(self._queued))):
+                if not self._queued[blockno]:
+                    self._queued[blockno] = True
+                    self._resend.append(blockno)
+        if not self._multicast:
+            # only one receiver to hear from, so repair straight away
+            self._nack_wait  = None
+            self._nack_tries = 0
+            self._nrounds   += 1
+        return True  # HANDLED
+
+    def get_resent(self) -> int:
+        """Number of blocks sent again, because a receiver asked"""
+        return self._nresent if self._nack else 0
+
+    def get_nack_stats(self) -> tuple:  # of (nacks_heard, repair_rounds)
+        return (self._nnacks, self._nrounds) if self._nack else (0, 0)
+
+    def gave_up(self) -> bool:
+        """True if the receiver stopped answering, so it might not have the whole file"""
+        return self._nack and self._gave_up
+
+    def nresend(self) -> int:
+        """Blocks still to send again, that a receiver NACKed"""
+        return len(self._resend) - self._resend_next
+
+    def nack_window(self) -> tuple:  # of (wait_ms, max_tries)
+        if self._multicast: return self.REPAIR_WINDOW_MS, self.QUIET_ROUNDS
+        return self.NACK_TIMEOUT_MS, self.NACK_RETRIES
+
+    def nack_tick(self) -> bool:
+        """Collect NACKs, False when the receiver has everything, or has gone"""
+        self._linkreceiver.recvinto_for(self._nackbuf, {}, self._cch)
+        self._nackbuf.reset()
+        wait_ms, max_tries = self.nack_window()
+        # for multicast, silence means every receiver is complete
+        gone = self._nack_wait is not None and self._nack_tries >= max_tries and self.nresend() == 0 and \
+               platdeps.ticks_diff(platdeps.time_ms(), self._nack_wait) >= wait_ms
+        if gone and not self._multicast and not self._acked:
+            platdeps.message("warning: no NACK from receiver, giving up")
+            self._gave_up = True
+        if self._acked or gone:
+            self._is_running = False
+            self._linkreceiver.register(self._cch, self.received_ctrl, delete=True)
+            self.done()
+        return self._is_running
+
     def tick(self) -> bool:
         """Pump regular send processing"""
+        if not self.file_info_ready(): return True  # hashing on a worker, nothing to send yet
+        if self.is_paced(): return True  # not due yet, META is paced too
+        if self._nack and self._is_running:
+            if not self.nack_tick(): return False
+            if self._nack_wait is not None:
+                # END sent, nothing is due until the receiver replies, or it times out
+                if platdeps.ticks_diff(platdeps.time_ms(), self._nack_wait) < self.nack_window()[0]: return True
+                if self.nresend() == 0:
+                    self.send_eof()  # ask again
+                    return True
+                # window closed with NACKs, so send a repair round
+                self._nack_wait  = None
+                self._nack_tries = 0
+                self._nrounds   += 1
         # send the metadata every few blocks as well
         if self._tickno < self.START_META or self._tickno % self.META_EVERY_N == 0:
             self.send_meta()
+            if self._hashes_msgs is not None and self._tickno >= self.START_META:
+                self.send_hashes()  # for late joiners
+            res = True
+        elif self._hashes_msgs is not None and self._tickno < self.START_META + len(self._hashes_msgs):
+            self.send_hashes()  # all of them, before any data
             res = True
         else:
             # a normal data transfer from Sender() parent
@@ -1857,11 +4176,32 @@ class FileReceiver(Receiver):
     #NOTE: If you want to receive sensor data, use a Receiver() directly
 
     FILENAME_BASE = "received"  # adds extn on based on transmitted metadata
+    FOUNTAIN = False  # True if this receiver decodes META_OPT_FOUNTAIN transfers
+    NACK_BACKOFF_MS = 200  # multicast, random wait before NACKing, < REPAIR_WINDOW_MS
+    DIGEST_WAIT_MS  = 5000  # all blocks in, give up on a deferred digest that hasn't come
 
     def __init__(self, link_manager:LinkManager, filename:str or None, progress_fn:callable or None=None,
-                 cached:bool=False):
+                 cached:bool=False, channel:int=LinkMessage.LINKCH, keep_name:bool=False,
+                 resume:bool=False, nack:bool=False, multicast:bool=False, basis:str or list or None=None,
+                 store:BlockStore or None=None, write_budget:int or None=None,
+                 sync:int=ImmediateFileWriter.SYNC_NONE, mapped:bool=False, out_dir:str or None=None):
         #NOTE: cached for Raspberry Pi Pico local filesystem
         #NOTE: uncached for sdcard or host file system
+        #NOTE: mapped for big files on host, blocks are copied into an mmap of the file
+        #NOTE: keep_name saves as the sent filename, not FILENAME_BASE+ext
+        #NOTE: resume checkpoints progress, so a restarted receiver only needs
+        #the missing blocks. Only uncached, as a cache is lost with the process.
+        #NOTE: nack needs a duplex link, missing blocks are asked for at each END
+        #NOTE: multicast NACKs after a random backoff, leaving out the blocks that
+        #other receivers have already NACKed, so the return channel isn't swamped
+        #NOTE: basis is the old copy (or copies) a DeltaFileSender may send changes against
+        #NOTE: store keeps every file received, so a repeat of one finishes at its META,
+        #and blocks of a new file that are already held are not waited for
+        #NOTE: out_dir is where the file goes, its temp file is made there too, so the
+        #final rename is atomic. Temp files are unique to each transfer, so many
+        #receivers can share a directory.
+        #NOTE: write_budget is bytes of blocks held in RAM. Uncached, they are then
+        #written out, cached ones beyond it are spilled to the temp file.
 
         # No metadata received yet
         self._nblocks        = None
@@ -1871,21 +4211,76 @@ class FileReceiver(Receiver):
 
         # setup link connection
         self._linkreceiver   = link_manager.get_receiver()
-        self._cch            = LinkMessage.CCH | LinkMessage.LINKCH
-        self._dch            = LinkMessage.DCH | LinkMessage.LINKCH
+        self._cch            = LinkMessage.CCH | channel
+        self._dch            = LinkMessage.DCH | channel
+        self._keep_name      = keep_name
+        # a receiver that keeps the sent name only accepts that file, as
+        # a batch re-uses channels, and the previous file may still be sending
+        self._expect_name    = filename if keep_name else None
+        self._sidecar        = None
+        self._resume         = resume and not cached  # a cache is lost with the process
+        self._out_dir        = out_dir
+        self._session        = "%08X" % random.getrandbits(32)  # temp name, when it can't be resumed
+        self._temp_name      = None
+        self._lock           = None  # open while this receiver owns a resumable temp file
+        self._lock_name      = None
+        self._nack           = None  # LinkSender, for NACKs back to the sender
+        self._multicast      = multicast
+        self._nack_due       = None  # time_ms a multicast NACK is due, after its backoff
+        self._digest_wait    = None  # time_ms all blocks were in, without the deferred digest
+        self._overheard      = []  # ranges other receivers NACKed during the backoff
+        self._nnacks         = 0  # NACKs sent
+        self._nsuppressed    = 0  # NACKs not sent, as others asked for it all
+        if basis is None or isinstance(basis, list): self._bases = basis
+        else:                                        self._bases = [basis]
+        self._basis_ids      = None  # basis id -> basis filename, hashed at the first delta META
+        self._delta          = None  # (basis filename, delta blocksz), if receiving a delta
+        self._store          = store
+        self._ndeduped       = 0  # blocks filled in from the store
+        self._dedup_buf      = None
+        self._merkle         = None  # MerkleGroups, if the sender sends group hashes
+        self._nbad_groups    = 0  # groups that failed their check, and were received again
+        if nack or multicast:
+            self._nack       = link_manager.get_sender()
+            self._nack_mtu   = link_manager.get_mtu()
+            if self._nack_mtu is None: self._nack_mtu = NACK_MTU
         if cached:
             # Raspberry Pi Pico filesystem writes insert a 32ms interrupts-off condition
             # which trashes the receive pipeline, so use one of the cached modes
             platdeps.message("using: CachedFileWriter(PREALLOC)")
-            self._writer = CachedFileWriter(CachedFileWriter.PREALLOC)  # PREALLOC or ON_DEMAND
+            self._writer = CachedFileWriter(CachedFileWriter.PREALLOC, budget=write_budget)  # PREALLOC or ON_DEMAND
         else:
-            # host or sdcard writes can be written as we go along
-            platdeps.message("using: ImmediateFileWriter")
-            self._writer = ImmediateFileWriter()
+            # the temp name is set at META, when the sha256 is known
+            if mapped:
+                platdeps.message("using: MmapFileWriter")
+                self._writer = MmapFileWriter(sync=sync)
+            else:
+                # host or sdcard writes can be written as we go along
+                platdeps.message("using: ImmediateFileWriter")
+                # a checkpoint only covers blocks in the file, so by default resumable writes go
+                # straight through, any held blocks are lost if the receiver is killed
+                if write_budget is None: write_budget = 0 if resume else ImmediateFileWriter.BUDGET
+                self._writer = ImmediateFileWriter(budget=write_budget, sync=sync)
+            if resume: self._writer.set_written_fn(self.block_written)
+        if out_dir is not None:
+            try:
+                platdeps.os_mkdir(out_dir)
+            except OSError: pass  # already there
 
         self._linkreceiver.register(self._cch, self.received_ctrl)  # for META_MSG, END_MSG
+        # data comes by callback too, so receivers on other channels can share the link
+        self._linkreceiver.register(self._dch, self.received_data)
         Receiver.__init__(self, LinkReceiverFor(self._linkreceiver, self._dch), self._writer.write, progress_fn)
 
+    def get_link_quality(self) -> LinkQuality:
+        """Get the rolling quality estimate of the link we are receiving from"""
+        return self._linkreceiver.get_quality()
+
+    def received_data(self, data:Buffer, info:dict or None=None) -> None:
+        """Called by mux when data received for this channel"""
+        if info is None: info = {}
+        if len(data) != 0: self.process_received(data, info)
+
     def received_ctrl(self, data:Buffer, info:dict or None=None) -> bool:
         """Called by mux when ctrl received for this channel"""
         _ = info  # argsused
@@ -1896,6 +4291,9 @@ class FileReceiver(Receiver):
         typeno = data[0]
         if typeno == TYPENO_META:           return self._decode_meta_msg(data)
         if typeno == LinkMessage.CCH_END:   return self._decode_end_msg(data)
+        if typeno == TYPENO_NACK:           return self._overheard_nack(data)
+        if typeno == TYPENO_HASHES:         return self._decode_hashes_msg(data)
+        if typeno == TYPENO_GROUPHASHES:    return self._decode_grouphashes_msg(data)
         return False  # NOT HANDLED  #IDEA or None vs a printable error object?
 
     def _decode_meta_msg(self, data:Buffer) -> bool:
@@ -1911,10 +4309,35 @@ class FileReceiver(Receiver):
         blocksz      = data[3]
         lastblock    = data[4]
         sha256       = bytes(data[5:5+32])
-        filename_raw = bytes(data[5+32:-1])  # skip the ZTERM
+        name_end     = 5+32
+        while name_end < len(data) and data[name_end] != 0: name_end += 1
+        filename_raw = bytes(data[5+32:name_end])  # skip the ZTERM
+        opts         = decode_meta_opts(data, name_end+1)
         filename     = platdeps.decode_to_str(filename_raw)
-        filename     = platdeps.os_path_basename(filename)  # no directories allowed
+        filename     = platdeps.os_path_basename(filename)  # no directories allowed
         _, ext       = platdeps.os_path_splitext(filename)
+        if META_OPT_DIGEST_PENDING in opts: sha256 = None  # comes in a later META
+
+        if (META_OPT_FOUNTAIN in opts) != self.FOUNTAIN:
+            platdeps.message("warning: fountain coding mismatch, use %s" %
+                             ("FountainFileReceiver" if not self.FOUNTAIN else "FileReceiver"))
+            return False  # NOT HANDLED, data packets can't be used
+
+        if self._expect_name is not None and filename != self._expect_name:
+            return True  # HANDLED, but for an earlier file on this channel, ignore it
+
+        if META_OPT_SIZES in opts:
+            # big file or big blocks, these override the short fields
+            sizes     = opts[META_OPT_SIZES]
+            nblocks   = int.from_bytes(sizes[0:4], "big")
+            blocksz   = int.from_bytes(sizes[4:6], "big")
+            lastblock = int.from_bytes(sizes[6:8], "big")
+
+        if self._nblocks is None and self._store is not None and sha256 is not None and self._store.has(sha256):
+            return self.finish_from_store(sha256, filename, self.local_name_for(filename, ext))
+
+        if self._nblocks is None and META_OPT_DELTA in opts:
+            if not self._find_basis(opts[META_OPT_DELTA]): return False  # NOT HANDLED, can't rebuild it
 
         if self._nblocks is None:
             ##platdeps.message("capturing metadata for file")
@@ -1925,27 +4348,270 @@ class FileReceiver(Receiver):
             self._lastblock        = lastblock
             self._sha256           = sha256
             self._remote_filename  = filename
-            self._local_filename   = self.FILENAME_BASE + ext
+            self._local_filename   = self.local_name_for(filename, ext)
+            if self._delta is not None:
+                # the delta is received beside the target, then rebuilt into it
+                self._delta_target   = self._local_filename
+                self._local_filename = self.out_path_for("_DELTA_%s.delta" % self._session)
             print("send(%s) -> receive(%s)" % (self._remote_filename, self._local_filename))
 
             # now able to monitor the progress of block transfer
             self.set_block_info(blocksz, nblocks, lastblock)
             ##filesize = (nblocks * blocksz) + lastblock
-            self._writer.start(self._local_filename, blocksz, nblocks, lastblock)  #NOTE: this 3-tuple might make a nice class
+            # a checkpoint is keyed by the sha256, so not if it comes later, and only
+            # one receiver at a time can have it, any others get a temp file of their own
+            key = self._session
+            if self._resume and sha256 is not None:
+                self._lock_name = platdeps.os_path_splitext(self.temp_name_for(hexstr(sha256[:8])))[0] + ".lock"
+                self._lock = platdeps.lock_file(self._lock_name)
+                if self._lock is not None: key = hexstr(sha256[:8])
+                else: platdeps.message("warning: another receiver has this file, so this one can't resume")
+            self._temp_name = self.temp_name_for(key)
+            self._writer.set_temp_name(self._temp_name)
+            if self._lock is not None:
+                self._sidecar = BlockmapSidecar(platdeps.os_path_splitext(self._temp_name)[0] + ".map")
+            if self._sidecar is None:
+                self._writer.start(self._local_filename, blocksz, nblocks, lastblock)  #NOTE: this 3-tuple might make a nice class
+            else:
+                self.start_resumable(blocksz, nblocks, lastblock)
+            if META_OPT_MERKLE in opts and len(opts[META_OPT_MERKLE]) >= 2 + MERKLE_HASH_LEN:
+                value = opts[META_OPT_MERKLE]
+                try:
+                    self._merkle = MerkleGroups(len(self._blockmap), (value[0]<<8) | value[1],
+                                                bytes(value[2:2+MERKLE_HASH_LEN]))
+                except ValueError:
+                    platdeps.message("warning: bad merkle option, groups won't be checked")
+            if META_OPT_FEC in opts and len(opts[META_OPT_FEC]) >= 2:
+                k, m = opts[META_OPT_FEC][0], opts[META_OPT_FEC][1]
+                try:
+                    self.set_fec(BlockFEC(k, m, blocksz, nblocks, lastblock), self._writer.read)
+                except ValueError:
+                    platdeps.message("warning: bad FEC group k:%d m:%d, parity ignored" % (k, m))
             ##platdeps.message("rx:start: nb:%d bsz:%d lb:%d sha256:%s nm:%s" % (nblocks, blocksz, lastblock, hashstr(sha256), filename))
 
         else:
+            if self._sha256 is None and sha256 is not None:
+                self._sha256 = sha256  # deferred digest has arrived
             # duplicate metadata, check it all matches
             if  nblocks != self._nblocks or \
                 blocksz != self._blocksize or \
                 lastblock != self._lastblock or \
-                sha256 != self._sha256 or \
+                (sha256 is not None and sha256 != self._sha256) or \
                 filename != self._remote_filename:
                 self.finished_err("new metadata, but file is DIFFERENT")
 
         ##platdeps.message(str(self._blockmap)) # TESTING
         return True  # HANDLED
 
+    def ready_to_verify(self) -> bool:
+        """A deferred digest must arrive before the file can be checked, or it fails"""
+        if self._nblocks is None or self._sha256 is not None: return True
+        # every META with the digest in might be lost, so don't wait forever
+        now = platdeps.time_ms()
+        if self._digest_wait is None: self._digest_wait = now
+        elif platdeps.ticks_diff(now, self._digest_wait) >= self.DIGEST_WAIT_MS:
+            self.stop_listening(complete=False)
+            self._writer.abort()
+            if self._sidecar is not None: self._sidecar.remove()
+            self.release_lock()
+            self.finished_err("deferred digest never arrived, can't check the file")
+        return False
+
+    def local_name_for(self, filename:str, ext:str) -> str:
+        if self._keep_name: return self.out_path_for(filename)
+        return self.out_path_for(self.FILENAME_BASE + ext)
+
+    def out_path_for(self, name:str) -> str:
+        if self._out_dir is None: return name
+        return self._out_dir + "/" + name
+
+    def temp_name_for(self, key:str) -> str:
+        """Temp file for this transfer, next to where the file goes, so the rename is atomic"""
+        return self.out_path_for("_INPROGRESS_%s.tmp" % key)
+
+    def release_lock(self) -> None:
+        """Let another receiver resume this file"""
+        if self._lock is None: return
+        try:
+            platdeps.os_unlink(self._lock_name)
+        except OSError: pass  # already gone
+        self._lock.close()
+        self._lock = None
+
+    def get_temp_name(self) -> str or None:
+        """The temp file being received into, None before META"""
+        return self._temp_name
+
+    def finish_from_store(self, sha256:bytes, filename:str, local_filename:str) -> bool:
+        """Received this file before, so take it from the store, there is nothing to wait for"""
+        self.stop_listening()
+        print("send(%s) -> store(%s)" % (filename, local_filename))
+        try:
+            self._store.extract(sha256, local_filename)
+        except OSError as e:
+            self.finished_err("can't take from store:%s" % str(e))
+            return True  # HANDLED
+        self._remote_filename = filename
+        self._local_filename  = local_filename
+        self.finished_ok("already held:%s" % local_filename)
+        return True  # HANDLED
+
+    def _decode_hashes_msg(self, data:Buffer) -> bool:
+        """Block hashes, fill in any of the blocks that the store already holds"""
+        if self._store is None or self._blockmap is None or self._writer_fn is None: return False  # NOT HANDLED
+        msg = decode_hashes_msg(data)
+        if msg is None: return False
+        first, hashes = msg
+        nblocks = len(self._blockmap)
+        for i in range(len(hashes)):
+            blockno = first + i
+            if blockno >= nblocks: break
+            if self._blockmap[blockno]: continue  # already received
+            block = self._store.find_block(hashes[i], self.block_len(blockno))
+            if block is None: continue  # not held, it will come over the air
+            if self._dedup_buf is None: self._dedup_buf = Buffer(size=Buffer.DEFAULT_START + self._blocksize)
+            self._blockmap[blockno] = True
+            self._dedup_buf.create_from(block)
+            self.commit_data(self._dedup_buf, {"blockno": blockno})
+            self._ndeduped += 1
+            if self._fec is not None: self.fec_recover(self._fec.group_of(blockno))
+        if self._blockmap.is_complete(): self._state = self._STATE_VERIFYING
+        return True  # HANDLED
+
+    def block_len(self, blockno:int) -> int:
+        """Bytes in this block, the last one may be short"""
+        if blockno == len(self._blockmap)-1 and self._lastblock != 0: return self._lastblock
+        return self._blocksize
+
+    def _decode_grouphashes_msg(self, data:Buffer) -> bool:
+        """Group hashes, once they are all here and trusted, check the groups already complete"""
+        if self._merkle is None: return False  # NOT HANDLED, no root to trust them by
+        msg = decode_hashes_msg(data, TYPENO_GROUPHASHES, MERKLE_HASH_LEN)
+        if msg is None: return False
+        if self._merkle.add_leaves(msg[0], msg[1]) and self._writer_fn is not None:
+            for group in range(len(self._merkle)): self.check_group(group)
+        return True  # HANDLED
+
+    def check_group(self, group:int) -> None:
+        """If this group is complete, check it, and receive it again if it is damaged"""
+        merkle = self._merkle
+        if merkle.is_checked(group): return
+        blocks = merkle.blocks_of(group)
+        for blockno in blocks:
+            if not self._blockmap[blockno]: return  # not complete yet
+        hasher = platdeps.hashlib_sha256()
+        for blockno in blocks:
+            hasher.update(self._writer.read(self.block_len(blockno), blockno*self._blocksize))
+        if hasher.digest()[:MERKLE_HASH_LEN] == merkle.get_leaf(group):
+            merkle.set_checked(group)
+            return
+        # a bad block got past the CRC, or was written badly, so only this group is lost
+        platdeps.message("warning: group %d is damaged, waiting for it again" % group)
+        for blockno in blocks:
+            self._blockmap[blockno] = False
+            if self._sidecar is not None: self._sidecar.unmark(blockno)
+        self._nbad_groups += 1
+        if self._state == self._STATE_VERIFYING: self._state = self._STATE_TRANSFERRING
+
+    def get_bad_groups(self) -> int:
+        """Number of groups that failed their check, and were received again"""
+        return self._nbad_groups
+
+    def get_deduped(self) -> int:
+        """Number of blocks filled in from the store, not received"""
+        return self._ndeduped
+
+    def get_write_stats(self) -> WStats:
+        return self._writer.get_stats()
+
+    def _find_basis(self, value:bytes) -> bool:
+        """Pick the basis file that the delta in this META was made against"""
+        if len(value) < BASIS_ID_LEN + 2: return False
+        basis_id = bytes(value[0:BASIS_ID_LEN])
+        dblocksz = (value[BASIS_ID_LEN]<<8) | value[BASIS_ID_LEN+1]
+        if self._basis_ids is None and self._bases is not None:
+            # each basis is hashed once, not again for every META that repeats
+            self._basis_ids = {}
+            for basis in self._bases:
+                try:
+                    self._basis_ids[get_file_info(basis)[1][:BASIS_ID_LEN]] = basis
+                except OSError: pass  # missing basis, leave it out
+        if self._basis_ids is not None and basis_id in self._basis_ids:
+            self._delta = (self._basis_ids[basis_id], dblocksz)
+            return True
+        platdeps.message("warning: delta needs basis:%s, not held, ignoring" % hexstr(basis_id))
+        return False
+
+    def start_resumable(self, blocksz:int, nblocks:int, lastblock:int) -> None:
+        """Start the writer, carrying on from a checkpoint of this same file if there is one"""
+        restored = self._sidecar.open(self._sha256, len(self._blockmap))
+        if not self._writer.start(self._local_filename, blocksz, nblocks, lastblock, resume=restored):
+            if restored: self._sidecar.clear()  # partial file has gone
+            return
+        self._blockmap.load(self._sidecar.get_flags())
+        platdeps.message("resuming: %d of %d blocks already received" % (
+            self._blockmap.get_nset(), len(self._blockmap)))
+        if self._blockmap.is_complete(): self._state = self._STATE_VERIFYING
+
+    def block_written(self, offset:int) -> None:
+        """Checkpoint each block, once the writer has it in the file"""
+        if self._sidecar is None or self._blocksize is None: return
+        blockno = offset // self._blocksize
+        if self._blockmap[blockno]: self._sidecar.mark(blockno)  # not if a bad group was unmarked
+
+    def commit_data(self, data:Buffer, info:dict) -> None:
+        """Check merkle groups as they complete"""
+        Receiver.commit_data(self, data, info)
+        if self._merkle is not None and self._merkle.is_trusted() and data is not None and len(data) != 0 and \
+                "blockno" in info:
+            self.check_group(self._merkle.group_of(info["blockno"]))
+
+    def send_nack(self, ranges:list, complete:bool=False) -> None:
+        """Tell the sender which blocks are missing, or that none are"""
+        msg = make_nack_msg(ranges, self._nack_mtu, complete)
+        buf = Buffer(size=Buffer.DEFAULT_START + len(msg) + LinkMessage.PROTOCOL_OVERHEAD_EXT)
+        buf.extend(msg)
+        self._nack.send(buf, {LinkMessage.CHANNEL: self._cch})
+        self._nnacks += 1
+        del buf
+
+    def _overheard_nack(self, data:Buffer) -> bool:
+        """Another receiver NACKed, so we needn't ask for the same blocks"""
+        if self._nack_due is None: return False  # NOT HANDLED, not waiting to NACK
+        nack = decode_nack_msg(data)
+        if nack is None: return False
+        self._overheard.extend(nack[1])
+        return True  # HANDLED
+
+    def get_nack_stats(self) -> tuple:  # of (sent, suppressed)
+        return self._nnacks, self._nsuppressed
+
+    def tick(self, wait:int=10) -> bool:
+        """Send a multicast NACK once its backoff is over"""
+        if self._nack_due is not None and platdeps.ticks_diff(platdeps.time_ms(), self._nack_due) >= 0:
+            ranges = missing_ranges(self._blockmap, 0, len(self._blockmap))
+            ranges = subtract_ranges(ranges, self._overheard)
+            if len(ranges) != 0: self.send_nack(ranges)
+            else:                self._nsuppressed += 1
+            self._nack_due  = None
+            self._overheard = []
+        if self._verifying is None: self._writer.poll()  # write out held blocks, when the link goes quiet
+        return Receiver.tick(self, wait)
+
+    def incomplete(self) -> None:
+        """END arrived with blocks missing, so NACK them, if we can"""
+        if self._nack is None:
+            Receiver.incomplete(self)
+            return
+        #NOTE: only at END, as with interleaved or random schedules, a gap
+        #below the highest block received is not yet sent, rather than lost.
+        if self._multicast:
+            if self._nack_due is None:
+                self._nack_due = platdeps.ticks_add(platdeps.time_ms(), random.randint(0, self.NACK_BACKOFF_MS))
+        else:
+            self.send_nack(missing_ranges(self._blockmap, 0, len(self._blockmap)))
+        self._state = self._STATE_TRANSFERRING
+
     def _decode_end_msg(self, data:Buffer) -> bool:
         """An END message has just been received"""
         ##assert isinstance(data, Buffer), "got:%s" % str(type(data))
@@ -1955,8 +4621,8 @@ class FileReceiver(Receiver):
         if  self._nblocks         is not None and \
             self._blocksize       is not None and \
             self._lastblock       is not None and \
-            self._sha256          is not None and \
             self._remote_filename is not None:
+            # sha256 may still be None, if the digest is deferred
             # meta-data is known, so...
             # process the end-event consistently, to make sure last-block handled
             # in the recvinto correctly
@@ -1968,34 +4634,88 @@ class FileReceiver(Receiver):
 
     # called by: _end_msg()
     # also can be called by end effects due to _STATE_VERIFYING
-    def end_transfer(self) -> None:
-        """Overrides parent, for special integrity check"""
-        # deregister for callbacks, so we don't get future repeats past the end
+    def stop_listening(self, complete:bool=True) -> None:
+        """Deregister for callbacks, so we don't get future repeats past the end"""
+        # complete tells a NACK sender it can stop, False when giving up
         self._linkreceiver.register(self._cch, self.received_ctrl, delete=True)
-
+        self._linkreceiver.register(self._dch, self.received_data, delete=True)
+        if complete and self._nack is not None and not self._multicast:
+            self.send_nack([], complete=True)  # sender can stop now, multicast stops on silence
+
+    def start_verify(self) -> Future:
+        """Stop listening, then check and commit the file on a worker"""
+        # nothing else touches the writer, until end_transfer() has the result
+        self.stop_listening()
+        return Receiver.start_verify(self)
+
+    def verify(self) -> str or None:
+        """Check and commit the file, None if it is done, or why it failed"""
         if self._nblocks is not None:
             if not self.check_integrity():
                 # we only integrity check if metadata was received
-                self.finished_err("files differ")  #  in parent
                 self._writer.abort()
-                ##self._writer = None  # don't do this, it will make re-runs fail
-                return  # FAILED
+                ##self._writer = None  # don't do this, it will make re-runs fail
+                return "files differ"  # FAILED
         else:
             platdeps.message("warning: no blocks metadata received, can't check sha/size integrity in end_transfer")
 
         # else PASSED or DONT KNOW
+        self._writer.commit()
+        if self._delta is not None:
+            error = self.rebuild_from_delta(self._sha256)
+            if error is not None: return error  # FAILED
+        if self._store is not None and self._sha256 is not None:
+            self._store.add(self._local_filename, self._sha256, self._blocksize)
+        return None
+
+    def end_transfer(self) -> None:
+        """Overrides parent, for special integrity check"""
+        if self._verifying is None: self._verifying = self.start_verify()  # not from tick()
+        error = self._verifying.get()
+        self._verifying = None
+        if self._sidecar is not None: self._sidecar.remove()
+        self.release_lock()
+        if error is not None:
+            self.finished_err(error)  #  in parent
+            return  # FAILED
+
         self._nblocks = None
         self._blocksize = None
         self._lastblock = None
         self._sha256 = None
 
-        self._writer.commit()
-
         # rename last, in case of file system error
         self.finished_ok("files identical:%s" % self._local_filename)
 
+    def rebuild_from_delta(self, expected_sha256:bytes) -> str or None:
+        """Apply the received delta to the basis, and check the rebuilt file, None if ok"""
+        basis, dblocksz = self._delta
+        delta_name      = self._local_filename
+        temp_name       = self.out_path_for("_REBUILD_%s.tmp" % self._session)  # basis may be the target, so not in place
+        try:
+            apply_delta(basis, delta_name, temp_name, dblocksz)
+        except (ValueError, OSError) as e:
+            for name in (temp_name, delta_name):
+                try:
+                    platdeps.os_unlink(name)
+                except OSError: pass  # not made, or already gone
+            return "can't rebuild from delta:%s" % str(e)
+        platdeps.os_unlink(delta_name)
+        if sha256_of_file(temp_name) != expected_sha256:
+            platdeps.os_unlink(temp_name)
+            return "rebuilt file differs, basis:%s" % basis
+        try:
+            platdeps.os_unlink(self._delta_target)
+        except OSError: pass  # MicroPython won't rename over a file
+        platdeps.os_rename(temp_name, self._delta_target)
+        self._local_filename = self._delta_target
+        return None
+
     def check_integrity(self) -> bool:
         """Check the integrity of the transfer file (size and sha256)"""
+        if self._delta is not None:
+            self._writer.get_sha256()  # closes the file, the META sha256 is checked once rebuilt
+            return True
         ##assert self._nblocks is not None, "no metadata, can't check integrity"
         expected_sha256 = self._sha256
         # validate sha256 against received data
@@ -2012,6 +4732,746 @@ class FileReceiver(Receiver):
             return False  # INTEGRITY CHECK FAILED
         return True  # INTEGRITY CHECK PASSED
 
+#----- FOUNTAIN CODED FILE TRANSFER --------------------------------------------
+
+class FountainFileSender(FileSender):
+    """Broadcast a file as an endless stream of LT symbols, for late joiners"""
+    # blockno in the link header carries the symbol seed, the payload is a
+    # U16BE degree, then blocksz bytes of XORed blocks. META/END are as normal.
+    SYMBOL_HDR = 2
+    MAX_SEEDS  = LinkMessage.MAX_BLOCKNO+1  # seeds wrap, so headers stay short
+
+    def __init__(self, filename:str, link_manager:LinkManager, progress_fn:callable or None=None,
+                 blocksz:int or None=None, nsymbols:int or None=None, seed:int=0):  # nsymbols None is endless
+        if blocksz is None:
+            blocksz = FileSender.auto_blocksz(link_manager, 0) - self.SYMBOL_HDR
+        FileSender.__init__(self, filename, link_manager, progress_fn, blocksz, repeats=0)
+        ndata = self._filesize // blocksz + (1 if self._filesize % blocksz != 0 else 0)
+        if ndata * 2 > self.MAX_SEEDS:
+            raise ValueError("file too big for fountain mode, blocks:%d" % ndata)
+        self._code = LTCode(max(ndata, 1))
+        self._seed = seed % self.MAX_SEEDS
+        self._nsymbols = nsymbols
+
+    def make_meta_msg(self):
+        """A normal META message, flagged as fountain coded"""
+        msg = FileSender.make_meta_msg(self)
+        msg.append(META_OPT_FOUNTAIN)
+        msg.append(0)
+        return msg
+
+    def choose_next_block(self) -> tuple: # of (blockno:int, repno:int)
+        """The next seed in the endless stream, None when nsymbols have gone"""
+        if self._nsymbols is not None:
+            if self._nsymbols == 0: return None, 0
+            self._nsymbols -= 1
+        seed = self._seed
+        self._seed = (seed + 1) % self.MAX_SEEDS
+        return seed, 0
+
+    def read_block(self, blockno:int or None):
+        """Make the symbol for this seed"""
+        if blockno is None: return None  # EOF
+        degree = self._code.degree_of(blockno)
+        acc = bytearray(self._blocksz)
+        for b in self._code.neighbours(blockno, degree):
+            gf_mul_acc(acc, self._read_padded(b), 1)
+        return bytes((high(degree), low(degree))) + acc
+
+    def _read_padded(self, blockno:int):
+        data = self._file_reader.read(self._blocksz, blockno * self._blocksz)
+        if len(data) < self._blocksz: data += bytes(self._blocksz - len(data))
+        return data
+
+class FountainFileReceiver(FileReceiver):
+    """Receive a FountainFileSender broadcast, joining at any time"""
+    FOUNTAIN   = True
+    SYMBOL_HDR = FountainFileSender.SYMBOL_HDR
+
+    def set_block_info(self, blocksz:int, nblocks:int, lastblock:int) -> None:
+        FileReceiver.set_block_info(self, blocksz, nblocks, lastblock)
+        self._code     = LTCode(max(len(self._blockmap), 1))
+        self._symbols  = {}  # seed -> [data:bytearray, unknown:list of blockno]
+        self._waiting  = {}  # blockno -> list of seeds that still need it
+        self._lt_buf   = Buffer(size=Buffer.DEFAULT_START + blocksz)
+        self._lastlen  = lastblock if lastblock != 0 else blocksz
+
+    def process_received(self, data:Buffer, info:dict) -> None:
+        """Every data packet is a symbol, peel it into blocks when we can"""
+        if data is None:  # EOF ON LINK
+            self._state = self._STATE_CHK_COMPLETE
+            return
+        if self._blockmap is None or "blockno" not in info: return  # no META yet
+        if LinkMessage.DEFLATED in info: return  # symbols are never compressed
+        if len(data) != self.SYMBOL_HDR + self._blocksz: return  # not one of ours
+
+        degree = (data[0]<<8) | data[1]
+        seed   = info["blockno"]
+        if degree == 0 or degree > len(self._blockmap) or seed in self._symbols: return
+
+        sym = bytearray(data[self.SYMBOL_HDR:])
+        unknown = []
+        for b in self._code.neighbours(seed, degree):
+            if self._blockmap[b]: gf_mul_acc(sym, self._read_padded(b), 1)
+            else:                 unknown.append(b)
+
+        if len(unknown) == 1:
+            self._resolve(unknown[0], sym)
+        elif len(unknown) > 1:
+            self._symbols[seed] = [sym, unknown]
+            for b in unknown:
+                if b not in self._waiting: self._waiting[b] = []
+                self._waiting[b].append(seed)
+
+    def _resolve(self, blockno:int, data:bytearray) -> None:
+        """A block is known, write it, and peel it out of waiting symbols"""
+        todo = [(blockno, data)]
+        while len(todo) != 0:
+            b, d = todo.pop()
+            if self._blockmap[b]: continue
+            if b == len(self._blockmap)-1: self._lt_buf.create_from(d[:self._lastlen])
+            else:                          self._lt_buf.create_from(d)
+            self.new_block(b, self._lt_buf, {"blockno": b})  # stats, progress, and completion, as any block
+
+            for seed in self._waiting.pop(b, []):
+                if seed not in self._symbols: continue
+                sym, unknown = self._symbols[seed]
+                gf_mul_acc(sym, d, 1)
+                unknown.remove(b)
+                if len(unknown) <= 1:
+                    del self._symbols[seed]
+                    if len(unknown) == 1: todo.append((unknown[0], sym))
+
+    def _read_padded(self, blockno:int):
+        data = self._writer.read(self._blocksz, blockno * self._blocksz)
+        if len(data) < self._blocksz: data = bytes(data) + bytes(self._blocksz - len(data))
+        return data
+
+#----- CAROUSEL BROADCAST ------------------------------------------------------
+
+# A carousel re-broadcasts a set of files forever, each file on its own channel
+# (1..0x3F), with a catalogue of all of them on the link control channel.
+# Receivers can come into range at any time, and pick the files they want.
+# Catalogue message, which may be split into pages to fit the link MTU:
+# U8 typeno, U8 pageno, U8 npages, U16BE blocksz, then for each file:
+# U8 channel, U32BE size, U8 sha256[32], filename, z-terminated
+
+TYPENO_CATALOGUE = 0x02  # CCH typeno, on LINKCH
+CATALOGUE_HDR    = 1 + 1 + 1 + 2
+
+def make_catalogue_msgs(entries:list, blocksz:int, max_len:int) -> list:  # of bytearray
+    """Pack (channel, size, sha256, name) entries into catalogue pages"""
+    recs = []
+    for channel, size, sha256, name in entries:
+        rec = bytearray()
+        rec.append(channel)
+        rec.extend(size.to_bytes(4, "big"))
+        rec.extend(sha256)
+        for ch in name: rec.append(ord(ch))
+        rec.append(0x00)
+        if CATALOGUE_HDR + len(rec) > max_len:
+            raise ValueError("catalogue entry too big for link: %s" % name)
+        recs.append(rec)
+
+    pages = []
+    page = None
+    for rec in recs:
+        if page is None or len(page) + len(rec) > max_len:
+            page = bytearray(CATALOGUE_HDR)
+            pages.append(page)
+        page.extend(rec)
+    for i in range(len(pages)):
+        pages[i][0] = TYPENO_CATALOGUE
+        pages[i][1] = i
+        pages[i][2] = len(pages)
+        pages[i][3] = high(blocksz)
+        pages[i][4] = low(blocksz)
+    return pages
+
+def decode_catalogue_msg(data) -> tuple or None:  # (pageno, npages, blocksz, [(channel, size, sha256, name)])
+    """Unpack a catalogue page, None if it is damaged"""
+    if len(data) < CATALOGUE_HDR or data[0] != TYPENO_CATALOGUE: return None
+    pageno, npages = data[1], data[2]
+    blocksz = (data[3]<<8) | data[4]
+    entries = []
+    pos = CATALOGUE_HDR
+    while pos < len(data):
+        if pos + 1+4+32 >= len(data): return None  # truncated
+        channel = data[pos]
+        size    = int.from_bytes(bytes(data[pos+1:pos+5]), "big")
+        sha256  = bytes(data[pos+5:pos+37])
+        end     = pos+37
+        while end < len(data) and data[end] != 0: end += 1
+        name    = platdeps.os_path_basename(platdeps.decode_to_str(bytes(data[pos+37:end])))
+        entries.append((channel, size, sha256, name))
+        pos = end+1
+    return pageno, npages, blocksz, entries
+
+class CarouselSender(Sender):
+    """Cycle through a set of files forever, interleaving blocks across files"""
+    CONTROL_EVERY = 50  # data packets between catalogue/META broadcasts
+    MAX_FILES     = 0x3F  # one user channel each
+    CATALOGUE_MTU = 240   # page size, on links with no MTU
+    CACHE_BUDGET  = 64*1024  # bytes of encoded blocks kept, when cache is True
+
+    def __init__(self, filenames:list, link_manager:LinkManager, progress_fn:callable or None=None,
+                 blocksz:int or None=None, cycles:int or None=None, compress:bool=False,
+                 fec:tuple or bool or None=None, cache:int or bool=False):  # cycles None is forever
+        #NOTE: cache keeps encoded blocks for the next cycle, up to a budget of
+        #bytes (CACHE_BUDGET if True), blocks past the budget are read each cycle
+        if not 0 < len(filenames) <= self.MAX_FILES:
+            raise ValueError("carousel needs 1..%d files, got:%d" % (self.MAX_FILES, len(filenames)))
+        if blocksz is None:
+            blocksz = min([FileSender.auto_blocksz(link_manager, platdeps.filesize(f), fec) for f in filenames])
+        self._linksender = link_manager.get_sender()
+        Sender.__init__(self, None, self._linksender, progress_fn, blocksz, compress=compress)
+
+        # a FileSender per file does the reading, META and FEC, but never ticks
+        self._files = []  # of FileSender
+        entries = []
+        for i, filename in enumerate(filenames):
+            self._files.append(FileSender(filename, link_manager, blocksz=blocksz, repeats=0, fec=fec, channel=i+1,
+                                          file_info=worker_pool.submit(get_file_info, filename)))
+        # the workers hash the files together, the catalogue needs every sha256
+        for i, sender in enumerate(self._files):
+            filesize, sha256 = sender.get_file_info()  # waits for its worker
+            entries.append((i+1, filesize, sha256, platdeps.os_path_basename(filenames[i])))
+        self._nblocks = [s.get_nblocks() for s in self._files]
+
+        mtu = link_manager.get_mtu()
+        if mtu is None: mtu = self.CATALOGUE_MTU
+        self._catalogue = make_catalogue_msgs(entries, blocksz, mtu)
+
+        self._cycles  = cycles
+        self._ncycles = 0
+        self._cache   = {} if cache else None  # (fileno, blockno) -> (payload, deflated)
+        self._cache_budget = self.CACHE_BUDGET if cache is True else cache  # bytes still free
+        self._control = []  # of (channel, msg), waiting to go before the next data block
+        self._ndata   = 0
+        self._blockidx = 0  # position in the interleave
+        self._fileno   = 0
+        self.queue_control()
+
+    def get_cycles(self) -> int:
+        """Number of complete cycles sent so far"""
+        return self._ncycles
+
+    def queue_control(self) -> None:
+        """Catalogue pages, then the META for each file"""
+        for page in self._catalogue:
+            self._control.append((LinkMessage.CCH | LinkMessage.LINKCH, page))
+        for sender in self._files:
+            self._control.append(sender.get_meta())
+
+    def choose_next_block(self) -> tuple: # of (fileno:int, blockno:int) or (None, None) at end
+        """Round robin across files, block by block"""
+        maxn = max(self._nblocks)
+        while True:
+            if self._blockidx >= maxn:
+                # end of a cycle
+                self._ncycles += 1
+                if self._cycles is not None and self._ncycles >= self._cycles: return None, None
+                self._blockidx = 0
+                self._fileno   = 0
+                self.queue_control()
+            fileno, blockno = self._fileno, self._blockidx
+            self._fileno += 1
+            if self._fileno >= len(self._files):
+                self._fileno = 0
+                self._blockidx += 1
+            if blockno < self._nblocks[fileno]: return fileno, blockno
+
+    def encoded_block(self, fileno:int, blockno:int) -> tuple:  # of (payload, deflated:bool)
+        """Read (and compress) a block, only once if the cache is on"""
+        key = (fileno, blockno)
+        if self._cache is not None and key in self._cache: return self._cache[key]
+        data = self._files[fileno].read_block(blockno)
+        info = {}
+        if self._compress: data = self.deflate_block(data, None, info)
+        encoded = (bytes(data), LinkMessage.DEFLATED in info)
+        if self._cache is not None and len(encoded[0]) <= self._cache_budget:
+            self._cache[key] = encoded
+            self._cache_budget -= len(encoded[0])
+        return encoded
+
+    def do_send_next_block(self) -> None:
+        """Send the next control message or data block"""
+        if len(self._control) != 0:
+            channel, msg = self._control.pop(0)
+            self.send_packet(msg, {LinkMessage.CHANNEL: channel})
+            return
+
+        fileno, blockno = self.choose_next_block()
+        if fileno is None:
+            self._is_running = False
+            return
+        payload, deflated = self.encoded_block(fileno, blockno)
+        info = {LinkMessage.CHANNEL: self._files[fileno].get_data_channel(), "blockno": blockno}
+        if deflated: info[LinkMessage.DEFLATED] = True
+        self.send_packet(payload, info)
+
+        self._ndata += 1
+        if self._ndata % self.CONTROL_EVERY == 0: self.queue_control()
+
+    def send_packet(self, payload, info:dict) -> None:
+        if len(payload) + Buffer.DEFAULT_START > self._buf.get_max():
+            self._buf = Buffer(size=Buffer.DEFAULT_START + len(payload) + LinkMessage.PROTOCOL_OVERHEAD_EXT)
+        self._buf.extend(payload)
+        self._linksender.send(self._buf, info)  # adds the header and CRC in place
+        nhdr = LinkMessage.overhead_for(len(payload), info.get("blockno", 0))
+        if self._pacer is not None: self._pacer.sent(len(self._buf))
+        self._buf.reset()
+
+        self._stats.update(len(payload), nhdr)
+        if self._progress_fn:
+            now = platdeps.time_time()
+            if now-self._last_stats >= self.PROGRESS_RATE:
+                self.print_stats()
+                self._last_stats = now
+
+class CarouselReceiver:
+    """Listen to a carousel catalogue, and receive the files we want from it"""
+    def __init__(self, link_manager:LinkManager, wanted:list or None=None, progress_fn:callable or None=None,
+                 cached:bool=False, store:BlockStore or None=None, out_dir:str or None=None):  # wanted None is all files
+        self._link_manager = link_manager
+        self._linkreceiver = link_manager.get_receiver()
+        self._cch          = LinkMessage.CCH | LinkMessage.LINKCH
+        self._wanted       = wanted
+        self._progress_fn  = progress_fn
+        self._cached       = cached
+        self._store        = store  # files already held finish at their META
+        self._out_dir      = out_dir
+        # big enough for a catalogue page, grows to the blocksz the catalogue says
+        self._buf          = Buffer(size=Buffer.DEFAULT_START + CarouselSender.CATALOGUE_MTU +
+                                         LinkMessage.PROTOCOL_OVERHEAD_EXT)
+        self._npages       = None
+        self._pages        = {}  # pageno -> entries, until the catalogue is complete
+        self._catalogue    = None  # list of (channel, size, sha256, name), when complete
+        self._queues       = {}  # channel -> list of entries still to receive on it
+        self._receivers    = {}  # channel -> (name, FileReceiver), still running
+        self._results      = {}  # name -> True if received ok
+        self._is_running   = True
+        self._linkreceiver.register(self._cch, self.received_ctrl)
+
+    def get_catalogue(self) -> list or None:  # of (channel, size, sha256, name)
+        return self._catalogue
+
+    def get_results(self) -> dict:  # name -> ok:bool
+        return self._results
+
+    def get_stats(self) -> str:
+        nok = len([name for name in self._results if self._results[name]])
+        return "files:%d ok:%d failed:%d" % (len(self._results), nok, len(self._results)-nok)
+
+    def received_ctrl(self, data:Buffer, info:dict or None=None) -> bool:
+        """Called by mux when a link control message arrives"""
+        _ = info  # argused
+        if len(data) == 0 or data[0] != TYPENO_CATALOGUE: return False  # NOT HANDLED
+        page = decode_catalogue_msg(data)
+        if page is None:
+            platdeps.message("warning: damaged catalogue page, ignoring")
+            return False
+
+        pageno, npages, blocksz, entries = page
+        if self._catalogue is not None: return True  # HANDLED, already known
+        self._npages = npages
+        self._pages[pageno] = entries
+        need = Buffer.DEFAULT_START + blocksz + LinkMessage.PROTOCOL_OVERHEAD_EXT
+        if need > self._buf.get_max(): self._buf = Buffer(size=need)
+        if len(self._pages) < npages: return True  # HANDLED, more pages to come
+
+        # complete, entries on the same channel are received in catalogue order
+        self._catalogue = []
+        for p in range(npages): self._catalogue.extend(self._pages[p])
+        self._pages = None
+        for entry in self._catalogue:
+            channel, name = entry[0], entry[3]
+            if self._wanted is None or name in self._wanted:
+                if channel not in self._queues: self._queues[channel] = []
+                self._queues[channel].append(entry)
+        for channel in self._queues: self.start_next(channel)
+        return True  # HANDLED
+
+    def start_next(self, channel:int) -> None:
+        """Start receiving the next file queued on this channel, if any"""
+        queue = self._queues[channel]
+        if len(queue) == 0: return
+        _, _, _, name = queue.pop(0)
+        receiver = FileReceiver(self._link_manager, name, self._progress_fn,
+                                cached=self._cached, channel=channel, keep_name=True, store=self._store,
+                                out_dir=self._out_dir)
+        # it polls the link too, before its META says how big the blocks are
+        receiver.set_min_buffer(self._buf.get_max())
+        self._receivers[channel] = (name, receiver)
+
+    def is_catalogue_complete(self) -> bool:
+        return self._catalogue is not None
+
+    def tick(self, wait:int=0) -> bool:
+        """Pump the link, and all the file receivers"""
+        if not self._is_running: return False
+        # everything not for the catalogue is dispatched to the file receivers
+        self._linkreceiver.recvinto_for(self._buf, {}, self._cch, wait=wait)
+        self._buf.reset()
+
+        for channel in list(self._receivers):
+            name, receiver = self._receivers[channel]
+            if not receiver.tick(wait=0):
+                self._results[name] = receiver.is_finished_ok()
+                del self._receivers[channel]
+                self.start_next(channel)
+
+        if self.is_catalogue_complete() and len(self._receivers) == 0:
+            self._linkreceiver.register(self._cch, self.received_ctrl, delete=True)
+            self._is_running = False
+        return self._is_running
+
+    def run(self) -> None:
+        """Run until every wanted file is received"""
+        while self.tick(wait=10): pass
+
+#----- BATCH TRANSFER ----------------------------------------------------------
+
+# A batch sends many files back to back, without restarting either end.
+# A manifest goes first, which is a catalogue with the sha256 not filled in
+# (each META carries it), then each file in turn, rotating through channels
+# 1..0x3F. The next file is hashed on a worker thread while this one is sent,
+# so only the first file waits for get_file_info() before its first packet.
+
+NO_SHA256 = bytes(32)  # manifest entry, digest comes later in the META
+
+class BatchSender(Sender):
+    """Send a list of files back to back, after a manifest of them all"""
+    # Sender's tick() and run() do the pacing, each tick sends a manifest page,
+    # or ticks the FileSender of the file being sent, which shares the pacer.
+    MAX_CHANNEL      = 0x3F  # files take turns on channels 1..MAX_CHANNEL
+    MANIFEST_REPEATS = 3     # manifest sends before the first file
+    START_META       = 2     # receivers are already listening after the first file
+
+    def __init__(self, filenames:list, link_manager:LinkManager, progress_fn:callable or None=None,
+                 blocksz:int or None=None, repeats:int=FileSender.NUM_REPEATS, compress:bool=False,
+                 fec:tuple or bool or None=None, schedule:str="sequential"):
+        if len(filenames) == 0: raise ValueError("batch needs at least one file")
+        # files are received by the name in the manifest, so two the same would overwrite
+        names = [platdeps.os_path_basename(f) for f in filenames]
+        for name in names:
+            if names.count(name) > 1: raise ValueError("batch has more than one file called:%s" % name)
+        self._filenames    = filenames
+        self._link_manager = link_manager
+        self._linksender   = link_manager.get_sender()
+        self._options      = {"blocksz": blocksz, "repeats": repeats, "compress": compress,
+                              "fec": fec, "schedule": schedule}
+
+        sizes = [platdeps.filesize(f) for f in filenames]
+        if blocksz is None:
+            # receivers size their buffer from the manifest, so give the biggest
+            blocksz = max([FileSender.auto_blocksz(link_manager, sz, fec) for sz in sizes])
+        Sender.__init__(self, None, self._linksender, None, blocksz)
+        self._progress_fn  = progress_fn  # for each file's sender, that prints its own stats
+        entries = []
+        for i in range(len(filenames)):
+            entries.append((self.channel_of(i), sizes[i], NO_SHA256, names[i]))
+        mtu = link_manager.get_mtu()
+        if mtu is None: mtu = CarouselSender.CATALOGUE_MTU
+        self._manifest = make_catalogue_msgs(entries, blocksz, mtu)
+        self._control  = self._manifest * self.MANIFEST_REPEATS
+
+        self._ahead      = worker_pool.submit(get_file_info, filenames[0])  # hashes while the manifest goes
+        self._fileno     = 0
+        self._sender     = None  # FileSender, for the file being sent
+        self._nblocks    = 0  # of completed files
+        self._nbytes     = 0
+        self._start_ms   = platdeps.time_ms()
+        self._first_ms   = None  # when the first packet of the first file went
+
+    @classmethod
+    def channel_of(cls, fileno:int) -> int:
+        return (fileno % cls.MAX_CHANNEL) + 1
+
+    def set_pacer(self, pacer:Pacer or None) -> None:
+        """Pace the manifest and every file in the batch"""
+        self._pacer = pacer
+        if self._sender is not None: self._sender.set_pacer(pacer)
+
+    def get_fileno(self) -> int:
+        """Index of the file being sent, len(filenames) when all done"""
+        return self._fileno
+
+    def next_file(self) -> None:
+        """Start sending the next file, and start hashing the one after"""
+        filename = self._filenames[self._fileno]
+        file_info = self._ahead  # the sender waits for it, if it is still hashing
+        nextno = self._fileno + 1
+        if nextno < len(self._filenames): self._ahead = worker_pool.submit(get_file_info, self._filenames[nextno])
+        else:                             self._ahead = None
+
+        self._sender = FileSender(filename, self._link_manager, self._progress_fn,
+                                  channel=self.channel_of(self._fileno), file_info=file_info, **self._options)
+        if self._fileno != 0: self._sender.START_META = self.START_META
+        self._sender.set_pacer(self._pacer)
+
+    def do_send_next_block(self) -> None:
+        """Send a manifest page, or the next packet of the file being sent"""
+        if len(self._control) != 0:
+            self.send_manifest_page(self._control.pop(0))
+            return
+
+        if self._sender is None:
+            if self._fileno >= len(self._filenames):
+                self._is_running = False
+                return
+            self.next_file()
+
+        running = self._sender.tick()
+        if self._first_ms is None and self._sender.file_info_ready(): self._first_ms = platdeps.time_ms()
+        if not running:
+            stats = self._sender.get_transfer_stats()
+            self._nblocks += stats.nblocks
+            self._nbytes  += stats.nbytes
+            self._sender   = None
+            self._fileno  += 1
+            # once between files, for receivers that missed the start
+            if self._fileno < len(self._filenames): self._control = list(self._manifest)
+
+    def done(self) -> None:
+        """Nothing more to print, each file's sender printed its stats"""
+        pass
+
+    def send_manifest_page(self, page) -> None:
+        buf = Buffer(size=Buffer.DEFAULT_START + len(page) + LinkMessage.PROTOCOL_OVERHEAD_EXT)
+        buf.extend(page)
+        self._linksender.send(buf, {LinkMessage.CHANNEL: LinkMessage.CCH | LinkMessage.LINKCH})
+        if self._pacer is not None: self._pacer.sent(len(buf))  # send() added the header and CRC
+
+    def get_ttfp_ms(self) -> int or None:
+        """Time from starting the batch, to the first packet of the first file"""
+        if self._first_ms is None: return None
+        return platdeps.ticks_diff(self._first_ms, self._start_ms)
+
+    def get_stats(self) -> str:
+        """Aggregate over the files completed so far"""
+        secs = platdeps.ticks_diff(platdeps.time_ms(), self._start_ms) / 1000
+        bps  = self._nbytes / secs if secs > 0 else 0
+        ttfp = self.get_ttfp_ms()
+        return "files:%d/%d T:%d blk:%d by:%d BPS:%d TTFP:%dms" % (
+            self._fileno, len(self._filenames), secs, self._nblocks, self._nbytes, bps,
+            ttfp if ttfp is not None else -1)
+
+class BatchReceiver(CarouselReceiver):
+    """Receive a batch back to back, the manifest is a catalogue"""
+    #NOTE: files that share a channel are received in manifest order,
+    #so the receiver never needs restarting between files.
+
+    def get_missing(self) -> list or None:  # of name
+        """Files in the manifest not received ok (yet), None until the manifest is complete"""
+        if self._catalogue is None: return None
+        return [entry[3] for entry in self._catalogue
+                if (self._wanted is None or entry[3] in self._wanted) and not self._results.get(entry[3], False)]
+
+    def get_stats(self) -> str:
+        missing = self.get_missing()
+        if missing is None: return CarouselReceiver.get_stats(self) + " no manifest"
+        return CarouselReceiver.get_stats(self) + " missing:%d" % len(missing)
+
+#----- DELTA TRANSFER ----------------------------------------------------------
+
+# When the receiver already has an older copy (the basis), only the changes
+# need to go over the air, rsync style. The sender has the basis too, it finds
+# runs of the new file that match basis blocks with a rolling weak checksum,
+# confirmed by a strong hash, and sends a delta of copy and literal ops instead
+# of the file. The META sha256 is of the rebuilt file, so that is what the
+# receiver checks, after rebuilding it from its basis.
+# Delta ops, back to back:
+#   DELTA_COPY,    varint basis blockno, varint nblocks
+#   DELTA_LITERAL, varint nbytes, then the bytes
+
+DELTA_BLOCKSZ = 512
+DELTA_COPY    = 0x01
+DELTA_LITERAL = 0x02
+DELTA_STRONG  = 8  # bytes of sha256 kept per basis block
+BASIS_ID_LEN  = 8  # bytes of basis sha256 in META, just to find it
+DELTA_MAX_LITERAL = 4096  # bytes, a longer run of changes is split into several literals
+
+def weak_checksum(data) -> tuple:  # of (a, b), for rolling
+    """rsync rolling checksum of a block"""
+    a = 0
+    b = 0
+    n = len(data)
+    for i in range(n):
+        a += data[i]
+        b += (n-i) * data[i]
+    return a & 0xFFFF, b & 0xFFFF
+
+def strong_hash(data) -> bytes:
+    return platdeps.hashlib_sha256(data).digest()[:DELTA_STRONG]
+
+def make_signature(filename:str, blocksz:int=DELTA_BLOCKSZ) -> dict:  # weak -> [(blockno, strong)]
+    """Checksums of each whole block of the basis file"""
+    sig = {}
+    with open(filename, "rb") as f:
+        blockno = 0
+        while True:
+            block = f.read(blocksz)
+            if len(block) < blocksz: break  # a short tail is sent as literal
+            a, b = weak_checksum(block)
+            weak = a | (b<<16)
+            if weak not in sig: sig[weak] = []
+            sig[weak].append((blockno, strong_hash(block)))
+            blockno += 1
+    return sig
+
+def make_delta(filename:str, signature:dict, blocksz:int, write_fn:callable) -> tuple:  # of (copied, literal) bytes
+    """Write delta ops that rebuild filename from the basis of this signature"""
+    # the file streams through buf, which holds the literal bytes not yet written,
+    # then the window being matched, so only a few blocks of it are ever in RAM
+    copied = 0
+    literal = 0
+    copy_run = None  # [first blockno, nblocks], merged until it breaks
+
+    def put_op(op:int, a:int, b:int or None=None) -> None:
+        msg = bytearray()
+        msg.append(op)
+        put_varint(msg, a)
+        if b is not None: put_varint(msg, b)
+        write_fn(msg)
+
+    def flush_copy() -> None:
+        if copy_run is not None: put_op(DELTA_COPY, copy_run[0], copy_run[1])
+
+    with open(filename, "rb") as f:
+        buf = bytearray()
+        i = 0  # window start in buf, buf[0:i] is literal
+        eof = False
+        a = b = None  # weak checksum of the window, None after a match
+        while True:
+            # the window, and the byte after it, to roll on to
+            while not eof and len(buf) < i + blocksz + 1:
+                data = f.read(blocksz)
+                if len(data) == 0: eof = True
+                else:              buf.extend(data)
+            if i + blocksz > len(buf): break  # less than a block left, so literal
+            if a is None: a, b = weak_checksum(buf[i:i+blocksz])
+
+            match = None
+            candidates = signature.get(a | (b<<16))
+            if candidates is not None:
+                strong = strong_hash(buf[i:i+blocksz])
+                for blockno, s in candidates:
+                    if s == strong:
+                        match = blockno
+                        break
+
+            if match is not None:
+                if i != 0:
+                    flush_copy()
+                    copy_run = None
+                    put_op(DELTA_LITERAL, i)
+                    write_fn(buf[0:i])
+                    literal += i
+                if copy_run is not None and copy_run[0] + copy_run[1] == match:
+                    copy_run[1] += 1
+                else:
+                    flush_copy()
+                    copy_run = [match, 1]
+                copied += blocksz
+                buf = buf[i+blocksz:]
+                i = 0
+                a = None
+            else:
+                # roll the window on by one byte
+                if i + blocksz < len(buf):
+                    out_byte = buf[i]
+                    a = (a - out_byte + buf[i+blocksz]) & 0xFFFF
+                    b = (b - blocksz*out_byte + a) & 0xFFFF
+                i += 1
+                if i >= DELTA_MAX_LITERAL:
+                    # a long run of changes goes as several literals, not held in RAM
+                    flush_copy()
+                    copy_run = None
+                    put_op(DELTA_LITERAL, i)
+                    write_fn(buf[0:i])
+                    literal += i
+                    buf = buf[i:]
+                    i = 0
+
+    flush_copy()
+    if len(buf) != 0:
+        put_op(DELTA_LITERAL, len(buf))
+        write_fn(buf)
+        literal += len(buf)
+    return copied, literal
+
+def apply_delta(basis:str, delta:str, out_name:str, blocksz:int) -> None:  # ValueError if damaged
+    """Rebuild a file from its basis and a delta"""
+    with open(delta, "rb") as f: ops = f.read()
+    with open(basis, "rb") as fb, open(out_name, "wb") as fo:
+        pos = 0
+        while pos < len(ops):
+            op = ops[pos]
+            first = get_varint(ops, pos+1)
+            if first is None: raise ValueError("truncated delta")
+            if op == DELTA_COPY:
+                count = get_varint(ops, first[1])
+                if count is None: raise ValueError("truncated delta")
+                fb.seek(first[0] * blocksz)
+                for _ in range(count[0]):
+                    block = fb.read(blocksz)
+                    if len(block) != blocksz: raise ValueError("delta copies past end of basis")
+                    fo.write(block)
+                pos = count[1]
+            elif op == DELTA_LITERAL:
+                start = first[1]
+                end = start + first[0]
+                if end > len(ops): raise ValueError("truncated delta")
+                fo.write(ops[start:end])
+                pos = end
+            else:
+                raise ValueError("unknown delta op:%d" % op)
+
+class DeltaFileSender(FileSender):
+    """Send a file as a delta against a basis file that the receiver already has"""
+    TEMP_NAME = "_DELTA_%08X.tmp"  # unique to each sender, so many can share a directory
+
+    def __init__(self, filename:str, basis:str, link_manager:LinkManager, progress_fn:callable or None=None,
+                 blocksz:int or None=None, repeats:int=FileSender.NUM_REPEATS, compress:bool=False,
+                 fec:tuple or bool or None=None, schedule:str="sequential", channel:int=LinkMessage.LINKCH,
+                 delta_blocksz:int=DELTA_BLOCKSZ, temp_name:str or None=None):
+        if temp_name is None: temp_name = self.TEMP_NAME % random.getrandbits(32)
+        _, target_sha256 = get_file_info(filename)
+        self._basis_id      = sha256_of_file(basis)[:BASIS_ID_LEN]
+        self._delta_blocksz = delta_blocksz
+        self._temp_name     = temp_name
+        with open(temp_name, "wb") as f:
+            self._delta_stats = make_delta(filename, make_signature(basis, delta_blocksz), delta_blocksz, f.write)
+        # META has the sha256 of the file that will be rebuilt, not of the delta
+        file_info = (platdeps.filesize(temp_name), target_sha256)
+        FileSender.__init__(self, temp_name, link_manager, progress_fn, blocksz, repeats, compress, fec,
+                            schedule, channel, file_info=file_info, name=filename)
+
+    def get_delta_stats(self) -> tuple:  # of (copied, literal) bytes
+        return self._delta_stats
+
+    def get_temp_name(self) -> str:
+        """The delta being sent, removed by done()"""
+        return self._temp_name
+
+    def make_meta_msg(self):
+        msg = FileSender.make_meta_msg(self)
+        msg.append(META_OPT_DELTA)
+        msg.append(BASIS_ID_LEN + 2)
+        msg.extend(self._basis_id)
+        msg.append(high(self._delta_blocksz))
+        msg.append(low(self._delta_blocksz))
+        return msg
+
+    def done(self) -> None:
+        """Sent, so the delta is no longer needed"""
+        FileSender.done(self)
+        self._file_reader.close()
+        try:
+            platdeps.os_unlink(self._temp_name)
+        except OSError: pass
+
 #----- USEFUL PHY LINKS --------------------------------------------------------
 
 class InMemoryRadio:
@@ -2045,6 +5505,70 @@ class InMemoryRadio:
         buf.extend(packet)
         return len(packet)
 
+class InMemoryQueue(InMemoryRadio):
+    """An InMemoryRadio that queues packets, so it is never BUSY"""
+    def __init__(self):
+        InMemoryRadio.__init__(self)
+        self._queue = []
+
+    def _write(self, values:bytes) -> None:
+        self._queue.append(bytes(values))
+
+    def recvinto(self, buf:Buffer, info:dict or None=None, wait:int=0) -> int or None:
+        _ = info  # argused
+        _ = wait  # argused
+        if len(self._queue) == 0: return 0  #NODATA
+        packet = self._queue.pop(0)
+        buf.reset()
+        buf.extend(packet)
+        return len(packet)
+
+class InMemoryDuplex:
+    """One end of an in-memory duplex link, use pair() to make both ends"""
+    MTU = InMemoryRadio.MTU
+
+    def __init__(self, tx:InMemoryQueue, rx:InMemoryQueue):
+        self._tx = tx
+        self._rx = rx
+
+    @staticmethod
+    def pair() -> tuple:  # of (InMemoryDuplex, InMemoryDuplex)
+        a_to_b = InMemoryQueue()
+        b_to_a = InMemoryQueue()
+        return InMemoryDuplex(a_to_b, b_to_a), InMemoryDuplex(b_to_a, a_to_b)
+
+    def send(self, data:Buffer or None) -> bool:
+        return self._tx.send(data)
+
+    def recvinto(self, buf:Buffer, info:dict or None=None, wait:int=0) -> int or None:
+        return self._rx.recvinto(buf, info, wait)
+
+class InMemoryBus:
+    """A broadcast medium, every port hears what any other port sends"""
+    def __init__(self):
+        self._ports = []
+
+    def join(self, port) -> None:
+        self._ports.append(port)
+
+    def broadcast(self, from_port, values:bytes) -> None:
+        for port in self._ports:
+            if port is not from_port: port.hear(values)
+
+class InMemoryBusPort(InMemoryQueue):
+    """One radio on an InMemoryBus, wrap it in a LinkManager"""
+    def __init__(self, bus:InMemoryBus):
+        InMemoryQueue.__init__(self)
+        self._bus = bus
+        bus.join(self)
+
+    def _write(self, values:bytes) -> None:
+        self._bus.broadcast(self, bytes(values))
+
+    def hear(self, values:bytes) -> None:
+        """Override, to lose packets on the way to this port"""
+        self._queue.append(values)
+
 import sys
 
 class StdStreamLink(Link):
@@ -2066,10 +5590,9 @@ class StdStreamLink(Link):
 #NOTE: this might just be a Packetiser.wrap(StdStreamLink())
 class StdStreamRadio(Link):
     """A packetised version of std streams"""
-    #NOTE: no need for a MTU on a stream really, so largest is
-    #1 + (255*2) due to how FE & FF expand to 2 bytes with packetiser
-    #and all our protocols use a single length byte
-    MTU = 1 + (255*2)  #if set to None, no MTU is enforced
+    #NOTE: no need for a MTU on a stream really, extended link headers
+    #allow packets much longer than a single length byte can describe
+    MTU = None  #if set to None, no MTU is enforced
 
     def __init__(self):
         Link.__init__(self)
@@ -2078,6 +5601,7 @@ class StdStreamRadio(Link):
         # direct dispatch (fast)
         self.send     = self._packetiser.send
         self.recvinto = self._packetiser.recvinto
+        self.get_mtu  = self._packetiser.get_mtu
 
 
 # END: dttk.py
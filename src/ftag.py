@@ -37,20 +37,12 @@ def help() -> None:
 #Throttled send, by default.
 DEFAULT_PPS = 40  # experimental evidence shows this keeps a 512+32 receive ok
 def send(filename:str=TX_FILENAME, pps:int=DEFAULT_PPS, progress=None) -> None:
-    #TODO: throttling should be an option in sender, so loopback can use it too
     print("sending:%s" % filename)
     sender = send_file_task(filename, progress=progress)
     if pps is not None:
         print("  throttled at %d PPS" % pps)
-        while True:
-            start_ms = platdeps.time_ms()
-            if not sender.tick(): break  # finished
-            if pps is not None:
-               time_per_packet_ms = platdeps.time_ms() - start_ms
-               delay_time_ms = int((1000 - (time_per_packet_ms * pps)) / pps)
-               platdeps.time_sleep_ms(delay_time_ms)
-    else:
-        sender.run()
+        sender.set_pacer(dttk.Pacer(pps))
+    sender.run()
 
     print_stats("tx", sender)
     print("send complete")
@@ -65,9 +57,10 @@ def receive(filename:str=RX_FILENAME, progress=None) -> None:
     print("receive complete")
 
 def loopback(tx_filename:str=TX_FILENAME, rx_filename:str=RX_FILENAME,
-             tx_progress=None, rx_progress=None) -> None:
+             tx_progress=None, rx_progress=None, pps:int or None=None) -> None:
     print("loopback %s->%s running" % (tx_filename, rx_filename))
     sender   = send_file_task(tx_filename, progress=tx_progress)
+    if pps is not None: sender.set_pacer(dttk.Pacer(pps))
     receiver = receive_file_task(rx_filename, progress=rx_progress)
 
     tasking.run_all([sender, receiver])
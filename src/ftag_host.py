@@ -1,10 +1,12 @@
 # ftag_host.py  22/01/2023  D.J.Whale - host based adaptor to file transfer agent
 #NOTE: for use on HOST python only
 
+import os
 import platdeps
 import dttk
 
 default_link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+DIGEST_CACHE_NAME = os.path.join(os.path.expanduser("~"), ".dttk_digests")
 
 
 #IDEA: when we start a new file transfer task, we should establish and get next channel
@@ -32,19 +34,55 @@ def rx_progress(msg:str or None=None, value:int or None=None) -> None:
 
 
 #----- TRANSFER TASKS ----------------------------------------------------------
-def send_file_task(filename:str, link=None, progress=None) -> dttk.Sender: # or exception
+def use_digest_cache() -> None:
+    """Files sent again, unchanged, don't need hashing again"""
+    if dttk.digest_cache is None: dttk.digest_cache = dttk.DigestCache(DIGEST_CACHE_NAME)
+
+def send_file_task(filename:str, link=None, progress=None, compress:bool=False, fec:bool=False,
+                   basis:str or None=None, block_hashes:bool=False,
+                   deferred_digest:bool=False, merkle:bool=False) -> dttk.Sender: # or exception
     """Non-blocking sender for a single file (as a task that has a tick())"""
     if link is None: link = default_link_manager
     if progress is None: progress=tx_progress
-    return dttk.FileSender(filename, link, progress_fn=progress, blocksz=50)
+    use_digest_cache()
+    # block size is chosen to fit the MTU of the link
+    if basis is not None:
+        # receiver has the basis already, so only the changes are sent
+        return dttk.DeltaFileSender(filename, basis, link, progress_fn=progress, compress=compress, fec=fec)
+    file_info = None
+    if not deferred_digest:
+        file_info = dttk.worker_pool.submit(dttk.get_file_info, filename)  # hashed while the task loop runs
+    return dttk.FileSender(filename, link, progress_fn=progress, compress=compress, fec=fec, file_info=file_info,
+                           block_hashes=block_hashes, deferred_digest=deferred_digest, merkle=merkle)
+
+def send_batch_task(filenames:list, link=None, progress=None, compress:bool=False, fec:bool=False) -> dttk.BatchSender: # or exception
+    """Non-blocking sender for many files, back to back"""
+    if link is None: link = default_link_manager
+    if progress is None: progress=tx_progress
+    use_digest_cache()
+    return dttk.BatchSender(filenames, link, progress_fn=progress, compress=compress, fec=fec)
+
+def receive_batch_task(link=None, progress=None, store:str or None=None,
+                       out_dir:str or None=None) -> dttk.BatchReceiver: # or exception
+    """Non-blocking receiver for a batch, files keep their sent names"""
+    if link is None: link = default_link_manager
+    if progress is None: progress = rx_progress
+    if store is not None: store = dttk.BlockStore(store)
+    return dttk.BatchReceiver(link, progress_fn=progress, cached=False, store=store, out_dir=out_dir)
 
-def receive_file_task(filename:str, link=None, progress=None) -> dttk.Receiver: # or exception
+def receive_file_task(filename:str, link=None, progress=None, basis:str or None=None,
+                      store:str or None=None, sync:int=dttk.ImmediateFileWriter.SYNC_NONE,
+                      mapped:bool=False, out_dir:str or None=None) -> dttk.Receiver: # or exception
     """Non-blocking receiver"""
     if link is None: link = default_link_manager
     #NOTE: cached mode is off on host, as there is no interference between the
-    #file system and interupts on host
+    #file system and interupts on host, so a killed receiver can resume too
+    #NOTE: blocks are still coalesced, a killed receiver just gets the held ones again
     if progress is None: progress = rx_progress
-    return dttk.FileReceiver(link, filename, progress_fn=progress, cached=False)
+    if store is not None: store = dttk.BlockStore(store)
+    return dttk.FileReceiver(link, filename, progress_fn=progress, cached=False, resume=True, basis=basis,
+                             store=store, write_budget=dttk.ImmediateFileWriter.BUDGET, sync=sync, mapped=mapped,
+                             out_dir=out_dir)
 
 #NOTE: TO FIX
 # def receive_file_noisy_task(filename:str) -> None: # or exception
@@ -63,6 +101,14 @@ def print_stats(name:str or None=None, task=None) -> None:
     if name is not None:                 platdeps.message("STATS:%s" % name)
     if dttk.link_stats.has_data():       platdeps.message("link: %s" % str(dttk.link_stats))
     if dttk.packetiser_stats.has_data(): platdeps.message("pkt:  %s" % str(dttk.packetiser_stats))
+    if isinstance(task, dttk.FileReceiver) and task.get_link_quality().has_data():
+        platdeps.message("lq:   %s" % str(task.get_link_quality()))
+    if isinstance(task, dttk.FileReceiver) and task.get_write_stats().has_data():
+        platdeps.message("disk: %s" % str(task.get_write_stats()))
+    if isinstance(task, dttk.Sender) and task.get_pacer() is not None and task.get_pacer().has_data():
+        platdeps.message("pace: %s" % str(task.get_pacer()))
+    if isinstance(task, dttk.FileSender) and task.gave_up():
+        platdeps.message("nack: receiver stopped answering, it might not have the file")
     if task is not None:                 platdeps.message("xfer: %s" % task.get_stats())
 
 #END: ftag_host.py
@@ -133,6 +133,10 @@ class PacketisedUart(dttk.Link):
         self.send = self._packetiser.send
         self.recvinto = self._packetiser.recvinto
 
+    def get_mtu(self) -> int or None:
+        # MTU is the framed size, so leave room for SYNCs and escapes
+        return dttk.Packetiser.unframed_mtu(self.MTU)
+
 
 #----- GENERIC SETUP -----------------------------------------------------------
 
@@ -162,7 +166,8 @@ def get_phy():
 
         assert False  # should not get here
 
-link_manager = dttk.LinkManager(get_phy())
+phy = get_phy()
+link_manager = dttk.LinkManager(phy)
 
 txp = dttk.Progresser("tx").update
 ##tx_bar = dttk.ProgressBar()
@@ -191,7 +196,10 @@ def rx_progress(msg:str or None=None, value:int or None=None) -> None:
 def send_file_task(filename:str, progress=None) -> dttk.Sender: # or exception
     """Non-blocking sender for a single file (as a task that has a tick())"""
     if progress is None: progress = tx_progress
-    return dttk.FileSender(filename, link_manager, progress_fn=progress, blocksz=myboard.UartCfg.BLOCK_SIZE)
+    # the UART block size is tuned to its receive buffer, radios fill their MTU
+    if isinstance(phy, PacketisedUart): blocksz = myboard.UartCfg.BLOCK_SIZE
+    else:                               blocksz = None
+    return dttk.FileSender(filename, link_manager, progress_fn=progress, blocksz=blocksz)
 
 def receive_file_task(filename:str, progress=None) -> dttk.Receiver: # or exception
     """Non-blocking receiver"""
@@ -217,6 +225,10 @@ def print_stats(name:str or None=None, task=None) -> None:
     if uart_stats.has_data():            platdeps.message("uart: %s" % str(uart_stats))
     if dttk.link_stats.has_data():       platdeps.message("link: %s" % str(dttk.link_stats))
     if dttk.packetiser_stats.has_data(): platdeps.message("pkt:  %s" % str(dttk.packetiser_stats))
+    if isinstance(task, dttk.FileReceiver) and task.get_link_quality().has_data():
+        platdeps.message("lq:   %s" % str(task.get_link_quality()))
+    if isinstance(task, dttk.Sender) and task.get_pacer() is not None and task.get_pacer().has_data():
+        platdeps.message("pace: %s" % str(task.get_pacer()))
     if task is not None:                 platdeps.message("xfer: %s" % task.get_stats())
 
 #END: ftag_pico.py
@@ -27,22 +27,87 @@ if PLATFORM == CPYTHON:
     import os
     import hashlib
     import sys
+    import zlib
+    import threading
+    import queue
+    import mmap
 
     time_time        = time.time  # seconds&ms, float
     time_perf_time   = time.time  # seconds&ms, float
     time_ms          = lambda: int(time.time() * 1000)  # milliseconds
     time_sleep_ms    = lambda ms: time.sleep(ms / 1000.0)
+    time_mono_us     = lambda: time.monotonic_ns() // 1000  # us, int, never goes backwards
+    time_sleep_us    = lambda us: time.sleep(us / 1000000.0)
+    ticks_add        = lambda t, delta: t + delta
+    ticks_diff       = lambda a, b: a - b  # a-b, wrap safe on pico
 
     os_path_basename = os.path.basename
     os_path_splitext = os.path.splitext
+    os_path_realpath = os.path.realpath
     os_rename        = os.rename
     os_unlink        = os.unlink
+    os_listdir       = os.listdir
+    os_mkdir         = os.mkdir
     filesize         = lambda filename: os.stat(filename).st_size
     hashlib_sha256   = hashlib.sha256
+    HASH_CHUNK       = 1024 * 1024  # bytes read at a time when hashing a file
+    WRITE_BUDGET     = 256 * 1024   # bytes of received blocks held, to write in bigger runs
+    ARENA_CHUNK      = None  # a cache arena is one bytearray
+    CACHE_SPILL      = True  # a cache bigger than its budget spills to a temp file
+    pwritev          = getattr(os, "pwritev", None)  # not on Windows
+    open_unbuffered  = lambda filename, mode: open(filename, mode, buffering=0)  # writers do their own buffering
+    fsync            = lambda f: os.fsync(f.fileno())
+
+    def preallocate(f, size:int) -> None:
+        """Reserve the whole file up front, so blocks landing past EOF don't keep growing it"""
+        if size == 0: return  # posix_fallocate rejects a zero length
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+        except (AttributeError, OSError):  # not on macOS/Windows, or not on this file system
+            f.truncate(size)  # sparse, but the size is still set once
+    def lock_file(filename:str):
+        """An open file, locked against other receivers, None if one has it already"""
+        # the lock goes when its holder closes the file, or dies
+        f = open(filename, "a+b")
+        try:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except ImportError: pass  # no fcntl on Windows, so no locking
+        except OSError:
+            f.close()
+            return None
+        return f
+
+    # changes if the file does, for caching its digest
+    file_key         = lambda filename: (lambda st: (st.st_size, st.st_mtime_ns, st.st_ino))(os.stat(filename))
 
     message          = lambda msg: sys.stderr.write(msg + '\n')
     decode_to_str    = lambda b: b.decode(errors='ignore')
 
+    def deflate_compress(data) -> bytes:
+        """Raw deflate (no zlib header), zlib is always there on host"""
+        c = zlib.compressobj(6, zlib.DEFLATED, -15)
+        return c.compress(data) + c.flush()
+
+    def deflate_decompress(data) -> bytes or None:
+        """Inflate raw deflate data, or None if it is damaged"""
+        try:
+            return zlib.decompress(data, -15)
+        except zlib.error:
+            return None
+
+    # numpy is optional, it vectorises FEC parity maths when it is installed
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    def start_thread(fn:callable) -> None:
+        """Run fn on a worker thread, the caller polls for its result"""
+        threading.Thread(target=fn, daemon=True).start()
+
+    new_queue        = queue.Queue  # thread safe, put() and blocking get()
+
 #----- MICRO PYTHON ------------------------------------------------------------
 elif PLATFORM == MPY:
     import utime
@@ -70,17 +135,41 @@ elif PLATFORM == MPY:
         if dot_pos < slash_pos: return path, ""  # no extension
         return path[:dot_pos], path[dot_pos:]  # there is an extension
 
+    def realpath(path: str) -> str:
+        """Absolute path, no symlinks on pico, so just joined to the cwd"""
+        if path.startswith("/"): return path
+        cwd = os.getcwd()
+        if cwd.endswith("/"): return cwd + path
+        return cwd + "/" + path
+
 
     time_time        = utime.time      # seconds, int
     time_perf_time   = utime.ticks_us  # us, int
     time_ms          = utime.ticks_ms  # ms, int
     time_sleep_ms    = utime.sleep_ms  # ms, int
+    time_mono_us     = utime.ticks_us  # us, int, wraps, so only use with ticks_diff
+    time_sleep_us    = utime.sleep_us  # us, int
+    ticks_add        = utime.ticks_add
+    ticks_diff       = utime.ticks_diff
     os_path_basename = basename
     os_path_splitext = splitext
+    os_path_realpath = realpath
     os_rename        = os.rename
     os_unlink        = os.remove
+    os_listdir       = os.listdir
+    os_mkdir         = os.mkdir
     filesize         = lambda filename: os.stat(filename)[6]
     hashlib_sha256   = uhashlib.sha256
+    HASH_CHUNK       = 512  # typical cluster size on a SDcard, and little RAM
+    WRITE_BUDGET     = 1024  # a couple of SDcard sectors
+    ARENA_CHUNK      = 1024  # the heap won't reliably give much bigger bytearrays
+    CACHE_SPILL      = False  # flash writes turn interrupts off, which caching is there to avoid
+    pwritev          = None
+    open_unbuffered  = open
+    fsync            = lambda f: f.flush()  # FAT writes through to the card on flush
+    preallocate      = None  # no truncate() on pico files
+    lock_file        = lambda filename: open(filename, "wb")  # only ever one receiver
+    file_key         = lambda filename: (lambda st: (st[6], st[8], st[1]))(os.stat(filename))
     message          = print
 
     def decode_to_str(b:bytes) -> str:
@@ -92,4 +181,40 @@ elif PLATFORM == MPY:
             print("unicode decode error")
             return "<UnicodeError>"  # this is the best we can do
 
+    # deflate is only in newer MicroPython builds, and only some ports
+    # are built with compression enabled, decompression is more common.
+    try:
+        import deflate
+        import io
+
+        def deflate_compress(data) -> bytes or None:
+            """Raw deflate (no zlib header), or None if compression not available"""
+            stream = io.BytesIO()
+            try:
+                with deflate.DeflateIO(stream, deflate.RAW) as d:
+                    d.write(data)
+            except Exception:  # NotImplementedError if built without compression
+                return None
+            return stream.getvalue()
+
+        def deflate_decompress(data) -> bytes or None:
+            """Inflate raw deflate data, or None if it is damaged"""
+            try:
+                return deflate.DeflateIO(io.BytesIO(data), deflate.RAW).read()
+            except Exception:
+                return None
+
+    except ImportError:
+        deflate_compress   = None
+        deflate_decompress = None
+
+    numpy = None  # FEC uses the pure python maths
+
+    mmap = None  # receiver checkpoints are written back as a normal file
+
+    #NOTE: _thread runs on core 1, but the pico filesystem is not safe to
+    #use from both cores at once, so background work runs inline instead.
+    start_thread = None
+    new_queue    = None
+
 #END: platdeps.py
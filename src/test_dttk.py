@@ -3,14 +3,33 @@
 #NOTE: works on HOST python only
 
 import unittest
+import os
+import random
+import tempfile
 
 import ftag  # does an auto-dependency check for host
 import dttk
+import tasking
 
 
 def newbuf(*args):
     return dttk.Buffer(*args)
 
+class TempDirTestCase(unittest.TestCase):
+    """Each test runs in a new temp directory, the cwd is put back afterwards"""
+    def setUp(self):
+        self._here = os.getcwd()
+        self._tmpdir = tempfile.TemporaryDirectory()
+        os.chdir(self._tmpdir.name)
+
+    def tearDown(self):
+        os.chdir(self._here)
+        self._tmpdir.cleanup()
+
+    def here(self, name:str) -> str:
+        """Path of a file in the directory the test started in"""
+        return os.path.join(self._here, name)
+
 #----- BYTESTREAM GENERATOR ----------------------------------------------------
 class ByteStreamGenerator(dttk.Link):
     """Each call gives the next byte, EOF marked with None"""
@@ -669,6 +688,1605 @@ class TestLinkReceiver(unittest.TestCase):
         ##self.assertEqual(EXPECTED_ERROR, receiver.get_error())
         self.assertEqual(EXPECTED_RESULT, result)
 
+#----- TEST EXTENDED HEADER ----------------------------------------------------
+class TestExtendedHeader(unittest.TestCase):
+    def roundtrip(self, payload:bytes, blockno:int) -> tuple:  # (data, blockno, hdrbyte)
+        rad = dttk.InMemoryRadio()
+        sender = dttk.LinkSender(rad)
+        receiver = dttk.LinkReceiver(rad)
+        sender.add_header_and_send(dttk.Buffer(payload, size=len(payload)+32), 0, blockno)
+        hdrbyte = rad._waiting[0]
+        buf = dttk.Buffer(size=len(payload)+32)
+        info = {}
+        receiver.recvinto(buf, info)
+        return bytes(buf[:]), info["blockno"], hdrbyte
+
+    def test_normal_header(self):
+        """small blocks and blocknos still use the normal header"""
+        data, blockno, hdrbyte = self.roundtrip(b'hello', 0x1234)
+        self.assertEqual((b'hello', 0x1234), (data, blockno))
+        self.assertNotEqual(dttk.LinkMessage.EXT, hdrbyte)
+
+    def test_big_blockno(self):
+        """blocknos beyond a U16 use the extended header"""
+        data, blockno, hdrbyte = self.roundtrip(b'hello', 0x12345678)
+        self.assertEqual((b'hello', 0x12345678), (data, blockno))
+        self.assertEqual(dttk.LinkMessage.EXT, hdrbyte)
+
+    def test_long_payload(self):
+        """payloads longer than a U8 length use the extended header"""
+        payload = bytes(range(256)) * 8
+        data, blockno, hdrbyte = self.roundtrip(payload, 3)
+        self.assertEqual((payload, 3), (data, blockno))
+        self.assertEqual(dttk.LinkMessage.EXT, hdrbyte)
+
+    def test_packetised_long_payload(self):
+        """a long packet survives the packetiser (all bytes escaped)"""
+        gen = DummyRadio()
+        gen._rx_pattern = []
+        sender = dttk.LinkSender(dttk.Packetiser(gen))
+        receiver = dttk.LinkReceiver(dttk.Packetiser(gen))
+        payload = b'\xFF\xFE' * 700
+        sender.add_header_and_send(dttk.Buffer(payload, size=len(payload)+32), 0, 7)
+        buf = dttk.Buffer(size=len(payload)+32)
+        receiver.recvinto(buf, {})
+        self.assertEqual(payload, bytes(buf[:]))
+
+    def test_send_file_big_blocks(self):
+        """a whole file, sent in multi-KB blocks"""
+        TX_FILENAME = "test35k.jpg"
+        RX_FILENAME = "received.jpg"
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(TX_FILENAME, link_manager, blocksz=4096, repeats=0)
+        receiver = dttk.FileReceiver(link_manager, RX_FILENAME)
+        tasking.run_all([sender, receiver])
+        try:
+            with open(TX_FILENAME, "rb") as f: expected = f.read()
+            with open(RX_FILENAME, "rb") as f: actual = f.read()
+            self.assertEqual(expected, actual)
+        finally:
+            os.unlink(RX_FILENAME)
+
+#----- TEST AUTO BLOCK SIZE ----------------------------------------------------
+class TestAutoBlockSize(unittest.TestCase):
+    class MTURadio(dttk.InMemoryRadio):
+        def __init__(self, mtu:int or None):
+            dttk.InMemoryRadio.__init__(self)
+            self.MTU = mtu
+
+    def blocksz_for(self, link, filesize:int=35000) -> int:
+        return dttk.FileSender.auto_blocksz(dttk.LinkManager(link), filesize)
+
+    def test_radio_mtu(self):
+        """an RFM69 sized radio fills its whole MTU"""
+        self.assertEqual(66-7, self.blocksz_for(self.MTURadio(66)))
+
+    def test_packetised_mtu(self):
+        """a packetiser leaves room for worst case escaping"""
+        self.assertEqual((64-2)//2 - 7, self.blocksz_for(dttk.Packetiser(self.MTURadio(64))))
+
+    def test_no_mtu(self):
+        """a stream with no MTU uses big blocks"""
+        self.assertEqual(dttk.FileSender.STREAM_BLOCKSZ, self.blocksz_for(dttk.Packetiser(self.MTURadio(None))))
+
+    def test_big_file(self):
+        """a file with more blocks than a U16 allows for extended headers"""
+        self.assertEqual(66-11, self.blocksz_for(self.MTURadio(66), filesize=59*70000))
+
+    def test_overhead_in_stats(self):
+        """the sender reports how much of the link is header overhead"""
+        link_manager = dttk.LinkManager(self.MTURadio(66))
+        sender = dttk.FileSender("testdata.txt", link_manager, repeats=0)
+        sender.run()
+        nhdr = 28 * 7  # 1632 bytes in 59 byte blocks
+        self.assertTrue(" OH:%d%%" % int(nhdr*100/(1632+nhdr)) in sender.get_stats())
+
+    def test_overhead_at_max_len(self):
+        """a payload that just fits a normal header is not counted as extended"""
+        blocksz = dttk.LinkMessage.MAX_LEN - (dttk.LinkMessage.PROTOCOL_OVERHEAD-1)
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender("testdata.txt", link_manager, blocksz=blocksz, repeats=0)
+        sender.run()
+        nhdr = ((1632 + blocksz-1) // blocksz) * dttk.LinkMessage.PROTOCOL_OVERHEAD
+        self.assertTrue(" OH:%d%%" % int(nhdr*100/(1632+nhdr)) in sender.get_stats())
+
+#----- TEST COMPRESSION --------------------------------------------------------
+class TestCompression(unittest.TestCase):
+    def test_flag_roundtrip(self):
+        """the deflated flag survives the link, and isn't part of the channel"""
+        rad = dttk.InMemoryRadio()
+        sender = dttk.LinkSender(rad)
+        receiver = dttk.LinkReceiver(rad)
+        sender.send(newbuf(b'abc'), {dttk.LinkMessage.CHANNEL: 1, dttk.LinkMessage.DEFLATED: True})
+        info = {}
+        receiver.recvinto(newbuf(), info)
+        self.assertEqual(1, info[dttk.LinkMessage.CHANNEL])
+        self.assertTrue(dttk.LinkMessage.DEFLATED in info)
+
+    def test_incompressible_sent_raw(self):
+        """a block that doesn't get smaller is sent raw"""
+        sender = dttk.Sender(None, None, blocksz=16, compress=True)
+        info = {}
+        data = bytes(range(16))
+        self.assertEqual(data, sender.deflate_block(data, 0, info))
+        self.assertFalse(dttk.LinkMessage.DEFLATED in info)
+
+    def test_interleaved_repeats(self):
+        """the cached deflate of the last block is never used for a different one"""
+        sender = dttk.Sender(None, None, blocksz=64, compress=True)
+        blocks = [b"a" * 64, b"b" * 64]
+        for blockno in (0, 1, 0, 1, 1):
+            info = {}
+            zdata = sender.deflate_block(blocks[blockno], blockno, info)
+            self.assertTrue(dttk.LinkMessage.DEFLATED in info)
+            self.assertEqual(blocks[blockno], dttk.platdeps.deflate_decompress(zdata))
+
+    def test_send_file_compressed(self):
+        """a compressible file arrives intact, in fewer bytes"""
+        TX_FILENAME = "testdata.txt"
+        RX_FILENAME = "received.txt"
+        sent = []
+        class CountingRadio(dttk.InMemoryRadio):
+            def send(self, data):
+                sent.append(len(data))
+                return dttk.InMemoryRadio.send(self, data)
+
+        def xfer(compress:bool) -> int:
+            sent.clear()
+            link_manager = dttk.LinkManager(CountingRadio())
+            sender = dttk.FileSender(TX_FILENAME, link_manager, blocksz=50, repeats=0, compress=compress)
+            receiver = dttk.FileReceiver(link_manager, RX_FILENAME)
+            tasking.run_all([sender, receiver])
+            with open(TX_FILENAME, "rb") as f: expected = f.read()
+            with open(RX_FILENAME, "rb") as f: actual = f.read()
+            os.unlink(RX_FILENAME)
+            self.assertEqual(expected, actual)
+            return sum(sent)
+
+        self.assertTrue(xfer(True) < xfer(False))
+
+#----- TEST FEC ----------------------------------------------------------------
+
+class TestFEC(unittest.TestCase):
+    def test_single_parity_is_xor(self):
+        """with one parity block, it is a plain XOR of the data"""
+        blocks = [bytes([1,2,3]), bytes([4,5,6]), bytes([7,8,9])]
+        parity = dttk.ReedSolomon(3, 1).encode(blocks)
+        self.assertEqual(bytearray([1^4^7, 2^5^8, 3^6^9]), parity[0])
+
+    def test_any_k_of_k_plus_m(self):
+        """every choice of K blocks rebuilds the missing data"""
+        import itertools
+        k, m = 4, 3
+        blocks = [bytes((i*37 + j*11) & 0xFF for j in range(10)) for i in range(k)]
+        rs = dttk.ReedSolomon(k, m)
+        code = blocks + rs.encode(blocks)
+        for have in itertools.combinations(range(k+m), k):
+            want = [i for i in range(k) if i not in have]
+            rows = [(i, code[i]) for i in have]
+            self.assertEqual([bytearray(blocks[i]) for i in want], rs.decode(rows, want))
+
+    def test_send_order(self):
+        """data then parity for each group, short last group"""
+        fec = dttk.BlockFEC(2, 1, blocksz=10, nblocks=2, lastblock=5)  # 3 data blocks
+        order = []
+        seqno = 0
+        while fec.send_order(seqno) is not None:
+            order.append(fec.send_order(seqno))
+            seqno += 1
+        self.assertEqual([0, 1, 3, 2, 4], order)
+        self.assertEqual(5, fec.get_nblocks())
+
+    def test_send_file_lossy(self):
+        """a lossy link, with no repeats, still delivers the file in one pass"""
+        TX_FILENAME = "testdata.txt"
+        RX_FILENAME = "received.txt"
+        class LossyRadio(dttk.InMemoryRadio):
+            def __init__(self):
+                dttk.InMemoryRadio.__init__(self)
+                self.sent = 0
+            def send(self, data):
+                self.sent += 1
+                if self.sent % 4 == 0: return True  # lose 1 in 4
+                return dttk.InMemoryRadio.send(self, data)
+
+        for cached in (False, True):
+            link_manager = dttk.LinkManager(LossyRadio())
+            sender = dttk.FileSender(TX_FILENAME, link_manager, blocksz=50, fec=(8, 4))
+            receiver = dttk.FileReceiver(link_manager, RX_FILENAME, cached=cached)
+            tasking.run_all([sender, receiver])
+            with open(TX_FILENAME, "rb") as f: expected = f.read()
+            with open(RX_FILENAME, "rb") as f: actual = f.read()
+            os.unlink(RX_FILENAME)
+            self.assertEqual(expected, actual)
+            self.assertTrue(receiver.get_fec_recovered() > 0)
+
+#----- TEST FOUNTAIN -----------------------------------------------------------
+
+class TestFountain(unittest.TestCase):
+    TX_FILENAME = "testdata.txt"
+    RX_FILENAME = "received.txt"
+
+    class LossyRadio(dttk.InMemoryRadio):
+        def __init__(self, loss:float, seed:int):
+            dttk.InMemoryRadio.__init__(self)
+            self._loss = loss
+            self._rng = random.Random(seed)
+        def send(self, data):
+            if self._rng.random() < self._loss: return True  # lost
+            return dttk.InMemoryRadio.send(self, data)
+
+    def test_same_neighbours_for_seed(self):
+        """a receiver works out the same blocks as the sender, from seed and degree"""
+        code = dttk.LTCode(100)
+        for seed in range(50):
+            degree = code.degree_of(seed)
+            self.assertTrue(1 <= degree <= 100)
+            nbrs = code.neighbours(seed, degree)
+            self.assertEqual(degree, len(set(nbrs)))
+            self.assertEqual(nbrs, dttk.LTCode(100).neighbours(seed, degree))
+
+    def test_late_join_lossy(self):
+        """a receiver that joins late, on a lossy link, still gets the file"""
+        link_manager = dttk.LinkManager(self.LossyRadio(0.2, seed=1))
+        sender = dttk.FountainFileSender(self.TX_FILENAME, link_manager, blocksz=50)
+        for _ in range(100):
+            sender.tick()  # nobody listening yet
+            link_manager.get_receiver().recvinto(newbuf(), {})  # lost to the void
+
+        receiver = dttk.FountainFileReceiver(link_manager, self.RX_FILENAME)
+        nsymbols = 0
+        while receiver.tick(wait=0):
+            sender.tick()
+            nsymbols += 1
+            self.assertTrue(nsymbols < 1000, "fountain did not decode")
+
+        with open(self.TX_FILENAME, "rb") as f: expected = f.read()
+        with open(self.RX_FILENAME, "rb") as f: actual = f.read()
+        os.unlink(self.RX_FILENAME)
+        self.assertEqual(expected, actual)
+
+    def test_decoded_blocks_counted(self):
+        """blocks peeled out of symbols are counted, and shown as progress, as any other block is"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FountainFileSender(self.TX_FILENAME, link_manager, blocksz=50)
+        values = []
+        receiver = dttk.FountainFileReceiver(link_manager, self.RX_FILENAME,
+                                             progress_fn=lambda msg=None, value=None: values.append(value))
+        receiver.PROGRESS_RATE = 0
+        while receiver.tick(wait=0): sender.tick()
+        os.unlink(self.RX_FILENAME)
+        self.assertTrue(receiver.is_finished_ok())
+        self.assertEqual((os.stat(self.TX_FILENAME).st_size + 49) // 50, receiver.get_transfer_stats().nblocks)
+        self.assertEqual(100, [value for value in values if value is not None][-1])
+
+    def test_plain_receiver_ignores_fountain(self):
+        """a normal FileReceiver won't treat symbols as blocks"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FountainFileSender(self.TX_FILENAME, link_manager, blocksz=50, nsymbols=20)
+        receiver = dttk.FileReceiver(link_manager, self.RX_FILENAME)
+        for _ in range(40):
+            sender.tick()
+            receiver.tick(wait=0)
+        self.assertIsNone(receiver.get_percent())
+        self.assertIsNone(receiver.get_temp_name())  # never got a META, so no temp file was made
+
+#----- TEST SCHEDULERS ---------------------------------------------------------
+
+class TestSchedulers(unittest.TestCase):
+    @staticmethod
+    def order(scheduler, n:int) -> list:
+        return [scheduler.next_block()[0] for _ in range(n)]
+
+    def test_sequential(self):
+        """back to back repeats, as before"""
+        s = dttk.SequentialScheduler(None, repeats=1)
+        self.assertEqual([(0,0), (0,1), (1,0), (1,1)], [s.next_block() for _ in range(4)])
+
+    def test_interleaved(self):
+        """whole passes over the file, then done"""
+        s = dttk.InterleavedScheduler(3, repeats=1)
+        self.assertEqual([0, 1, 2, 0, 1, 2, 3], self.order(s, 7))
+        self.assertEqual([2, 2, 2], [s.get_counters()[b] for b in range(3)])
+
+    def test_random_passes(self):
+        """each pass is a permutation of all blocks"""
+        s = dttk.RandomScheduler(10, repeats=2, seed=5)
+        order = self.order(s, 31)
+        for p in range(3):
+            self.assertEqual(list(range(10)), sorted(order[p*10:p*10+10]))
+        self.assertEqual(10, order[30])
+
+    def test_weighted_head(self):
+        """head blocks get extra sends, spread through the passes"""
+        s = dttk.WeightedScheduler(20, repeats=1, head=2, head_repeats=2)
+        order = self.order(s, 20*2 + 2*2 + 1)
+        self.assertEqual(20, order[-1])
+        self.assertEqual([4, 4, 2], [order.count(b) for b in (0, 1, 2)])
+        self.assertNotEqual(order[:4], [0, 0, 0, 0])
+
+    def test_counters_saturate(self):
+        c = dttk.BlockCounters(1)
+        for _ in range(300): c.bump(0)
+        self.assertEqual(c.MAX_COUNT, c[0])
+
+    def test_send_file_each_schedule(self):
+        """every schedule gets the file there, with and without FEC"""
+        TX_FILENAME = "testdata.txt"
+        RX_FILENAME = "received.txt"
+        with open(TX_FILENAME, "rb") as f: expected = f.read()
+        for schedule in dttk.SCHEDULERS:
+            for fec in (None, (4, 2)):
+                link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+                sender = dttk.FileSender(TX_FILENAME, link_manager, blocksz=50, schedule=schedule, fec=fec)
+                receiver = dttk.FileReceiver(link_manager, RX_FILENAME)
+                tasking.run_all([sender, receiver])
+                with open(RX_FILENAME, "rb") as f: actual = f.read()
+                os.unlink(RX_FILENAME)
+                self.assertEqual(expected, actual, "schedule:%s fec:%s" % (schedule, str(fec)))
+
+#----- TEST PACER --------------------------------------------------------------
+
+class TestPacer(unittest.TestCase):
+    def test_packet_rate(self):
+        """sleep-until pacing hits the target rate"""
+        pacer = dttk.Pacer(200)
+        for _ in range(21):
+            pacer.sleep_until_ready()
+            pacer.sent(50)
+        self.assertAlmostEqual(200, pacer.get_achieved(), delta=20)
+
+    def test_byte_rate(self):
+        """bigger packets wait longer, in bytes/sec mode"""
+        pacer = dttk.Pacer(20000, dttk.Pacer.BYTES)
+        for nbytes in (100, 500, 100, 500, 100, 500, 100, 500, 100):
+            pacer.sleep_until_ready()
+            pacer.sent(nbytes)
+        self.assertAlmostEqual(20000, pacer.get_achieved(), delta=2000)
+
+    def test_tick_does_not_block(self):
+        """a paced sender yields, instead of sleeping, in a task loop"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender("testdata.txt", link_manager, blocksz=50)
+        sender.set_pacer(dttk.Pacer(1))  # one packet a second
+        self.assertTrue(sender.tick())  # first one goes straight away
+        self.assertTrue(sender.is_paced())
+        self.assertTrue(sender.tick())  # nothing sent
+        self.assertEqual(1, link_manager.get_sender().get_seqno())
+
+    class WireRadio(dttk.InMemoryRadio):
+        """Remembers the length of every frame sent"""
+        def __init__(self):
+            dttk.InMemoryRadio.__init__(self)
+            self.frames = []
+        def send(self, data):
+            if data is not None: self.frames.append(len(data))
+            return dttk.InMemoryRadio.send(self, data)
+
+    class ChargedPacer(dttk.Pacer):
+        """Remembers every charge, never waits"""
+        def __init__(self):
+            dttk.Pacer.__init__(self, 1000000000, dttk.Pacer.BYTES)
+            self.charges = []
+        def sent(self, nbytes:int) -> None:
+            self.charges.append(nbytes)
+            dttk.Pacer.sent(self, nbytes)
+
+    def test_charged_as_on_wire(self):
+        """the pacer is charged the bytes that went on the wire, header and CRC included"""
+        radio = self.WireRadio()
+        sender = dttk.FileSender("testdata.txt", dttk.LinkManager(radio), blocksz=57, repeats=0)
+        pacer = self.ChargedPacer()
+        sender.set_pacer(pacer)
+        sender.run()
+        self.assertEqual(57 + dttk.LinkMessage.PROTOCOL_OVERHEAD, max(pacer.charges))
+        self.assertEqual(radio.frames[:len(pacer.charges)], pacer.charges)  # all but the EOF
+
+#----- TEST CAROUSEL -----------------------------------------------------------
+
+class TestCarousel(TempDirTestCase):
+    FILENAMES = ("testdata.txt", "test35k.jpg")
+
+    def test_catalogue_pages(self):
+        """a catalogue too big for one packet is split into pages"""
+        entries = [(i+1, 1000*i, bytes(32), "file%d.txt" % i) for i in range(5)]
+        pages = dttk.make_catalogue_msgs(entries, 50, 120)
+        self.assertTrue(len(pages) > 1)
+        got = []
+        for page in pages:
+            pageno, npages, blocksz, part = dttk.decode_catalogue_msg(page)
+            self.assertEqual((len(pages), 50), (npages, blocksz))
+            got.extend(part)
+        self.assertEqual(entries, got)
+
+    def cycle_reads(self, cache) -> list:
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.CarouselSender([self.here("testdata.txt")], link_manager, blocksz=50, cycles=3, cache=cache)
+        reads = []
+        read_block = sender._files[0].read_block
+        sender._files[0].read_block = lambda blockno: reads.append(blockno) or read_block(blockno)
+        while sender.tick():
+            link_manager.get_receiver().recvinto(newbuf(), {})  # drain
+        self.assertEqual(3, sender.get_cycles())
+        return reads
+
+    def test_cached_cycles(self):
+        """second and later cycles reuse the encoded blocks, when asked to"""
+        self.assertEqual(list(range(33)) * 3, self.cycle_reads(False))
+        self.assertEqual(list(range(33)), self.cycle_reads(True))
+
+    def test_cache_budget(self):
+        """blocks past the cache budget are read again each cycle"""
+        self.assertEqual(list(range(33)) + list(range(10, 33)) * 2, self.cycle_reads(500))
+
+    def test_hashed_on_workers(self):
+        """every file is hashed on the worker pool, not one after another"""
+        submitted = []
+        pool = dttk.worker_pool
+        class CountingPool:
+            def submit(self, fn, *args):
+                submitted.append(args)
+                return pool.submit(fn, *args)
+        paths = [self.here(name) for name in self.FILENAMES]
+        dttk.worker_pool = CountingPool()
+        try:
+            sender = dttk.CarouselSender(paths, dttk.LinkManager(dttk.InMemoryRadio()), blocksz=50)
+        finally:
+            dttk.worker_pool = pool
+        self.assertEqual([(path,) for path in paths], submitted)
+        self.assertEqual(dttk.get_file_info(paths[0]), sender._files[0].get_file_info())
+
+    def test_paced_as_on_wire(self):
+        """the pacer is charged each frame as it went on the wire"""
+        radio = TestPacer.WireRadio()
+        link_manager = dttk.LinkManager(radio)
+        sender = dttk.CarouselSender([self.here(name) for name in self.FILENAMES], link_manager, blocksz=57, cycles=1)
+        pacer = TestPacer.ChargedPacer()
+        sender.set_pacer(pacer)
+        while sender.tick():
+            link_manager.get_receiver().recvinto(newbuf(), {})  # drain
+        self.assertEqual(radio.frames, pacer.charges)
+        self.assertEqual(57 + dttk.LinkMessage.PROTOCOL_OVERHEAD, max(pacer.charges[-10:]))
+
+    def test_late_join(self):
+        """a receiver that comes in range late gets every file in the set"""
+        paths = [self.here(name) for name in self.FILENAMES]
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.CarouselSender(paths, link_manager, blocksz=50)
+        for _ in range(300):
+            sender.tick()
+            link_manager.get_receiver().recvinto(newbuf(), {})  # nobody listening yet
+
+        receiver = dttk.CarouselReceiver(link_manager)
+        nticks = 0
+        while receiver.tick():
+            sender.tick()
+            nticks += 1
+            self.assertTrue(nticks < 10000, "carousel did not complete")
+        self.assertEqual({name: True for name in self.FILENAMES}, receiver.get_results())
+        for name, path in zip(self.FILENAMES, paths):
+            with open(path, "rb") as f: expected = f.read()
+            with open(name, "rb") as f: actual = f.read()
+            self.assertEqual(expected, actual)
+
+#----- TEST BATCH --------------------------------------------------------------
+class TestBatch(TempDirTestCase):
+    FILENAMES = ("testdata.txt", "test35k.jpg", "platdeps.py")
+
+    class TwoChannelBatch(dttk.BatchSender):
+        MAX_CHANNEL = 2  # so the third file re-uses the first file's channel
+
+    def test_file_info_ahead(self):
+        """the worker gets the same answer as get_file_info()"""
+        ahead = dttk.worker_pool.submit(dttk.get_file_info, self.here("test35k.jpg"))
+        self.assertEqual(dttk.get_file_info(self.here("test35k.jpg")), ahead.get())
+        self.assertRaises(OSError, dttk.worker_pool.submit(dttk.get_file_info, "no_such_file.bin").get)
+
+    def test_manifest(self):
+        """the manifest lists every file, in order, digests still to come"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = self.TwoChannelBatch([self.here(name) for name in self.FILENAMES], link_manager, blocksz=50)
+        entries = []
+        for page in sender._manifest: entries.extend(dttk.decode_catalogue_msg(page)[3])
+        self.assertEqual([1, 2, 1], [e[0] for e in entries])
+        self.assertEqual(list(self.FILENAMES), [e[3] for e in entries])
+        self.assertEqual([dttk.NO_SHA256] * 3, [e[2] for e in entries])
+
+    def test_duplicate_names(self):
+        """two files with the same basename would overwrite each other at the receiver"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        self.assertRaises(ValueError, dttk.BatchSender, ["testdata.txt", self.here("testdata.txt")], link_manager)
+
+    def test_paced_as_on_wire(self):
+        """manifest pages and blocks are charged to the pacer as they went on the wire"""
+        radio = TestPacer.WireRadio()
+        link_manager = dttk.LinkManager(radio)
+        sender = dttk.BatchSender([self.here("testdata.txt")], link_manager, blocksz=57, repeats=0)
+        pacer = TestPacer.ChargedPacer()
+        sender.set_pacer(pacer)
+        while sender.tick():
+            link_manager.get_receiver().recvinto(newbuf(), {})  # drain
+        self.assertEqual(radio.frames[:len(pacer.charges)], pacer.charges)  # all but the EOF
+        self.assertEqual(len(radio.frames) - 1, len(pacer.charges))
+        self.assertEqual(radio.frames[0], pacer.charges[0])  # the manifest
+        self.assertTrue(sender.get_stats().startswith("files:1/1 "))
+
+    def test_back_to_back(self):
+        """every file arrives, with channels re-used, and one receiver throughout"""
+        paths = [self.here(name) for name in self.FILENAMES]
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = self.TwoChannelBatch(paths, link_manager, blocksz=50, repeats=0)
+
+        receiver = dttk.BatchReceiver(link_manager)
+        self.assertIsNone(receiver.get_missing())
+        nticks = 0
+        while receiver.tick():
+            sender.tick()
+            nticks += 1
+            self.assertTrue(nticks < 20000, "batch did not complete")
+            if len(receiver.get_results()) == 1:
+                self.assertEqual(list(self.FILENAMES[1:]), receiver.get_missing())
+        self.assertEqual({name: True for name in self.FILENAMES}, receiver.get_results())
+        self.assertEqual([], receiver.get_missing())
+        self.assertTrue(receiver.get_stats().endswith(" missing:0"))
+        for name, path in zip(self.FILENAMES, paths):
+            with open(path, "rb") as f: expected = f.read()
+            with open(name, "rb") as f: actual = f.read()
+            self.assertEqual(expected, actual)
+        self.assertTrue(sender.get_ttfp_ms() is not None)
+
+#----- TEST RESUME -------------------------------------------------------------
+class TestResume(TempDirTestCase):
+    SHA_A = bytes(range(32))
+    SHA_B = bytes(32)
+
+    def test_sidecar(self):
+        """marks survive a reopen, but only for the same file"""
+        sidecar = dttk.BlockmapSidecar("_test.map")
+        self.assertFalse(sidecar.open(self.SHA_A, 20))
+        for blockno in (0, 9, 19): sidecar.mark(blockno)
+        sidecar.close()
+
+        self.assertTrue(sidecar.open(self.SHA_A, 20))
+        bits = dttk.BitSet(20)
+        bits.load(sidecar.get_flags())
+        self.assertEqual([0, 9, 19], [i for i in range(20) if bits[i]])
+        sidecar.close()
+
+        self.assertFalse(sidecar.open(self.SHA_B, 20))
+        self.assertEqual(bytes(3), bytes(sidecar.get_flags()))
+        sidecar.remove()
+        self.assertFalse(os.path.exists("_test.map"))
+
+    def test_resume_after_kill(self):
+        """a new receiver only needs the blocks the killed one didn't write"""
+        tx_filename = os.path.join(self._here, "test35k.jpg")
+        nblocks = (os.stat(tx_filename).st_size + 49) // 50
+
+        # first receiver is abandoned part way through, as if killed
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(tx_filename, link_manager, blocksz=50, repeats=0)
+        receiver = dttk.FileReceiver(link_manager, "received.jpg", resume=True)
+        while (receiver.get_percent() or 0) < 50:
+            sender.tick()
+            receiver.tick(wait=0)
+        written = receiver.get_transfer_stats().nblocks
+        map_name = os.path.splitext(receiver.get_temp_name())[0] + ".map"
+        self.assertTrue(os.path.exists(map_name))
+        receiver._lock.close()  # a killed process lets go of its lock, but leaves the file
+
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(tx_filename, link_manager, blocksz=50, repeats=0)
+        receiver = dttk.FileReceiver(link_manager, "received.jpg", resume=True)
+        tasking.run_all([sender, receiver])
+
+        self.assertTrue(receiver.is_finished_ok())
+        self.assertEqual(nblocks - written, receiver.get_transfer_stats().nblocks)
+        with open(tx_filename, "rb") as f: expected = f.read()
+        with open("received.jpg", "rb") as f: actual = f.read()
+        self.assertEqual(expected, actual)
+        self.assertFalse(os.path.exists(map_name))
+
+#----- TEST NACK ---------------------------------------------------------------
+class TestNack(unittest.TestCase):
+    class LossyQueue(dttk.InMemoryQueue):
+        """Loses a repeatable fraction of packets"""
+        def __init__(self, loss:float):
+            dttk.InMemoryQueue.__init__(self)
+            self._loss = loss
+            self._rng = random.Random(1)
+
+        def _write(self, values:bytes) -> None:
+            if self._rng.random() >= self._loss: dttk.InMemoryQueue._write(self, values)
+
+    def test_ranges(self):
+        """missing runs survive the range encoding"""
+        bits = dttk.BitSet(1000)
+        for i in range(1000):
+            if i not in (0, 1, 2, 500) and not 700 <= i < 900: bits[i] = True
+        ranges = dttk.missing_ranges(bits, 0, 1000)
+        self.assertEqual([(0, 3), (500, 1), (700, 200)], ranges)
+        self.assertEqual((0, ranges), dttk.decode_nack_msg(dttk.make_nack_msg(ranges, 64)))
+
+    def test_truncated(self):
+        """too many ranges for the MTU are flagged as MORE"""
+        ranges = [(i*10, 1) for i in range(100)]
+        flags, got = dttk.decode_nack_msg(dttk.make_nack_msg(ranges, 32))
+        self.assertTrue(flags & dttk.NACK_MORE)
+        self.assertEqual(ranges[:len(got)], got)
+
+    def test_selective_repeat(self):
+        """only lost blocks are sent again, until the receiver has them all"""
+        TX_FILENAME = "test35k.jpg"
+        RX_FILENAME = "received.jpg"
+        data_link = self.LossyQueue(0.2)
+        nack_link = dttk.InMemoryQueue()
+        tx_end = dttk.LinkManager(dttk.InMemoryDuplex(data_link, nack_link))
+        rx_end = dttk.LinkManager(dttk.InMemoryDuplex(nack_link, data_link))
+        sender = dttk.FileSender(TX_FILENAME, tx_end, blocksz=50, nack=True)
+        receiver = dttk.FileReceiver(rx_end, RX_FILENAME, nack=True)
+        tasking.run_all([sender, receiver])
+        try:
+            self.assertTrue(receiver.is_finished_ok())
+            nblocks = (os.stat(TX_FILENAME).st_size + 49) // 50
+            self.assertTrue(sender.get_resent() > 0)
+            self.assertTrue(sender.get_transfer_stats().nblocks < nblocks * 1.5)  # not 4N, as repeats=3 would be
+            self.assertFalse(sender.gave_up())
+            self.assertEqual(0, sender.nresend())
+        finally:
+            os.unlink(RX_FILENAME)
+
+    def test_no_receiver(self):
+        """a sender that never hears a NACK gives up"""
+        tx_end = dttk.LinkManager(dttk.InMemoryDuplex.pair()[0])
+        sender = dttk.FileSender("testdata.txt", tx_end, blocksz=50, nack=True)
+        sender.NACK_TIMEOUT_MS = 0
+        nticks = 0
+        while sender.tick():
+            nticks += 1
+            self.assertTrue(nticks < 1000, "sender did not give up")
+        self.assertEqual(0, sender.get_resent())
+        self.assertTrue(sender.gave_up())
+
+#----- TEST MULTICAST ----------------------------------------------------------
+class TestMulticast(TempDirTestCase):
+    NRECEIVERS = 12
+
+    class FadingBus(dttk.InMemoryBus):
+        """Loses some packets for everyone, as if the sender faded"""
+        def __init__(self, loss:float):
+            dttk.InMemoryBus.__init__(self)
+            self._loss = loss
+            self._rng = random.Random(1)
+
+        def broadcast(self, from_port, values:bytes) -> None:
+            if self._rng.random() >= self._loss: dttk.InMemoryBus.broadcast(self, from_port, values)
+
+    class LossyPort(dttk.InMemoryBusPort):
+        """Loses some packets just for this receiver"""
+        def __init__(self, bus, loss:float, seed:int):
+            dttk.InMemoryBusPort.__init__(self, bus)
+            self._loss = loss
+            self._rng = random.Random(seed)
+
+        def hear(self, values:bytes) -> None:
+            if self._rng.random() >= self._loss: dttk.InMemoryBusPort.hear(self, values)
+
+    def test_subtract_ranges(self):
+        self.assertEqual([(0, 2), (8, 2)], dttk.subtract_ranges([(0, 10)], [(2, 6)]))
+        self.assertEqual([], dttk.subtract_ranges([(3, 4)], [(0, 5), (5, 10)]))
+        self.assertEqual([(20, 5)], dttk.subtract_ranges([(20, 5)], [(0, 20)]))
+
+    def xfer(self, bus, ports) -> tuple:  # of (sender, receivers)
+        """One sender, a receiver on each port, every receiver must get the file"""
+        sender = dttk.FileSender(self.here("test35k.jpg"), dttk.LinkManager(dttk.InMemoryBusPort(bus)),
+                                 blocksz=50, multicast=True)
+        sender.REPAIR_WINDOW_MS = 40
+        # cached, so receivers don't share a temp file, each one checks its own sha256
+        receivers = []
+        for port in ports:
+            receiver = dttk.FileReceiver(dttk.LinkManager(port), "received.jpg", cached=True, multicast=True)
+            receiver.NACK_BACKOFF_MS = 20
+            receivers.append(receiver)
+        tasking.run_all([sender] + receivers)
+        for receiver in receivers:
+            self.assertTrue(receiver.is_finished_ok())
+        return sender, receivers
+
+    def test_shared_loss(self):
+        """when everyone misses the same blocks, most NACKs are suppressed"""
+        bus = self.FadingBus(0.03)
+        sender, receivers = self.xfer(bus, [dttk.InMemoryBusPort(bus) for _ in range(self.NRECEIVERS)])
+        nacks, rounds = sender.get_nack_stats()
+        self.assertTrue(rounds >= 1)
+        self.assertTrue(nacks < self.NRECEIVERS * rounds / 2, "nacks:%d rounds:%d" % (nacks, rounds))
+        self.assertTrue(sum([r.get_nack_stats()[1] for r in receivers]) > 0)
+
+    def test_own_loss(self):
+        """receivers that each miss different blocks all get repaired"""
+        bus = dttk.InMemoryBus()
+        ports = [self.LossyPort(bus, 0.05, seed) for seed in range(self.NRECEIVERS)]
+        sender, _ = self.xfer(bus, ports)
+        self.assertTrue(sender.get_resent() > 0)
+
+#----- TEST DELTA --------------------------------------------------------------
+class TestDelta(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        with open(os.path.join(self._here, "test35k.jpg"), "rb") as f: self._basis = f.read()
+        # an edit, an insert that shifts the rest, and an appended tail
+        b = self._basis
+        self._target = b[:10000] + b"CHANGED" + b[10200:20000] + b"INSERTED" + b[20000:] + b"one more\n"
+        with open("basis.jpg", "wb") as f: f.write(self._basis)
+        with open("target.jpg", "wb") as f: f.write(self._target)
+
+    def test_rolling_checksum(self):
+        """rolling the window on a byte matches checksumming it afresh"""
+        data = self._basis[:200]
+        a, b = dttk.weak_checksum(data[0:64])
+        for i in range(len(data)-64):
+            a = (a - data[i] + data[i+64]) & 0xFFFF
+            b = (b - 64*data[i] + a) & 0xFFFF
+            self.assertEqual(dttk.weak_checksum(data[i+1:i+65]), (a, b))
+
+    def test_roundtrip(self):
+        """a delta rebuilds the target, mostly from basis copies"""
+        sig = dttk.make_signature("basis.jpg", 128)
+        with open("delta.bin", "wb") as f:
+            copied, literal = dttk.make_delta("target.jpg", sig, 128, f.write)
+        self.assertEqual(len(self._target), copied + literal)
+        self.assertLess(literal, 4*128)
+        dttk.apply_delta("basis.jpg", "delta.bin", "rebuilt.jpg", 128)
+        with open("rebuilt.jpg", "rb") as f: self.assertEqual(self._target, f.read())
+
+    def test_long_literal(self):
+        """a long run of new bytes is streamed out as several literals"""
+        noise = bytes(random.Random(39).getrandbits(8) for _ in range(3*dttk.DELTA_MAX_LITERAL))
+        target = self._basis[:5000] + noise + self._basis[5000:]
+        with open("target.jpg", "wb") as f: f.write(target)
+        ops = []
+        sig = dttk.make_signature("basis.jpg", 128)
+        with open("delta.bin", "wb") as f:
+            copied, literal = dttk.make_delta("target.jpg", sig, 128, lambda data: ops.append(bytes(data)) or f.write(data))
+        self.assertEqual(len(target), copied + literal)
+        self.assertLess(literal, len(noise) + 2*128)
+        nliterals = len([op for op in ops if op[0] == dttk.DELTA_LITERAL and len(op) <= 4])
+        self.assertTrue(nliterals >= 3)
+        dttk.apply_delta("basis.jpg", "delta.bin", "rebuilt.jpg", 128)
+        with open("rebuilt.jpg", "rb") as f: self.assertEqual(target, f.read())
+
+    def test_bad_delta_removed(self):
+        """a delta that can't be applied leaves no temp files behind"""
+        receiver = dttk.FileReceiver(dttk.LinkManager(dttk.InMemoryRadio()), "target.jpg", basis="basis.jpg")
+        with open("bad.delta", "wb") as f: f.write(bytes([0x7F, 0x00]))  # not a delta op
+        receiver._delta = ("basis.jpg", 128)
+        receiver._local_filename = "bad.delta"
+        receiver._delta_target = "target.jpg"
+        self.assertIn("can't rebuild", receiver.rebuild_from_delta(bytes(32)))
+        self.assertEqual(["basis.jpg", "target.jpg"], sorted(os.listdir(".")))
+
+    def test_basis_hashed_once(self):
+        """each basis is hashed at the first delta META, not at every repeat of it"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.DeltaFileSender("target.jpg", "basis.jpg", link_manager, blocksz=50, repeats=0)
+        with open("other.jpg", "wb") as f: f.write(b"not the basis")
+        hashed = []
+        saved = dttk.sha256_of_file
+        dttk.sha256_of_file = lambda name: hashed.append(name) or saved(name)
+        try:
+            receiver = dttk.FileReceiver(link_manager, "received.jpg", basis=["other.jpg", "basis.jpg"])
+            for _ in range(3):
+                receiver._nblocks = None  # so the next META is decoded as the first
+                self.assertTrue(receiver._find_basis(bytes(sender._basis_id) + bytes([0x02, 0x00])))
+        finally:
+            dttk.sha256_of_file = saved
+        self.assertEqual(["other.jpg", "basis.jpg"], hashed)
+        self.assertEqual(("basis.jpg", 512), receiver._delta)
+        sender.done()
+
+    def test_transfer(self):
+        """receiver with the basis rebuilds the new file in place, from a small delta"""
+        os.mkdir("rx")
+        with open("rx/target.jpg", "wb") as f: f.write(self._basis)  # old copy, same name
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        temp_name = os.path.abspath("_DELTA.tmp")  # as the receiver runs in rx
+        sender = dttk.DeltaFileSender("target.jpg", "basis.jpg", link_manager, blocksz=50, repeats=0,
+                                      temp_name=temp_name)
+        os.chdir("rx")
+        try:
+            receiver = dttk.FileReceiver(link_manager, "target.jpg", keep_name=True, basis="target.jpg")
+            tasking.run_all([sender, receiver])
+        finally:
+            os.chdir("..")
+
+        self.assertTrue(receiver.is_finished_ok())
+        self.assertLess(sender.get_transfer_stats().nblocks * 50, len(self._target) // 10)
+        with open("rx/target.jpg", "rb") as f: self.assertEqual(self._target, f.read())
+        self.assertEqual(["target.jpg"], os.listdir("rx"))
+        self.assertFalse(os.path.exists(temp_name))
+
+    def test_shared_directory(self):
+        """two delta senders, and two receivers of the same target, don't share temp files"""
+        os.mkdir("rx")
+        with open("rx/old.jpg", "wb") as f: f.write(self._basis)  # not the target, that is replaced by the first
+        tasks, receivers = [], []
+        for _ in range(2):
+            link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+            tasks.append(dttk.DeltaFileSender("target.jpg", "basis.jpg", link_manager, blocksz=50, repeats=0))
+            receivers.append(dttk.FileReceiver(link_manager, "target.jpg", keep_name=True, basis="rx/old.jpg",
+                                               out_dir="rx"))
+        self.assertNotEqual(tasks[0].get_temp_name(), tasks[1].get_temp_name())
+        tasking.run_all(tasks + receivers)
+        for receiver in receivers: self.assertTrue(receiver.is_finished_ok())
+        with open("rx/target.jpg", "rb") as f: self.assertEqual(self._target, f.read())
+        self.assertEqual(["old.jpg", "target.jpg"], sorted(os.listdir("rx")))
+
+    def test_no_basis(self):
+        """a receiver without the basis ignores the delta"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.DeltaFileSender("target.jpg", "basis.jpg", link_manager, repeats=0)
+        receiver = dttk.FileReceiver(link_manager, "received.jpg", basis="target.jpg")
+        for _ in range(5):
+            sender.tick()
+            receiver.tick(wait=0)
+        self.assertIsNone(receiver._nblocks)
+        sender.done()
+
+#----- TEST BLOCK STORE --------------------------------------------------------
+class TestBlockStore(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        with open(os.path.join(self._here, "test35k.jpg"), "rb") as f: self._data = f.read()
+        with open("first.jpg", "wb") as f: f.write(self._data)
+
+    @staticmethod
+    def transfer(filename:str, store:dttk.BlockStore, block_hashes:bool=False) -> dttk.FileReceiver:
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(filename, link_manager, blocksz=50, repeats=0, block_hashes=block_hashes)
+        receiver = dttk.FileReceiver(link_manager, filename, keep_name=True, store=store)
+        os.chdir("rx")
+        try:
+            tasking.run_all([sender, receiver])
+        finally:
+            os.chdir("..")
+        return receiver
+
+    def test_hashes_msgs(self):
+        """block hashes survive packing into messages, and each fits"""
+        nblocks = (len(self._data) + 49) // 50
+        msgs = dttk.make_hashes_msgs(dttk.FileReader("first.jpg").read, 50, nblocks)
+        hashes = []
+        for msg in msgs:
+            self.assertLessEqual(len(msg), dttk.HASHES_MTU)
+            first, page = dttk.decode_hashes_msg(msg)
+            self.assertEqual(len(hashes), first)
+            hashes.extend(page)
+        self.assertEqual(nblocks, len(hashes))
+        self.assertEqual(dttk.BlockStore.hash_block(self._data[650:700]), hashes[13])
+
+    def test_repeat_finishes_at_meta(self):
+        """a file already in the store isn't received again"""
+        os.mkdir("rx")
+        store = dttk.BlockStore(os.path.abspath("rx/store"))
+        receiver = self.transfer("first.jpg", store)
+        self.assertTrue(receiver.is_finished_ok())
+        os.unlink("rx/first.jpg")
+
+        receiver = self.transfer("first.jpg", dttk.BlockStore(os.path.abspath("rx/store")))  # index reloaded from disk
+        self.assertTrue(receiver.is_finished_ok())
+        self.assertEqual(0, receiver.get_transfer_stats().nblocks)
+        with open("rx/first.jpg", "rb") as f: self.assertEqual(self._data, f.read())
+
+    def test_shared_blocks(self):
+        """blocks already held from another file are filled in, not waited for"""
+        os.mkdir("rx")
+        store = dttk.BlockStore(os.path.abspath("rx/store"))
+        self.transfer("first.jpg", store)
+        second = self._data[:300*50] + b"a different ending"
+        with open("second.jpg", "wb") as f: f.write(second)
+
+        receiver = self.transfer("second.jpg", store, block_hashes=True)
+        self.assertTrue(receiver.is_finished_ok())
+        self.assertEqual(300, receiver.get_deduped())
+        with open("rx/second.jpg", "rb") as f: self.assertEqual(second, f.read())
+
+#----- TEST DIGEST CACHE -------------------------------------------------------
+class TestDigestCache(TempDirTestCase):
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        with open("data.bin", "wb") as f: f.write(bytes(range(256)) * 100)
+
+    def test_hit_after_reload(self):
+        """an unchanged file is only hashed once, even by a new cache"""
+        expected = (25600, dttk.sha256_of_file("data.bin"))
+        cache = dttk.DigestCache("digests")
+        self.assertEqual(expected, cache.get_file_info("data.bin"))
+        self.assertEqual((0, 1), cache.get_stats())
+
+        cache = dttk.DigestCache("digests")
+        self.assertEqual(expected, cache.get_file_info("data.bin"))
+        self.assertEqual((1, 0), cache.get_stats())
+
+    def test_changed_file(self):
+        """a changed file is hashed again"""
+        cache = dttk.DigestCache("digests")
+        cache.get_file_info("data.bin")
+        with open("data.bin", "ab") as f: f.write(b"more")
+        self.assertEqual((25604, dttk.sha256_of_file("data.bin")), cache.get_file_info("data.bin"))
+        self.assertEqual((0, 2), cache.get_stats())
+
+    def test_damaged_lines(self):
+        """junk in the cache file is ignored"""
+        with open("digests", "w") as f: f.write("not a digest\n12 34\n")
+        cache = dttk.DigestCache("digests")
+        self.assertEqual(dttk.sha256_of_file("data.bin"), cache.get_file_info("data.bin")[1])
+
+    def test_keyed_by_real_path(self):
+        """the same name in two directories has two entries, and ./name is the same file"""
+        cache = dttk.DigestCache(os.path.abspath("digests"))
+        for name in ("a", "b"):
+            os.mkdir(name)
+            with open(name + "/data.bin", "wb") as f: f.write(name.encode() * 100)
+        for name in ("a", "b", "a"):
+            os.chdir(name)
+            try:
+                self.assertEqual(dttk.sha256_of_file("data.bin"), cache.get_file_info("data.bin")[1])
+            finally:
+                os.chdir("..")
+        self.assertEqual((1, 2), cache.get_stats())
+        cache.get_file_info("./a/data.bin")
+        self.assertEqual((2, 2), cache.get_stats())
+        with open("digests") as f: self.assertIn(os.path.realpath("a/data.bin"), f.read())
+
+    def test_sender_uses_cache(self):
+        """FileSender gets its META sha256 through the cache"""
+        cache = dttk.DigestCache("digests")
+        dttk.digest_cache = cache
+        try:
+            for _ in range(2): dttk.FileSender("data.bin", dttk.LinkManager(dttk.InMemoryRadio()))
+        finally:
+            dttk.digest_cache = None
+        self.assertEqual((1, 1), cache.get_stats())
+
+#----- TEST DEFERRED DIGEST ----------------------------------------------------
+class TestDeferredDigest(TempDirTestCase):
+    TX_FILENAME = os.path.abspath("test35k.jpg")
+    RX_FILENAME = "received.jpg"
+
+    def test_meta_pending(self):
+        """META goes out before the file is hashed, with the digest to follow"""
+        sender = dttk.FileSender(self.TX_FILENAME, dttk.LinkManager(dttk.InMemoryRadio()), deferred_digest=True)
+        meta = sender.make_meta_msg()
+        self.assertEqual(bytes(32), bytes(meta[5:5+32]))
+        self.assertIn(dttk.META_OPT_DIGEST_PENDING, dttk.decode_meta_opts(meta, meta.index(0, 5+32)+1))
+
+        self.assertTrue(sender.finish_digest(wait=True))
+        meta = sender.make_meta_msg()
+        self.assertEqual(dttk.sha256_of_file(self.TX_FILENAME), bytes(meta[5:5+32]))
+        self.assertNotIn(dttk.META_OPT_DIGEST_PENDING, dttk.decode_meta_opts(meta, meta.index(0, 5+32)+1))
+
+    def transfer(self, schedule:str, repeats:int) -> dttk.FileReceiver:
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=repeats, schedule=schedule,
+                                 deferred_digest=True)
+        receiver = dttk.FileReceiver(link_manager, self.RX_FILENAME)
+        waited = False
+        sending = receiving = True
+        while sending or receiving:
+            if sending:   sending = sender.tick()
+            if receiving: receiving = receiver.tick(wait=0)
+            if receiver._state == receiver._STATE_VERIFYING and receiver._sha256 is None: waited = True
+        self.assertTrue(waited)
+        return receiver
+
+    def test_in_order(self):
+        """blocks hashed as they are sent, receiver waits for the digest before verifying"""
+        receiver = self.transfer("sequential", 0)
+        self.assertTrue(receiver.is_finished_ok())
+        with open(self.TX_FILENAME, "rb") as f: expected = f.read()
+        with open(self.RX_FILENAME, "rb") as f: self.assertEqual(expected, f.read())
+
+    def test_out_of_order(self):
+        """a random schedule leaves the rest of the file to hash just before END"""
+        receiver = self.transfer("random", 1)
+        self.assertTrue(receiver.is_finished_ok())
+        with open(self.TX_FILENAME, "rb") as f: expected = f.read()
+        with open(self.RX_FILENAME, "rb") as f: self.assertEqual(expected, f.read())
+
+    def test_digest_lost(self):
+        """if every META with the digest in is lost, the receiver fails, rather than waiting forever"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=0, deferred_digest=True)
+        sender.DIGEST_REPEATS = 0  # as if they were all lost
+        receiver = dttk.FileReceiver(link_manager, self.RX_FILENAME)
+        receiver.DIGEST_WAIT_MS = 50
+        tasking.run_all([sender, receiver])
+        self.assertEqual(receiver._STATE_FINISHED_ERR, receiver._state)
+        self.assertEqual([], os.listdir("."))
+
+#----- TEST MERKLE -------------------------------------------------------------
+class TestMerkle(TempDirTestCase):
+    TX_FILENAME = os.path.abspath("test35k.jpg")
+    RX_FILENAME = "received.jpg"
+    BAD_BLOCKNO = 100
+
+    def test_leaves_must_match_root(self):
+        """group hashes are only trusted once they hash up to the root"""
+        leaves = [dttk.merkle_hash(bytes([i])) for i in range(5)]
+        root = dttk.merkle_root(leaves)
+        groups = dttk.MerkleGroups(5*16, 16, root)
+        damaged = list(leaves)
+        damaged[3] = bytes(dttk.MERKLE_HASH_LEN)
+        self.assertFalse(groups.add_leaves(0, damaged))
+        self.assertFalse(groups.is_trusted())
+        self.assertFalse(groups.add_leaves(0, leaves[:2]))
+        self.assertTrue(groups.add_leaves(2, leaves[2:]))
+        self.assertEqual(range(16, 32), groups.blocks_of(groups.group_of(20)))
+
+    def transfer(self, merkle:bool) -> dttk.FileReceiver:
+        """Receive with one block written badly, the first time it arrives"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=1, schedule="interleaved",
+                                 merkle=merkle)
+        receiver = dttk.FileReceiver(link_manager, self.RX_FILENAME)
+        write = receiver._writer_fn
+        damaged = []
+        def bad_write(data, offset=None):
+            if offset == self.BAD_BLOCKNO*50 and len(damaged) == 0:
+                damaged.append(offset)
+                data = dttk.Buffer(b"X" * len(data))
+            write(data, offset=offset)
+        receiver._writer_fn = bad_write
+        tasking.run_all([sender, receiver])
+        self.assertEqual(1, len(damaged))
+        return receiver
+
+    def test_bad_group_received_again(self):
+        """a damaged group is received again from the repeats, not the whole file"""
+        receiver = self.transfer(merkle=True)
+        self.assertTrue(receiver.is_finished_ok())
+        self.assertEqual(1, receiver.get_bad_groups())
+        with open(self.TX_FILENAME, "rb") as f: expected = f.read()
+        with open(self.RX_FILENAME, "rb") as f: self.assertEqual(expected, f.read())
+
+    def test_not_deferred(self):
+        """group hashes need the file read up front, which deferred_digest avoids"""
+        self.assertRaises(ValueError, dttk.FileSender, self.TX_FILENAME, dttk.LinkManager(dttk.InMemoryRadio()),
+                          merkle=True, deferred_digest=True)
+
+    def test_without_merkle(self):
+        """without group hashes, only the whole file check sees it"""
+        receiver = self.transfer(merkle=False)
+        self.assertEqual(receiver._STATE_FINISHED_ERR, receiver._state)
+
+    def test_hashed_on_worker(self):
+        """block and group hashes are made on the same worker job as the sha256, not in the constructor"""
+        submitted = []
+        pool = dttk.worker_pool
+        class CountingPool:
+            def submit(self, fn, *args):
+                submitted.append(fn.__name__)
+                return pool.submit(fn, *args)
+        dttk.worker_pool = CountingPool()
+        try:
+            sender = dttk.FileSender(self.TX_FILENAME, dttk.LinkManager(dttk.InMemoryRadio()), blocksz=50,
+                                     block_hashes=True, merkle=True)
+        finally:
+            dttk.worker_pool = pool
+        self.assertEqual(["hash_file"], submitted)
+        self.assertEqual(dttk.get_file_info(self.TX_FILENAME), sender.get_file_info())
+        meta = sender.get_meta()[1]
+        self.assertIn(dttk.META_OPT_MERKLE, dttk.decode_meta_opts(meta, meta.index(0, 5+32)+1))
+
+#----- TEST HASH FRONTIER ------------------------------------------------------
+class TestHashFrontier(TempDirTestCase):
+    BLOCKSZ = 50
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self._data = bytes(range(256)) * 4 + b"tail"  # 1028 bytes, short last block
+        self._blocks = [self._data[i:i+self.BLOCKSZ] for i in range(0, len(self._data), self.BLOCKSZ)]
+
+    def expected(self) -> bytes:
+        with open("expected.bin", "wb") as f: f.write(self._data)
+        return dttk.sha256_of_file("expected.bin")
+
+    def write_all(self, writer, order):
+        nblocks, lastblock = divmod(len(self._data), self.BLOCKSZ)
+        writer.start("received.bin", self.BLOCKSZ, nblocks, lastblock)
+        for blockno in order:
+            writer.write(newbuf(self._blocks[blockno]), offset=blockno*self.BLOCKSZ)
+
+    def test_in_order(self):
+        """blocks in order are hashed as they arrive, no read-back"""
+        reads = []
+        def read_fn(nbytes, offset):
+            reads.append(offset)
+            return b""
+        nblocks, lastblock = divmod(len(self._data), self.BLOCKSZ)
+        frontier = dttk.HashFrontier(self.BLOCKSZ, nblocks, lastblock, read_fn)
+        for blockno, block in enumerate(self._blocks):
+            self.assertIsNone(frontier.digest())
+            frontier.written(blockno, newbuf(block))
+        self.assertEqual(self.expected(), frontier.digest())
+        self.assertEqual([], reads)
+
+    def test_bounded_catch_up(self):
+        """a filled gap reads back a few early blocks per call, and digest() finishes them"""
+        reads = []
+        def read_fn(nbytes, offset):
+            reads.append(offset)
+            return self._data[offset:offset+nbytes]
+        nblocks, lastblock = divmod(len(self._data), self.BLOCKSZ)
+        frontier = dttk.HashFrontier(self.BLOCKSZ, nblocks, lastblock, read_fn)
+        for blockno in range(1, len(self._blocks)):
+            frontier.written(blockno, newbuf(self._blocks[blockno]))
+        self.assertEqual([], reads)
+        frontier.written(0, newbuf(self._blocks[0]))
+        self.assertEqual(frontier.CATCH_UP, len(reads))
+        frontier.catch_up(frontier.CATCH_UP)
+        self.assertEqual(2*frontier.CATCH_UP, len(reads))
+        self.assertEqual(self.expected(), frontier.digest())
+        self.assertEqual(len(self._blocks)-1, len(reads))
+
+    def test_out_of_order(self):
+        """blocks after a gap are read back once the gap fills"""
+        order = list(range(len(self._blocks)))
+        random.Random(44).shuffle(order)
+        for writer in (dttk.ImmediateFileWriter(), dttk.CachedFileWriter(dttk.CachedFileWriter.ON_DEMAND)):
+            self.write_all(writer, order)
+            self.assertIsNotNone(writer._frontier.digest())
+            self.assertEqual(self.expected(), writer.get_sha256())
+            writer.abort()
+
+    def test_rewrite_falls_back(self):
+        """a block rewritten behind the frontier still gives the right sha256"""
+        order = list(range(len(self._blocks))) + [0]
+        for writer in (dttk.ImmediateFileWriter(), dttk.CachedFileWriter(dttk.CachedFileWriter.PREALLOC)):
+            self.write_all(writer, order)
+            self.assertIsNone(writer._frontier.digest())
+            self.assertEqual(self.expected(), writer.get_sha256())
+            writer.abort()
+
+    def test_no_reread(self):
+        """the temp file is not read again to verify it"""
+        writer = dttk.ImmediateFileWriter()
+        self.write_all(writer, range(len(self._blocks)))
+        expected = self.expected()
+        saved = dttk.sha256_of_file
+        def no_sha256_of_file(name): raise AssertionError("re-read %s" % name)
+        dttk.sha256_of_file = no_sha256_of_file
+        try:
+            self.assertEqual(expected, writer.get_sha256())
+        finally:
+            dttk.sha256_of_file = saved
+        writer.abort()
+
+#----- TEST WORKER POOL --------------------------------------------------------
+class TestWorkerPool(TempDirTestCase):
+    TX_FILENAME = os.path.abspath("test35k.jpg")
+
+    def test_inline(self):
+        """with no workers, the work is done by the time submit() returns"""
+        future = dttk.WorkerPool(0).submit(divmod, 7, 2)
+        self.assertTrue(future.is_ready())
+        self.assertEqual((3, 1), future.get())
+        self.assertRaises(ZeroDivisionError, dttk.WorkerPool(0).submit(divmod, 7, 0).get)
+
+    def test_sender_waits_for_digest(self):
+        """a sender sends nothing until its sha256 is known"""
+        radio = dttk.InMemoryRadio()
+        future = dttk.Future()
+        sender = dttk.FileSender(self.TX_FILENAME, dttk.LinkManager(radio), blocksz=50, file_info=future)
+        for _ in range(3): self.assertTrue(sender.tick())
+        self.assertIsNone(radio._waiting)
+
+        future.run(dttk.get_file_info, (self.TX_FILENAME,))
+        self.assertTrue(sender.tick())
+        self.assertIsNotNone(radio._waiting)
+        self.assertEqual(dttk.sha256_of_file(self.TX_FILENAME), bytes(sender._meta_msg[5:37]))
+
+    def test_receiver_ticks_while_verifying(self):
+        """the receive loop keeps going, while the file is checked on a worker"""
+        import threading
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=1)
+        receiver = dttk.FileReceiver(link_manager, "received.jpg")
+        release = threading.Event()
+        get_sha256 = receiver._writer.get_sha256
+        def slow_get_sha256():
+            release.wait(10)
+            return get_sha256()
+        receiver._writer.get_sha256 = slow_get_sha256
+
+        while receiver._verifying is None:
+            sender.tick()
+            self.assertTrue(receiver.tick(wait=0))
+        for _ in range(10): self.assertTrue(receiver.tick(wait=0))  # doesn't block on the worker
+        self.assertEqual(receiver._STATE_VERIFYING, receiver._state)
+
+        release.set()
+        while receiver.tick(wait=0): pass
+        self.assertTrue(receiver.is_finished_ok())
+        with open(self.TX_FILENAME, "rb") as f: expected = f.read()
+        with open("received.jpg", "rb") as f: self.assertEqual(expected, f.read())
+
+#----- TEST COALESCING WRITER --------------------------------------------------
+class TestCoalescingWriter(TempDirTestCase):
+    BLOCKSZ = 50
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self._data = bytes(range(256)) * 4
+        self._blocks = [self._data[i:i+self.BLOCKSZ] for i in range(0, len(self._data), self.BLOCKSZ)]
+
+    def start(self, budget:int) -> dttk.ImmediateFileWriter:
+        writer = dttk.ImmediateFileWriter(budget=budget)
+        nblocks, lastblock = divmod(len(self._data), self.BLOCKSZ)
+        writer.start("received.bin", self.BLOCKSZ, nblocks, lastblock)
+        return writer
+
+    def write(self, writer, blocknos) -> None:
+        for blockno in blocknos:
+            writer.write(newbuf(self._blocks[blockno]), offset=blockno*self.BLOCKSZ)
+
+    def on_disk(self, blockno:int) -> bytes:
+        """What the temp file has at this block, zeros if not written yet"""
+        with open(dttk.ImmediateFileWriter.TEMP_NAME, "rb") as f:
+            f.seek(blockno*self.BLOCKSZ)
+            return f.read(self.BLOCKSZ)
+
+    def test_merged_into_one_extent(self):
+        """out of order blocks are held, then written as one run"""
+        writer = self.start(budget=64*1024)
+        order = list(range(len(self._blocks)))
+        random.Random(46).shuffle(order)
+        self.write(writer, order)
+        self.assertEqual(len(self._data), os.stat(dttk.ImmediateFileWriter.TEMP_NAME).st_size)  # preallocated
+        self.assertEqual(bytes(self.BLOCKSZ), self.on_disk(3))  # all still held
+        self.assertEqual(self._blocks[3], writer.read(self.BLOCKSZ, 3*self.BLOCKSZ))
+
+        writer.get_sha256()
+        writer.commit()
+        with open("received.bin", "rb") as f: self.assertEqual(self._data, f.read())
+        stats = writer.get_stats()
+        self.assertEqual(len(self._blocks), stats._nblocks)
+        self.assertEqual(1, stats._nwrites)
+        self.assertEqual(1, stats._nflushes)
+
+    def test_gaps_and_budget(self):
+        """a gap starts a new extent, and a full budget writes everything held"""
+        writer = self.start(budget=4*self.BLOCKSZ)
+        written = []
+        writer.set_written_fn(written.append)
+        self.write(writer, (0, 1, 3))
+        self.assertEqual([], written)
+        self.write(writer, (4,))  # budget reached
+        self.assertEqual([0, 50, 150, 200], written)
+        self.assertEqual(2, writer.get_stats()._nwrites)
+        writer.abort()
+
+    def test_idle(self):
+        """held blocks go out once nothing has arrived for a while"""
+        writer = self.start(budget=64*1024)
+        writer.IDLE_MS = 0
+        self.write(writer, (0, 1))
+        self.assertEqual(bytes(self.BLOCKSZ), self.on_disk(1))
+        writer.poll()
+        self.assertEqual(self._blocks[1], self.on_disk(1))
+        writer.abort()
+
+    def test_write_through(self):
+        """no budget is a seek and a write per block, as before"""
+        writer = self.start(budget=0)
+        self.write(writer, (2, 0))
+        self.assertEqual(self._blocks[2], self.on_disk(2))
+        self.assertEqual((2, 4), (writer.get_stats()._nwrites, writer.get_stats()._nsyscalls))
+        writer.abort()
+
+    def test_short_writes(self):
+        """an unbuffered file that takes less than it is given still gets every byte"""
+        class ShortFile:
+            def __init__(self, f): self._f = f
+            def write(self, data): return self._f.write(bytes(data[:7]))
+            def __getattr__(self, name): return getattr(self._f, name)
+        def short_pwritev(fd, bufs, offset):
+            return os.pwrite(fd, b"".join([bytes(b) for b in bufs])[:7], offset)
+
+        pwritev = dttk.platdeps.pwritev
+        for fake_pwritev in (None, short_pwritev):
+            if fake_pwritev is not None and not hasattr(os, "pwrite"): continue  # not on Windows
+            dttk.platdeps.pwritev = fake_pwritev
+            try:
+                for budget in (0, 64*1024):
+                    writer = self.start(budget=budget)
+                    writer._file = ShortFile(writer._file)
+                    self.write(writer, range(len(self._blocks)))
+                    writer.flush()
+                    for blockno in range(len(self._blocks)): self.assertEqual(self._blocks[blockno], self.on_disk(blockno))
+                    writer.abort()
+            finally:
+                dttk.platdeps.pwritev = pwritev
+
+#----- TEST SYNC POLICY --------------------------------------------------------
+class TestSyncPolicy(TempDirTestCase):
+    BLOCKSZ = 50
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self._data = bytes(range(256)) * 4 + b"tail"  # 21 blocks, short last block
+
+    def receive(self, budget:int, sync:int) -> dttk.WStats:
+        writer = dttk.ImmediateFileWriter(budget=budget, sync=sync)
+        nblocks, lastblock = divmod(len(self._data), self.BLOCKSZ)
+        writer.start("received.bin", self.BLOCKSZ, nblocks, lastblock)
+        self.assertEqual(len(self._data), os.stat(dttk.ImmediateFileWriter.TEMP_NAME).st_size)
+        for offset in range(0, len(self._data), self.BLOCKSZ):
+            writer.write(newbuf(self._data[offset:offset+self.BLOCKSZ]), offset=offset)
+        writer.get_sha256()
+        writer.commit()
+        with open("received.bin", "rb") as f: self.assertEqual(self._data, f.read())
+        return writer.get_stats()
+
+    def test_none(self):
+        """left to the OS, never synced"""
+        self.assertEqual(0, self.receive(0, dttk.ImmediateFileWriter.SYNC_NONE)._nsyncs)
+
+    def test_commit(self):
+        """synced once, before the rename"""
+        self.assertEqual(1, self.receive(64*1024, dttk.ImmediateFileWriter.SYNC_COMMIT)._nsyncs)
+
+    def test_periodic(self):
+        """synced every 100 bytes, then the tail at commit"""
+        self.assertEqual(10+1, self.receive(0, 100)._nsyncs)
+
+#----- TEST MMAP WRITER --------------------------------------------------------
+class TestMmapWriter(TempDirTestCase):
+    TX_FILENAME = os.path.abspath("test35k.jpg")
+    BLOCKSZ = 50
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self._data = bytes(range(256)) * 4 + b"tail"
+
+    def test_out_of_order(self):
+        """blocks land in the mapping, and the file is whole after the rename"""
+        writer = dttk.MmapFileWriter()
+        nblocks, lastblock = divmod(len(self._data), self.BLOCKSZ)
+        writer.start("received.bin", self.BLOCKSZ, nblocks, lastblock)
+        self.assertEqual(len(self._data), os.stat(dttk.MmapFileWriter.TEMP_NAME).st_size)
+        order = list(range(0, len(self._data), self.BLOCKSZ))
+        random.Random(48).shuffle(order)
+        for offset in order:
+            writer.write(newbuf(self._data[offset:offset+self.BLOCKSZ]), offset=offset)
+        self.assertEqual(self._data[100:150], writer.read(self.BLOCKSZ, 100))
+        self.assertEqual(0, writer.get_stats()._nsyscalls)
+
+        with open("expected.bin", "wb") as f: f.write(self._data)
+        self.assertEqual(dttk.sha256_of_file("expected.bin"), writer.get_sha256())
+        writer.commit()
+        with open("received.bin", "rb") as f: self.assertEqual(self._data, f.read())
+        self.assertFalse(os.path.exists(dttk.MmapFileWriter.TEMP_NAME))
+
+    def test_hash_of_mapping(self):
+        """a rewrite behind the frontier is hashed from the mapping"""
+        writer = dttk.MmapFileWriter()
+        writer.start("received.bin", self.BLOCKSZ, 2, 0)
+        writer.write(newbuf(b"X" * self.BLOCKSZ), offset=0)
+        writer.write(newbuf(b"Y" * self.BLOCKSZ), offset=0)
+        writer.write(newbuf(b"Z" * self.BLOCKSZ), offset=self.BLOCKSZ)
+        self.assertEqual(dttk.platdeps.hashlib_sha256(b"Y" * self.BLOCKSZ + b"Z" * self.BLOCKSZ).digest(),
+                         writer.get_sha256())
+        writer.abort()
+        self.assertFalse(os.path.exists(dttk.MmapFileWriter.TEMP_NAME))
+
+    def test_receiver(self):
+        """FileReceiver takes it as a third writer"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=1)
+        receiver = dttk.FileReceiver(link_manager, "received.jpg", mapped=True)
+        self.assertIsInstance(receiver._writer, dttk.MmapFileWriter)
+        tasking.run_all([sender, receiver])
+        self.assertTrue(receiver.is_finished_ok())
+        with open(self.TX_FILENAME, "rb") as f: expected = f.read()
+        with open("received.jpg", "rb") as f: self.assertEqual(expected, f.read())
+
+#----- TEST UNIQUE TEMP NAMES ---------------------------------------------------
+class TestUniqueTempNames(TempDirTestCase):
+    TX_FILENAME = os.path.abspath("test35k.jpg")
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        with open(self.TX_FILENAME, "rb") as f: self._expected = f.read()
+
+    def test_two_receivers_one_dir(self):
+        """two transfers into the same directory don't share a temp file"""
+        tasks, receivers = [], []
+        for _ in range(2):
+            link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+            tasks.append(dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=1))
+            receivers.append(dttk.FileReceiver(link_manager, "received.jpg"))
+        tasking.run_all(tasks + receivers)
+        self.assertNotEqual(receivers[0].get_temp_name(), receivers[1].get_temp_name())
+        for receiver in receivers:
+            self.assertTrue(receiver.is_finished_ok())
+            self.assertFalse(os.path.exists(receiver.get_temp_name()))
+        with open("received.jpg", "rb") as f: self.assertEqual(self._expected, f.read())
+
+    def test_two_resumable_receivers(self):
+        """only one receiver at a time resumes a file, another one gets its own temp file"""
+        tasks, receivers = [], []
+        for _ in range(2):
+            link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+            tasks.append(dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=1))
+            receivers.append(dttk.FileReceiver(link_manager, "received.jpg", resume=True))
+        tasking.run_all(tasks + receivers)
+        self.assertNotEqual(receivers[0].get_temp_name(), receivers[1].get_temp_name())
+        self.assertEqual([True, False], [r._sidecar is not None for r in receivers])
+        for receiver in receivers: self.assertTrue(receiver.is_finished_ok())
+        with open("received.jpg", "rb") as f: self.assertEqual(self._expected, f.read())
+        self.assertEqual(["received.jpg"], os.listdir("."))
+
+    def test_out_dir(self):
+        """the file and its temp file go in out_dir"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=1)
+        receiver = dttk.FileReceiver(link_manager, "received.jpg", out_dir="inbox")
+        tasking.run_all([sender, receiver])
+        self.assertTrue(receiver.is_finished_ok())
+        self.assertEqual("inbox", os.path.dirname(receiver.get_temp_name()))
+        self.assertFalse(os.path.exists("received.jpg"))
+        with open("inbox/received.jpg", "rb") as f: self.assertEqual(self._expected, f.read())
+        self.assertEqual(["received.jpg"], os.listdir("inbox"))
+
+    def test_resumable_name(self):
+        """a resumable temp name is the same for the same file, so a restart finds it"""
+        names = []
+        for _ in range(2):
+            link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+            sender = dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=0)
+            receiver = dttk.FileReceiver(link_manager, "received.jpg", resume=True)
+            while receiver.get_temp_name() is None:
+                sender.tick()
+                receiver.tick(wait=0)
+            names.append(receiver.get_temp_name())
+            receiver._writer.abort()
+            receiver._sidecar.remove()
+            receiver.release_lock()
+        self.assertEqual(names[0], names[1])
+        self.assertIn(dttk.hexstr(dttk.sha256_of_file(self.TX_FILENAME)[:8]), names[0])
+
+#----- TEST ARENA WRITER -------------------------------------------------------
+class TestArenaWriter(TempDirTestCase):
+    TX_FILENAME = os.path.abspath("test35k.jpg")
+    BLOCKSZ = 50
+
+    def setUp(self):
+        TempDirTestCase.setUp(self)
+        self._data = bytes(range(256)) * 4 + b"tail"
+        self._nblocks, self._lastblock = divmod(len(self._data), self.BLOCKSZ)
+
+    def write_all(self, writer, order) -> None:
+        writer.start("received.bin", self.BLOCKSZ, self._nblocks, self._lastblock)
+        for blockno in order:
+            offset = blockno * self.BLOCKSZ
+            writer.write(newbuf(self._data[offset:offset+self.BLOCKSZ]), offset=offset)
+
+    def check_committed(self, writer) -> None:
+        self.assertEqual(dttk.platdeps.hashlib_sha256(self._data).digest(), writer.get_sha256())
+        writer.commit()
+        with open("received.bin", "rb") as f: self.assertEqual(self._data, f.read())
+        self.assertFalse(os.path.exists(dttk.CachedFileWriter.TEMP_NAME))
+
+    def order(self, seed:int) -> list:
+        order = list(range(self._nblocks + 1))
+        random.Random(seed).shuffle(order)
+        return order
+
+    def test_fits(self):
+        """within budget, it is one arena, and commit is one write"""
+        for mode in (dttk.CachedFileWriter.PREALLOC, dttk.CachedFileWriter.ON_DEMAND):
+            writer = dttk.CachedFileWriter(mode)
+            self.write_all(writer, self.order(50))
+            self.assertEqual([len(self._data)], [len(chunk) for chunk in writer._chunks])
+            self.assertEqual(self._data[100:150], writer.read(self.BLOCKSZ, 100))
+            self.check_committed(writer)
+            stats = writer.get_stats()
+            self.assertEqual((1, len(self._data), 0), (stats._nwrites, stats._held, stats._spilled))
+
+    def test_spill(self):
+        """beyond the budget, cold blocks go to the temp file, and still commit whole"""
+        writer = dttk.CachedFileWriter(dttk.CachedFileWriter.PREALLOC, budget=4*self.BLOCKSZ)
+        self.write_all(writer, self.order(51))
+        self.assertEqual(4*self.BLOCKSZ, sum([len(chunk) for chunk in writer._chunks]))
+        self.assertTrue(os.path.exists(dttk.CachedFileWriter.TEMP_NAME))
+        self.assertEqual(self._data[100:150], writer.read(self.BLOCKSZ, 100))
+        self.check_committed(writer)
+        stats = writer.get_stats()
+        self.assertEqual(4*self.BLOCKSZ, stats._held)
+        self.assertTrue(0 < stats._spilled < len(self._data))
+
+    def test_chunked(self):
+        """as on the Pico, the arena is a chain of small bytearrays, and a file over budget is refused"""
+        writer = dttk.CachedFileWriter(dttk.CachedFileWriter.PREALLOC)
+        writer.CHUNK = 4*self.BLOCKSZ + 10  # whole blocks only
+        writer.SPILL = False
+        self.write_all(writer, self.order(52))
+        self.assertEqual([4*self.BLOCKSZ] * 5 + [len(self._data) - 20*self.BLOCKSZ],
+                         [len(chunk) for chunk in writer._chunks])
+        writer._frontier._hasher = None  # as if it gave up, so the chunks are hashed
+        self.check_committed(writer)
+        self.assertEqual(6, writer.get_stats()._nwrites)
+
+        writer = dttk.CachedFileWriter(dttk.CachedFileWriter.PREALLOC, budget=4*self.BLOCKSZ)
+        writer.SPILL = False
+        self.assertRaises(MemoryError, writer.start, "again.bin", self.BLOCKSZ, self._nblocks, self._lastblock)
+        self.assertEqual(["received.bin"], os.listdir("."))  # only the first one
+
+    def test_spill_rewrite(self):
+        """a rewrite of a spilled block is hashed from the arena and the temp file"""
+        writer = dttk.CachedFileWriter(dttk.CachedFileWriter.ON_DEMAND, budget=3*self.BLOCKSZ)
+        self.write_all(writer, list(range(self._nblocks + 1)) + [0])
+        self.assertIsNone(writer._frontier.digest())
+        self.check_committed(writer)
+
+    def test_abort(self):
+        """abort removes the temp file"""
+        writer = dttk.CachedFileWriter(dttk.CachedFileWriter.PREALLOC, budget=2*self.BLOCKSZ)
+        self.write_all(writer, range(self._nblocks))
+        writer.abort()
+        self.assertEqual([], os.listdir("."))
+
+    def test_receiver(self):
+        """a cached FileReceiver with a small write_budget spills, and still gets the file"""
+        link_manager = dttk.LinkManager(dttk.InMemoryRadio())
+        sender = dttk.FileSender(self.TX_FILENAME, link_manager, blocksz=50, repeats=1)
+        receiver = dttk.FileReceiver(link_manager, "received.jpg", cached=True, write_budget=4096)
+        tasking.run_all([sender, receiver])
+        self.assertTrue(receiver.is_finished_ok())
+        self.assertTrue(receiver.get_write_stats()._spilled > 0)
+        with open(self.TX_FILENAME, "rb") as f: expected = f.read()
+        with open("received.jpg", "rb") as f: self.assertEqual(expected, f.read())
+        self.assertEqual(["received.jpg"], os.listdir("."))
+
+#----- TEST LINK QUALITY -------------------------------------------------------
+class TestLinkQuality(unittest.TestCase):
+    def test_loss_and_bursts(self):
+        """seqno gaps are counted as lost slots and grouped into bursts"""
+        q = dttk.LinkQuality(window=16)
+        q.record_good(0, now_ms=q._t0)
+        q.record_good(2, now_ms=q._t0+10)   # 2 lost
+        q.record_good(0, now_ms=q._t0+20)
+        q.record_good(1, now_ms=q._t0+30)   # 1 lost
+        self.assertEqual(3/7, q.get_loss_rate())
+        self.assertEqual({2:1, 1:1}, q.get_burst_histogram())
+
+    def test_window_wraps(self):
+        """old history falls out of the window"""
+        q = dttk.LinkQuality(window=4)
+        q.record_good(0)
+        q.record_good(3)  # 3 lost
+        for _ in range(4): q.record_good(0)
+        self.assertEqual(0.0, q.get_loss_rate())
+        self.assertEqual({}, q.get_burst_histogram())
+
+    def test_jitter(self):
+        """steady arrivals have no jitter, uneven ones do"""
+        q = dttk.LinkQuality()
+        for i in range(5): q.record_good(0, now_ms=q._t0 + i*25)
+        self.assertEqual(0.0, q.get_jitter_ms())
+        q.record_good(0, now_ms=q._t0 + 4*25 + 75)
+        self.assertTrue(q.get_jitter_ms() > 0)
+
+    def test_crc_rate_from_receiver(self):
+        """a CRC failure at the LinkReceiver shows in the crc rate"""
+        gen = ByteStreamGenerator(b'\x04\x00\x00\xCD\xCD')  # bad crc
+        receiver = dttk.LinkReceiver(gen)
+        receiver.recvinto(newbuf())
+        q = receiver.get_quality()
+        self.assertEqual(1.0, q.get_crc_rate())
+        self.assertEqual(0.0, q.get_loss_rate())
+
 
 #----- INTERACTIVE TESTER ------------------------------------------------------
 class InteractiveLink(dttk.Link):